@@ -4,6 +4,7 @@ from django.urls import reverse
 from .models import (
     StripeSettings, Client, Pet, Booking, BookingPet, AdminEvent, AdminTask, SubOccurrence, Tag,
     StripeKeyAudit, Service, ServiceDefaults, TimetableBlock, BlockCapacity, CapacityHold,
+    TimetableTemplate, TimetableTemplateBlock, TimetableTemplateCapacity,
     StripeSubscriptionLink, StripeSubscriptionSchedule, StripePriceMap, ServiceWindow
 )
 
@@ -168,6 +169,31 @@ class BlockCapacityAdmin(admin.ModelAdmin):
     list_filter = ("service_code",)
 
 
+class TimetableTemplateBlockInline(admin.TabularInline):
+    model = TimetableTemplateBlock
+    extra = 0
+    show_change_link = True
+
+
+@admin.register(TimetableTemplate)
+class TimetableTemplateAdmin(admin.ModelAdmin):
+    list_display = ("name", "updated_at")
+    search_fields = ("name",)
+    inlines = [TimetableTemplateBlockInline]
+
+
+class TimetableTemplateCapacityInline(admin.TabularInline):
+    model = TimetableTemplateCapacity
+    extra = 1
+
+
+@admin.register(TimetableTemplateBlock)
+class TimetableTemplateBlockAdmin(admin.ModelAdmin):
+    list_display = ("template", "weekday", "start_time", "end_time", "label")
+    list_filter = ("template", "weekday")
+    inlines = [TimetableTemplateCapacityInline]
+
+
 @admin.register(CapacityHold)
 class CapacityHoldAdmin(admin.ModelAdmin):
     list_display = ("token", "block", "service_code", "client", "expires_at")
@@ -1,7 +1,12 @@
 from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render, redirect
 from django.contrib import messages
+from django.db import transaction
+from django.utils import timezone
+from django.views.decorators.http import require_POST
+from .audit import emit_many
 from .models import Booking
+from .portal_cache import bump_client_version
 
 @staff_member_required
 def reconcile_list(request):
@@ -19,3 +24,33 @@ def reconcile_mark_paid(request, booking_id):
     b.mark_paid()
     messages.success(request, f"Marked booking #{b.id} paid.")
     return redirect("admin_reconcile")
+
+
+def bulk_mark_paid(booking_ids, actor=None, when=None) -> int:
+    """Mark every selected unpaid booking paid with one UPDATE + one audit insert."""
+    when = when or timezone.now()
+    with transaction.atomic():
+        rows = list(
+            Booking.objects.filter(id__in=booking_ids).exclude(payment_status="paid").only("id", "client_id")
+        )
+        Booking.objects.filter(id__in=[b.id for b in rows]).update(payment_status="paid", paid_at=when)
+        emit_many("booking.mark_paid", [(b, f"Marked booking #{b.id} paid", {}) for b in rows], actor=actor)
+    for client_id in {b.client_id for b in rows}:
+        bump_client_version(client_id)
+    return len(rows)
+
+@staff_member_required
+@require_POST
+def reconcile_bulk_mark_paid(request):
+    ids = []
+    for raw in request.POST.getlist("booking_ids"):
+        try:
+            ids.append(int(raw))
+        except (TypeError, ValueError):
+            continue
+    if not ids:
+        messages.info(request, "No bookings selected.")
+    else:
+        n = bulk_mark_paid(ids, actor=request.user)
+        messages.success(request, f"Marked {n} booking(s) paid.")
+    return redirect("admin_reconcile")
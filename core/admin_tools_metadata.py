@@ -1,61 +1,15 @@
-from datetime import datetime
 from zoneinfo import ZoneInfo
 from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
-from django.utils.timezone import make_naive, is_aware
 from django.urls import reverse
 import logging
-import stripe
 from .models import Booking, Service, StripeSubscriptionSchedule, StripeSubscriptionLink
+from .invoice_validation import KNOWN_KEYS, diff_booking_vs_metadata
+from .stripe_invoice_cache import get_invoice
 
 log = logging.getLogger(__name__)
 BRISBANE = ZoneInfo("Australia/Brisbane")
-KNOWN_KEYS = {"booking_id","booking_start","booking_end","dogs","location","service_code"}
-
-def _parse_iso_local(dt_str: str):
-    if not dt_str:
-        return None
-    s = dt_str.strip()
-    if s.endswith("Z"):
-        s = s[:-1] + "+00:00"
-    try:
-        dt = datetime.fromisoformat(s)
-    except Exception:
-        return None
-    if is_aware(dt):
-        dt = dt.astimezone(BRISBANE)
-    return make_naive(dt, BRISBANE)
-
-def _diff_vs_booking(b: Booking, md: dict):
-    diff = {}
-    inv_start = _parse_iso_local(md.get("booking_start"))
-    inv_end = _parse_iso_local(md.get("booking_end"))
-    # Compare naive datetimes
-    if inv_start:
-        booking_start_naive = make_naive(b.start_dt, BRISBANE) if is_aware(b.start_dt) else b.start_dt
-        if booking_start_naive != inv_start:
-            diff["start_dt"] = {"booking": b.start_dt.isoformat(), "invoice": inv_start.isoformat()}
-    if inv_end:
-        booking_end_naive = make_naive(b.end_dt, BRISBANE) if is_aware(b.end_dt) else b.end_dt
-        if booking_end_naive != inv_end:
-            diff["end_dt"] = {"booking": b.end_dt.isoformat(), "invoice": inv_end.isoformat()}
-    if "dogs" in md:
-        try:
-            inv_dogs = int(md["dogs"])
-            if hasattr(b, "dogs") and b.dogs is not None and b.dogs != inv_dogs:
-                diff["dogs"] = {"booking": b.dogs, "invoice": inv_dogs}
-        except Exception:
-            pass
-    if "location" in md:
-        inv_loc = (md.get("location") or "").strip()
-        if hasattr(b, "location") and (b.location or "") != inv_loc:
-            diff["location"] = {"booking": b.location or "", "invoice": inv_loc}
-    if "service_code" in md and b.service and b.service.code:
-        inv_svc = (md.get("service_code") or "").strip()
-        if b.service.code != inv_svc:
-            diff["service_code"] = {"booking": b.service.code, "invoice": inv_svc}
-    return diff
 
 @staff_member_required
 def invoice_metadata(request, booking_id: int):
@@ -71,13 +25,13 @@ def invoice_metadata(request, booking_id: int):
         messages.info(request, "This booking has no Stripe invoice id attached.")
     else:
         try:
-            inv = stripe.Invoice.retrieve(invoice_id, expand=["lines"])
+            inv = get_invoice(invoice_id)
             for li in (inv.lines.data or []):
                 md = getattr(li, "metadata", None) or {}
                 # Only show items mapped to this booking
                 if str(md.get("booking_id") or "") != str(b.id):
                     continue
-                diff = _diff_vs_booking(b, md)
+                diff = diff_booking_vs_metadata(b, md, invoice_id=invoice_id)
                 unknown = sorted(set(md.keys()) - KNOWN_KEYS)
                 line_results.append({
                     "description": getattr(li, "description", ""),
@@ -1,7 +1,8 @@
 from __future__ import annotations
 import logging
+import threading
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterator, List, Optional
 from zoneinfo import ZoneInfo
 
 import stripe
@@ -9,15 +10,31 @@ from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.decorators.http import require_POST
 from django.contrib import messages
-from django.db import transaction
+from django.db import connection, transaction
+from django.db.models import Q
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils import timezone
 from django.utils.timezone import make_naive, is_aware, localtime
 
-from .models import Booking, Client, Service, StripePriceMap
+from .models import Booking, Client, ReconcileSnapshotLine, ReconcileSnapshotRun
 from .stripe_invoices_sync import process_invoice
+from .stripe_invoice_cache import get_invoice
+from .reconcile_matcher import (
+    AUTO_ACCEPT_SCORE,
+    DEFAULT_TOLERANCE_MINUTES,
+    accept_matches,
+    propose_matches,
+    unlinked_invoices,
+)
+from .service_registry import get_service, service_for_price
 from .audit import emit as audit_emit
+from . import stripe_metrics
 
 log = logging.getLogger(__name__)
 BRISBANE = ZoneInfo("Australia/Brisbane")
+# A "running" refresh older than this is assumed dead and may be restarted
+STALE_RUN_AFTER = timedelta(minutes=15)
 
 def _parse_iso_local(dt_str: Optional[str]):
     if not dt_str:
@@ -38,10 +55,10 @@ def _stripe_ts_to_local(ts: Optional[int]):
         return None
     return make_naive(datetime.fromtimestamp(ts, tz=BRISBANE), BRISBANE)
 
-def _recent_invoices(days: int = 60) -> List[Any]:
+def _recent_invoices(days: int = 60) -> Iterator[List[Any]]:
+    """Yield pages of Stripe invoices created in the last `days` (lines + prices expanded)."""
     since = datetime.now(tz=BRISBANE) - timedelta(days=days)
     starting_after = None
-    out = []
     while True:
         params = {
             "limit": 100,
@@ -53,68 +70,116 @@ def _recent_invoices(days: int = 60) -> List[Any]:
             params["starting_after"] = starting_after
         page = stripe.Invoice.list(**params)
         data = getattr(page, "data", []) or []
-        out.extend(data)
-        if not getattr(page, "has_more", False):
+        if data:
+            yield data
+        if not getattr(page, "has_more", False) or not data:
             break
-        starting_after = data[-1].id if data else None
-    return out
+        starting_after = data[-1].id
 
 def _line_items(inv) -> List[Any]:
     lines = getattr(inv, "lines", None)
     return getattr(lines, "data", []) if lines else []
 
-def _booking_by_id(val) -> Optional[Booking]:
+def _booking_ref(md) -> Optional[int]:
     try:
-        bid = int(str(val))
+        return int(str(md.get("booking_id")))
     except Exception:
         return None
-    return Booking.objects.filter(id=bid).first()
 
 def _client_by_customer_id(customer_id: Optional[str]) -> Optional[Client]:
     if not customer_id:
         return None
     return Client.objects.filter(stripe_customer_id=customer_id).first()
 
-def _summarize_invoices_for_reconcile(days: int = 60):
+def _unlinked_lines(invoices) -> List[ReconcileSnapshotLine]:
     """
-    Return a list of invoices with only the lines that are 'unlinked' from local bookings
-    (i.e., no local booking has this invoice id, or metadata.booking_id doesn't match a booking).
+    Snapshot rows for lines that look unlinked: no local booking carries the
+    invoice id and metadata.booking_id doesn't match a booking. Set-based: one
+    IN query for referenced booking ids, one for invoice ids already linked.
     """
-    try:
-        invoices = _recent_invoices(days=days)
-    except Exception as e:
-        log.warning("Failed to fetch Stripe invoices: %s", e)
-        return []
-    unlinked = []
-    for inv in invoices:
+    pairs = [(inv, _line_items(inv)) for inv in invoices]
+    refs = {ref for _, lines in pairs for li in lines if (ref := _booking_ref(getattr(li, "metadata", None) or {}))}
+    existing = set(Booking.objects.filter(id__in=refs).values_list("id", flat=True)) if refs else set()
+    inv_ids = [getattr(inv, "id", None) for inv, _ in pairs]
+    linked = set(
+        Booking.objects.filter(stripe_invoice_id__in=[i for i in inv_ids if i])
+        .values_list("stripe_invoice_id", flat=True).distinct()
+    )
+    rows = []
+    for inv, lines in pairs:
         inv_id = getattr(inv, "id", None)
-        status = getattr(inv, "status", None)
-        customer = getattr(inv, "customer", None)
-        lines = []
-        for li in _line_items(inv):
+        if inv_id in linked:
+            continue
+        for li in lines:
             md = getattr(li, "metadata", None) or {}
-            li_id = getattr(li, "id", None)
-            bid = md.get("booking_id")
-            b = _booking_by_id(bid) if bid else None
-            # Consider a line 'linked' if a local booking explicitly references this invoice
-            is_linked_locally = Booking.objects.filter(stripe_invoice_id=inv_id).exists()
-            if b is None and not is_linked_locally:
-                # show this line as unlinked candidate
-                lines.append({
-                    "line_id": li_id,
-                    "description": getattr(li, "description", "") or "",
-                    "amount_total": getattr(li, "amount", None) or getattr(li, "amount_total", None),
-                    "metadata": dict(md),
-                })
-        if lines:
-            unlinked.append({
-                "invoice_id": inv_id,
-                "status": status,
-                "customer_id": customer,
-                "hosted_invoice_url": getattr(inv, "hosted_invoice_url", None) or getattr(inv, "invoice_pdf", None),
-                "lines": lines,
-            })
-    return unlinked
+            ref = _booking_ref(md)
+            if ref is not None and ref in existing:
+                continue
+            rows.append(ReconcileSnapshotLine(
+                invoice_id=inv_id,
+                invoice_status=getattr(inv, "status", None),
+                customer_id=getattr(inv, "customer", None),
+                hosted_invoice_url=getattr(inv, "hosted_invoice_url", None) or getattr(inv, "invoice_pdf", None),
+                line_id=getattr(li, "id", None) or "",
+                price_id=getattr(getattr(li, "price", None), "id", None),
+                description=getattr(li, "description", "") or "",
+                amount_total=getattr(li, "amount", None) or getattr(li, "amount_total", None),
+                metadata=dict(md),
+                booking_ref=ref,
+            ))
+    return rows
+
+
+def refresh_reconcile_snapshot(days: int = 60) -> Dict[str, Any]:
+    """
+    Rebuild the reconcile snapshot from Stripe, one invoice page at a time,
+    recording progress on ReconcileSnapshotRun. The old snapshot stays visible
+    until the new one is swapped in atomically.
+    """
+    ReconcileSnapshotRun.current()
+    claimed = ReconcileSnapshotRun.objects.filter(pk=1).filter(
+        ~Q(status=ReconcileSnapshotRun.STATUS_RUNNING) | Q(started_at__lt=timezone.now() - STALE_RUN_AFTER)
+    ).update(
+        status=ReconcileSnapshotRun.STATUS_RUNNING, days=days, invoices_seen=0, lines_unlinked=0,
+        started_at=timezone.now(), finished_at=None, error="",
+    )
+    if not claimed:
+        return {"skipped": "already running"}
+    run = ReconcileSnapshotRun.objects.filter(pk=1)
+    rows: List[ReconcileSnapshotLine] = []
+    seen = 0
+    try:
+        for page in _recent_invoices(days=days):
+            rows.extend(_unlinked_lines(page))
+            seen += len(page)
+            run.update(invoices_seen=seen, lines_unlinked=len(rows))
+        with transaction.atomic():
+            ReconcileSnapshotLine.objects.all().delete()
+            ReconcileSnapshotLine.objects.bulk_create(rows, batch_size=500)
+            run.update(status=ReconcileSnapshotRun.STATUS_DONE, finished_at=timezone.now(), lines_unlinked=len(rows))
+    except Exception as e:
+        log.warning("Reconcile snapshot refresh failed: %s", e)
+        run.update(status=ReconcileSnapshotRun.STATUS_FAILED, finished_at=timezone.now(), error=str(e)[:1000])
+        return {"error": str(e)}
+    return {"invoices": seen, "lines": len(rows)}
+
+
+def start_background_refresh(days: int = 60) -> bool:
+    """Kick off a refresh on a daemon thread; False if one is already running."""
+    run = ReconcileSnapshotRun.current()
+    if run.status == ReconcileSnapshotRun.STATUS_RUNNING and run.started_at and run.started_at >= timezone.now() - STALE_RUN_AFTER:
+        return False
+
+    def _work():
+        try:
+            with stripe_metrics.job("reconcile_refresh"):
+                refresh_reconcile_snapshot(days=days)
+        finally:
+            connection.close()
+
+    threading.Thread(target=_work, name="reconcile-snapshot", daemon=True).start()
+    return True
+
 
 def _summarize_unlinked_bookings(days: int = 60):
     """
@@ -134,11 +199,77 @@ def reconcile_index(request):
         days = 60
     ctx = {
         "days": days,
-        "unlinked_invoices": _summarize_invoices_for_reconcile(days=days),
+        "unlinked_invoices": unlinked_invoices(),
         "unlinked_bookings": _summarize_unlinked_bookings(days=days),
+        "snapshot": ReconcileSnapshotRun.current(),
     }
     return render(request, "admin_tools/reconcile.html", ctx)
 
+
+@staff_member_required
+@require_POST
+def reconcile_refresh(request):
+    """Start rebuilding the invoice snapshot in the background."""
+    try:
+        days = int(request.POST.get("days", "60"))
+    except Exception:
+        days = 60
+    if start_background_refresh(days=days):
+        messages.info(request, f"Refreshing Stripe invoices from the last {days} days…")
+    else:
+        messages.info(request, "A refresh is already running.")
+    return redirect(f"{reverse('admin_reconcile')}?days={days}")
+
+
+@staff_member_required
+def reconcile_status(request):
+    """Progress of the current/last snapshot refresh (polled by the console)."""
+    run = ReconcileSnapshotRun.current()
+    return JsonResponse({
+        "status": run.status,
+        "days": run.days,
+        "invoices_seen": run.invoices_seen,
+        "lines_unlinked": run.lines_unlinked,
+        "started_at": run.started_at.isoformat() if run.started_at else None,
+        "finished_at": run.finished_at.isoformat() if run.finished_at else None,
+        "error": run.error,
+    })
+
+@staff_member_required
+def reconcile_matches(request):
+    """Review screen for scored invoice-line → booking proposals."""
+    try:
+        tolerance = max(0, min(int(request.GET.get("tolerance", DEFAULT_TOLERANCE_MINUTES)), 24 * 60))
+    except Exception:
+        tolerance = DEFAULT_TOLERANCE_MINUTES
+    ctx = {
+        "tolerance": tolerance,
+        "proposals": propose_matches(tolerance_minutes=tolerance),
+        "auto_accept_score": AUTO_ACCEPT_SCORE,
+        "snapshot": ReconcileSnapshotRun.current(),
+    }
+    return render(request, "admin_tools/reconcile_matches.html", ctx)
+
+
+@staff_member_required
+@require_POST
+def reconcile_accept_matches(request):
+    """Link every ticked proposal (values "<line pk>:<booking id>") in one transaction."""
+    pairs = []
+    for raw in request.POST.getlist("accept"):
+        try:
+            line_pk, booking_id = (int(x) for x in raw.split(":", 1))
+        except Exception:
+            continue
+        pairs.append((line_pk, booking_id))
+    if not pairs:
+        messages.info(request, "No proposals selected.")
+        return redirect("admin_reconcile_matches")
+    linked = accept_matches(pairs, actor=request.user)
+    skipped = len(pairs) - linked
+    messages.success(request, f"Linked {linked} booking(s)." + (f" {skipped} skipped (already linked or gone)." if skipped else ""))
+    return redirect("admin_reconcile_matches")
+
 def _update_invoice_fields_from_obj(booking: Booking, inv) -> bool:
     changed = False
     inv_id = getattr(inv, "id", None)
@@ -176,7 +307,7 @@ def reconcile_link(request):
         return redirect("admin_reconcile")
     b = get_object_or_404(Booking, id=booking_id)
     try:
-        inv = stripe.Invoice.retrieve(invoice_id, expand=["lines.data"])
+        inv = get_invoice(invoice_id)
     except Exception as e:
         messages.error(request, f"Stripe error retrieving invoice {invoice_id}: {e}")
         return redirect("admin_reconcile")
@@ -237,7 +368,7 @@ def reconcile_create_from_line(request):
         messages.error(request, "invoice_id and line_id are required.")
         return redirect("admin_reconcile")
     try:
-        inv = stripe.Invoice.retrieve(invoice_id, expand=["lines.data"])
+        inv = get_invoice(invoice_id)
     except Exception as e:
         messages.error(request, f"Stripe error retrieving invoice {invoice_id}: {e}")
         return redirect("admin_reconcile")
@@ -256,15 +387,9 @@ def reconcile_create_from_line(request):
         return redirect("admin_reconcile")
     md = getattr(target_line, "metadata", None) or {}
     # Prefer price → service mapping; fallback to metadata.service_code
-    price_id = getattr(getattr(target_line, "price", None), "id", None)
-    spm = None
-    if price_id:
-        spm = StripePriceMap.objects.filter(price_id=price_id, active=True).select_related("service").first()
-    if spm and spm.service and spm.service.is_active:
-        service = spm.service
-    else:
-        service_code = (md.get("service_code") or "").strip()
-        service = Service.objects.filter(code=service_code, is_active=True).first() if service_code else None
+    service = service_for_price(getattr(getattr(target_line, "price", None), "id", None))
+    if service is None:
+        service = get_service((md.get("service_code") or "").strip())
     start_dt = _parse_iso_local(md.get("booking_start"))
     if not start_dt:
         messages.error(request, "Line metadata must include booking_start.")
@@ -2,10 +2,15 @@ from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.decorators.http import require_POST
 from django.contrib import messages
+from collections import defaultdict
 from datetime import datetime
 from zoneinfo import ZoneInfo
+from django.db import transaction
 from django.utils import timezone as django_tz
-from .models import Booking, Service
+from .audit import emit_many
+from .models import Booking
+from .service_registry import get_service
+from .portal_cache import bump_client_version
 
 BRISBANE = ZoneInfo("Australia/Brisbane")
 
@@ -35,48 +40,147 @@ def review_list(request):
     return render(request, "admin_tools/review_list.html", {"bookings": qs})
 
 
-@staff_member_required
-@require_POST
-def review_apply(request, booking_id: int):
-    """Apply invoice metadata values to the booking."""
-    b = get_object_or_404(Booking, id=booking_id)
-    diff = b.review_diff or {}
+REVIEW_FIELDS = ["requires_admin_review", "review_diff", "review_source_invoice_id"]
+# Applying any of these moves the booking in time/capacity, so the usual
+# post_save bookkeeping (capacity and portal caches) must run
+_TIMING_FIELDS = {"start_dt", "end_dt", "service", "service_code"}
+
+
+def _services_for(diffs) -> dict:
+    """code -> Service for every service_code named in the diffs (from the registry)."""
+    codes = {d["service_code"]["invoice"] for d in diffs if "service_code" in d}
+    return {code: svc for code in codes if (svc := get_service(code, active_only=False))}
+
+
+def _apply_diff(b: Booking, diff: dict, services: dict) -> list:
+    """Copy invoice values from a review diff onto the booking (in memory). Returns changed fields."""
     changed = []
-    
     if "start_dt" in diff:
         dt = _parse_iso_local(diff["start_dt"]["invoice"])
         if dt:
             b.start_dt = dt
             changed.append("start_dt")
-    
     if "end_dt" in diff:
         dt = _parse_iso_local(diff["end_dt"]["invoice"])
         if dt:
             b.end_dt = dt
             changed.append("end_dt")
-    
     if "dogs" in diff:
         b.dogs = int(diff["dogs"]["invoice"])
         changed.append("dogs")
-    
     if "location" in diff:
         b.location = diff["location"]["invoice"]
         changed.append("location")
-    
     if "service_code" in diff:
-        svc = Service.objects.filter(code=diff["service_code"]["invoice"]).first()
+        svc = services.get(diff["service_code"]["invoice"])
         if svc:
             b.service = svc
             b.service_code = svc.code
-            changed.append("service")
-    
-    b.clear_review()
+            changed.extend(["service", "service_code"])
+    return changed
+
+
+def _clear_review(b: Booking) -> None:
+    b.requires_admin_review = False
+    b.review_diff = None
+    b.review_source_invoice_id = None
+
+
+def _selected_ids(request) -> list:
+    ids = []
+    for raw in request.POST.getlist("booking_ids"):
+        try:
+            ids.append(int(raw))
+        except (TypeError, ValueError):
+            continue
+    return ids
+
+
+def bulk_apply_reviews(booking_ids, actor=None) -> int:
+    """
+    Apply the review diff of every selected booking under review. Services are
+    resolved in one query; rows that don't move are written with one bulk_update
+    per changed field set, and everything is audited in one batched insert.
+    Returns bookings applied.
+    """
+    with transaction.atomic():
+        bookings = list(Booking.objects.select_for_update().filter(id__in=booking_ids, requires_admin_review=True))
+        services = _services_for([b.review_diff or {} for b in bookings])
+        groups = defaultdict(list)
+        audit = []
+        for b in bookings:
+            diff = b.review_diff or {}
+            changed = _apply_diff(b, diff, services)
+            audit.append((b, f"Applied {', '.join(changed) or 'nothing'} from review to booking #{b.id}",
+                          {"fields": changed, "invoice_id": b.review_source_invoice_id}))
+            _clear_review(b)
+            groups[tuple(changed)].append(b)
+        unmoved = []
+        for changed, rows in groups.items():
+            if _TIMING_FIELDS & set(changed):
+                # Moved rows save one by one so the Booking post_save receivers
+                # (capacity and portal caches) run in this transaction
+                for b in rows:
+                    b.save(update_fields=list(changed) + REVIEW_FIELDS)
+            else:
+                Booking.objects.bulk_update(rows, list(changed) + REVIEW_FIELDS, batch_size=500)
+                unmoved.extend(rows)
+        emit_many("review.apply", audit, actor=actor)
+    for client_id in {b.client_id for b in unmoved}:
+        bump_client_version(client_id)
+    return len(bookings)
+
+
+def bulk_dismiss_reviews(booking_ids, actor=None) -> int:
+    """Clear the review flag on every selected booking with one UPDATE + one audit insert."""
+    with transaction.atomic():
+        qs = Booking.objects.filter(id__in=booking_ids, requires_admin_review=True)
+        rows = list(qs.only("id", "client_id", "review_source_invoice_id"))
+        qs.filter(id__in=[b.id for b in rows]).update(
+            requires_admin_review=False, review_diff=None, review_source_invoice_id=None
+        )
+        emit_many("review.dismiss", [
+            (b, f"Dismissed review for booking #{b.id}", {"invoice_id": b.review_source_invoice_id}) for b in rows
+        ], actor=actor)
+    # .update() skips signals; refresh the portal's cached "under review" chip
+    for client_id in {b.client_id for b in rows}:
+        bump_client_version(client_id)
+    return len(rows)
+
+
+@staff_member_required
+@require_POST
+def review_bulk(request):
+    """Apply or dismiss every ticked booking on the review list."""
+    ids = _selected_ids(request)
+    action = request.POST.get("action")
+    if not ids:
+        messages.info(request, "No bookings selected.")
+    elif action == "apply":
+        n = bulk_apply_reviews(ids, actor=request.user)
+        messages.success(request, f"Applied invoice values to {n} booking(s).")
+    elif action == "dismiss":
+        n = bulk_dismiss_reviews(ids, actor=request.user)
+        messages.info(request, f"Dismissed review for {n} booking(s).")
+    else:
+        messages.error(request, "Unknown action.")
+    return redirect("admin_review_list")
+
+
+@staff_member_required
+@require_POST
+def review_apply(request, booking_id: int):
+    """Apply invoice metadata values to the booking."""
+    b = get_object_or_404(Booking, id=booking_id)
+    diff = b.review_diff or {}
+    changed = _apply_diff(b, diff, _services_for([diff]))
+    _clear_review(b)
+    b.save(update_fields=changed + REVIEW_FIELDS)
     if changed:
-        b.save()
         messages.success(request, f"Applied {', '.join(changed)} to booking #{b.id}.")
     else:
         messages.info(request, "No applicable changes.")
-    
+
     return redirect("admin_review_list")
 
 
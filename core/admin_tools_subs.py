@@ -4,6 +4,7 @@ from django.contrib import messages
 from django.db import transaction
 from django.views.decorators.http import require_http_methods
 from .models import StripeSubscriptionLink, StripeSubscriptionSchedule, Service
+from .subscription_materializer import plan_for_schedule
 
 
 def _get_or_create_schedule_for_link(link: StripeSubscriptionLink) -> StripeSubscriptionSchedule:
@@ -53,6 +54,7 @@ def subs_unscheduled(request):
 def subs_wizard(request, link_id: int):
     """
     Capture service_code, days, start_time, repeats, location for a Stripe sub.
+    Submitting with action=preview shows the materialization diff without saving.
     """
     link = get_object_or_404(StripeSubscriptionLink.objects.select_related("client"), id=link_id)
     sched = _get_or_create_schedule_for_link(link)
@@ -64,10 +66,12 @@ def subs_wizard(request, link_id: int):
         start_time = (request.POST.get("start_time") or "").strip() or None
         repeats = (request.POST.get("repeats") or "").strip().lower() or "weekly"
         location = (request.POST.get("location") or "").strip() or "Home"
+        preview = request.POST.get("action") == "preview"
 
         # Update the link's service_code (this is where it's stored in current model)
         link.service_code = service_code or link.service_code
-        link.save()
+        if not preview:
+            link.save()
 
         # Update the schedule fields
         sched.days = days
@@ -80,17 +84,24 @@ def subs_wizard(request, link_id: int):
         except Exception as e:
             messages.error(request, f"Please fix the errors: {e}")
         else:
+            if preview:
+                ctx = _wizard_context(link, sched, services, plan_for_schedule(sched))
+                return render(request, "admin_tools/subs_wizard.html", ctx)
             sched.save()
             messages.success(request, "Subscription schedule saved.")
             return redirect("admin_subs_unscheduled")
 
-    ctx = {
+    return render(request, "admin_tools/subs_wizard.html", _wizard_context(link, sched, services))
+
+
+def _wizard_context(link, sched, services, plan=None):
+    return {
         "link": link,
         "sched": sched,
         "services": services,
+        "plan": plan,
         "repeats_choices": (
             (StripeSubscriptionSchedule.REPEATS_WEEKLY, "Weekly"),
             (StripeSubscriptionSchedule.REPEATS_FORTNIGHTLY, "Fortnightly"),
         ),
     }
-    return render(request, "admin_tools/subs_wizard.html", ctx)
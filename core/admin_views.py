@@ -14,6 +14,7 @@ import json
 from .stripe_key_manager import get_stripe_key, get_key_status, update_stripe_key
 from .stripe_integration import list_booking_services
 from .subscription_materializer import materialize_all
+from . import stripe_metrics
 
 
 @staff_member_required
@@ -74,6 +75,9 @@ def stripe_diagnostics_view(request):
         # Basic validation of key format
         if key.startswith(('sk_test_', 'sk_live_')) and len(key) > 20:
             diagnostics['key_format_valid'] = True
+
+    # Stripe call counts/latency per endpoint, and per view/job against its budget
+    diagnostics['api_calls'] = stripe_metrics.summary()
     
     return JsonResponse(diagnostics)
 
@@ -20,10 +20,16 @@ class CoreConfig(AppConfig):
         server boot. Guarded by env STARTUP_SYNC=1 and avoids duplicate runs under
         Django autoreload by checking RUN_MAIN.
         """
+        # Count/time every Stripe call (management commands included)
+        from . import stripe_metrics
+        stripe_metrics.install()
+
+        # Register signal receivers before anything below can return early:
+        # capacity bookkeeping depends on them
+        import core.signals  # noqa
+
         # --- NEW: don't start background scheduler during management commands ---
         if getattr(settings, "IS_MANAGEMENT_CMD", False):
-            # Import signals to register them even in management commands
-            import core.signals  # noqa
             return
         
         # First, handle the existing startup sync logic (optional, controlled by STARTUP_SYNC env var)
@@ -74,6 +80,3 @@ class CoreConfig(AppConfig):
             scheduler.start_scheduler_if_enabled()
         except Exception as e:
             log.exception("core.apps: failed to start scheduler: %s", e)
-        
-        # Import signals to register them
-        import core.signals  # noqa
\ No newline at end of file
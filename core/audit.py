@@ -1,31 +1,211 @@
 from __future__ import annotations
+import atexit
 import logging
+import queue
+import threading
+import time
 from typing import Optional, Dict, Any
+from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
+from django.db import connection, transaction
 from .models import AdminEvent, Booking
 
 log = logging.getLogger(__name__)
 
+# Events buffered before emit() falls back to a synchronous INSERT
+AUDIT_QUEUE_SIZE = 10_000
+AUDIT_BATCH_SIZE = 200
+# A batch is written once it's full or this long after its first event
+AUDIT_FLUSH_SECONDS = 1.0
+
+_STOP = object()
+
+
+class AuditWriter:
+    """
+    Bounded queue of unsaved AdminEvents drained by a background thread with
+    bulk_create, so audit INSERTs stay off the request/webhook path and don't
+    take the SQLite writer lock once per action.
+    """
+
+    def __init__(self, maxsize: int = AUDIT_QUEUE_SIZE, batch_size: int = AUDIT_BATCH_SIZE, interval: float = AUDIT_FLUSH_SECONDS):
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue: "queue.Queue" = queue.Queue(maxsize)
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+    # ----- producer side (caller thread) -----
+    def submit(self, ev: AdminEvent) -> bool:
+        """Queue one event; False when the queue is full."""
+        try:
+            self._queue.put_nowait(ev)
+        except queue.Full:
+            return False
+        self._ensure_thread()
+        return True
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+                self._thread.start()
+
+    # ----- consumer side (writer thread) -----
+    def _run(self) -> None:
+        try:
+            while True:
+                batch = [self._queue.get()]
+                deadline = time.monotonic() + self.interval
+                while len(batch) < self.batch_size and batch[-1] is not _STOP and not isinstance(batch[-1], threading.Event):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+                events = [item for item in batch if isinstance(item, AdminEvent)]
+                write_events(events)
+                for item in batch:
+                    if isinstance(item, threading.Event):
+                        item.set()
+                if any(item is _STOP for item in batch):
+                    return
+        finally:
+            connection.close()
+
+    # ----- lifecycle -----
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until everything queued so far is written. Returns False on timeout."""
+        if self._thread is None or not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 10.0) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout=timeout)
+
+
+def write_events(events) -> None:
+    """INSERT events in one batch; a bad row (e.g. booking deleted since) is retried alone."""
+    if not events:
+        return
+    try:
+        AdminEvent.objects.bulk_create(events, batch_size=AUDIT_BATCH_SIZE)
+        return
+    except Exception as e:
+        log.warning("audit batch of %d failed (%s); writing one by one", len(events), e)
+    for ev in events:
+        try:
+            ev.save()
+        except Exception:
+            try:
+                ev.booking = None
+                ev.save()
+            except Exception as e:
+                log.exception("audit write failed for %s: %s", ev.event_type, e)
+
+
+_WRITER: Optional[AuditWriter] = None
+_WRITER_LOCK = threading.Lock()
+
+
+def _writer() -> AuditWriter:
+    global _WRITER
+    if _WRITER is None:
+        with _WRITER_LOCK:
+            if _WRITER is None:
+                _WRITER = AuditWriter()
+    return _WRITER
+
+
+def _enqueue(events) -> None:
+    writer = _writer()
+    overflow = [ev for ev in events if not writer.submit(ev)]
+    if overflow:
+        log.warning("audit queue full; writing %d event(s) synchronously", len(overflow))
+        write_events(overflow)
+
+
+def _persist(events) -> None:
+    if getattr(settings, "AUDIT_ASYNC", False):
+        # Queue only once the surrounding transaction commits, like the INSERT it replaces
+        transaction.on_commit(lambda: _enqueue(events))
+    elif len(events) == 1:
+        events[0].save()
+    else:
+        AdminEvent.objects.bulk_create(events, batch_size=AUDIT_BATCH_SIZE)
+
+
+def flush_audit(timeout: float = 5.0) -> bool:
+    """Wait for queued audit events to reach the database."""
+    return _WRITER.flush(timeout) if _WRITER is not None else True
+
+
+def _shutdown() -> None:
+    if _WRITER is not None:
+        _WRITER.close()
+
+
+atexit.register(_shutdown)
+
+
+def _actor_id(actor):
+    if actor and not isinstance(actor, AnonymousUser):
+        return getattr(actor, "id", None)
+    return None
+
+
 def emit(event_type: str, message: str = "", *, actor=None, booking: Optional[Booking] = None, context: Optional[Dict[str, Any]] = None):
     """
     Persist an AdminEvent and also log it.
     Safe if actor is AnonymousUser/None.
     Keep context small: ids, codes, times.
+    Returns the AdminEvent. With AUDIT_ASYNC on, the row is written by the
+    background writer after commit, so the returned instance is unsaved (no
+    pk yet) and must not be used as a foreign key or re-saved.
     """
     try:
-        actor_id = None
-        if actor and not isinstance(actor, AnonymousUser):
-            actor_id = getattr(actor, "id", None)
-        ev = AdminEvent.objects.create(
+        ev = AdminEvent(
             event_type=event_type,
             message=message or "",
-            actor_id=actor_id,
+            actor_id=_actor_id(actor),
             booking=booking,
             context=context or {},
         )
+        _persist([ev])
         log.info("audit %s: %s ctx=%s", event_type, message, (context or {}))
         return ev
     except Exception as e:
         # Never let audit failure block user actions
         log.exception("audit emit failed: %s", e)
         return None
+
+
+def emit_many(event_type: str, entries, *, actor=None) -> int:
+    """
+    Persist one AdminEvent per (booking, message, context) entry in a single
+    batched INSERT. Same safety rules as emit(). Returns the number written.
+    """
+    try:
+        actor_id = _actor_id(actor)
+        events = [
+            AdminEvent(event_type=event_type, message=message or "", actor_id=actor_id, booking=booking, context=context or {})
+            for booking, message, context in entries
+        ]
+        if events:
+            _persist(events)
+        log.info("audit %s: %d event(s)", event_type, len(events))
+        return len(events)
+    except Exception as e:
+        log.exception("audit emit_many failed: %s", e)
+        return 0
@@ -0,0 +1,139 @@
+"""
+Interval index for booking overlap checks.
+
+On SQLite, booking [start, end) intervals are mirrored into an R*Tree virtual
+table keyed by booking id, so "what overlaps this window?" is a logarithmic
+tree search instead of a scan over core_booking. Coordinates are whole minutes
+since the epoch (start floored, end ceiled), so the tree returns a superset
+and the exact start_dt/end_dt test is still applied on the joined rows. A row
+saved with end_dt before start_dt is indexed over the span between the two,
+which still covers every window the exact test can match.
+
+The tree is maintained by triggers on core_booking rather than model signals,
+so bulk_create, bulk_update, QuerySet.update and raw SQL writes are indexed
+in the same statement as the booking itself.
+
+Other backends (or a database without the table) fall back to the plain
+start_dt < end AND end_dt > start filter.
+"""
+from __future__ import annotations
+
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connections
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+TABLE = "core_booking_interval"
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+_AVAILABLE = {}
+
+
+def _floor_sql(col: str) -> str:
+    return f"(CAST(strftime('%s', {col}) AS INTEGER) / 60)"
+
+
+def _ceil_sql(col: str) -> str:
+    # Django stores a fractional part only when microseconds are non-zero
+    return f"((CAST(strftime('%s', {col}) AS INTEGER) + 59 + (instr({col}, '.') > 0)) / 60)"
+
+
+def _coords_sql(start: str, end: str) -> str:
+    return (
+        f"min({_floor_sql(start)}, {_floor_sql(end)}), "
+        f"max({_ceil_sql(start)}, {_ceil_sql(end)})"
+    )
+
+
+def _has_span_sql(start: str, end: str) -> str:
+    return f"strftime('%s', {start}) IS NOT NULL AND strftime('%s', {end}) IS NOT NULL"
+
+
+TRIGGERS = {
+    f"{TABLE}_ai": f"""
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_ai AFTER INSERT ON core_booking
+        WHEN {_has_span_sql("NEW.start_dt", "NEW.end_dt")}
+        BEGIN
+            INSERT OR REPLACE INTO {TABLE} (id, start_min, end_min)
+            VALUES (NEW.id, {_coords_sql("NEW.start_dt", "NEW.end_dt")});
+        END""",
+    f"{TABLE}_au": f"""
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_au AFTER UPDATE OF id, start_dt, end_dt ON core_booking
+        BEGIN
+            DELETE FROM {TABLE} WHERE id = OLD.id;
+            INSERT OR REPLACE INTO {TABLE} (id, start_min, end_min)
+            SELECT NEW.id, {_coords_sql("NEW.start_dt", "NEW.end_dt")}
+            WHERE {_has_span_sql("NEW.start_dt", "NEW.end_dt")};
+        END""",
+    f"{TABLE}_ad": f"""
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_ad AFTER DELETE ON core_booking
+        BEGIN
+            DELETE FROM {TABLE} WHERE id = OLD.id;
+        END""",
+}
+
+
+def _as_aware(dt):
+    if isinstance(dt, str):
+        dt = parse_datetime(dt)
+    if dt is not None and timezone.is_naive(dt):
+        dt = timezone.make_aware(dt)
+    return dt
+
+
+def _minutes(dt, round_up=False) -> int:
+    seconds = (_as_aware(dt) - _EPOCH).total_seconds()
+    return math.ceil(seconds / 60) if round_up else math.floor(seconds / 60)
+
+
+def create_table(connection) -> None:
+    """Create the R*Tree and the core_booking triggers that keep it in sync."""
+    with connection.cursor() as cur:
+        cur.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING rtree_i32(id, start_min, end_min)")
+        for sql in TRIGGERS.values():
+            cur.execute(sql)
+    _AVAILABLE.pop(connection.alias, None)
+
+
+def index_available(using: str = "default") -> bool:
+    """True when the R*Tree exists on this connection (checked once per alias)."""
+    if using not in _AVAILABLE:
+        connection = connections[using]
+        if connection.vendor != "sqlite":
+            _AVAILABLE[using] = False
+        else:
+            with connection.cursor() as cur:
+                cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [TABLE])
+                _AVAILABLE[using] = cur.fetchone() is not None
+    return _AVAILABLE[using]
+
+
+def rebuild(using: str = "default") -> int:
+    """Repopulate the index from core_booking; returns the number of rows indexed."""
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        return 0
+    create_table(connection)
+    with connection.cursor() as cur:
+        cur.execute(f"DELETE FROM {TABLE}")
+        cur.execute(
+            f"INSERT INTO {TABLE} (id, start_min, end_min) "
+            f"SELECT id, {_coords_sql('start_dt', 'end_dt')} FROM core_booking "
+            f"WHERE {_has_span_sql('start_dt', 'end_dt')}"
+        )
+        return cur.rowcount
+
+
+def overlapping(qs, start_dt, end_dt):
+    """Restrict a Booking queryset to rows overlapping [start_dt, end_dt)."""
+    exact = qs.filter(start_dt__lt=end_dt, end_dt__gt=start_dt)
+    if not index_available(qs.db):
+        return exact
+    candidates = RawSQL(
+        f"SELECT id FROM {TABLE} WHERE start_min < %s AND end_min > %s",
+        [_minutes(end_dt, round_up=True), _minutes(start_dt)],
+    )
+    return exact.filter(id__in=candidates)
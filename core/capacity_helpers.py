@@ -1,12 +1,30 @@
 """
 Capacity helpers for flexible timetable blocks.
 """
+import hashlib
+from bisect import bisect_left, bisect_right
+
+from django.core.cache import cache
+from django.db import transaction
 from django.utils import timezone
-from django.db.models import Q
-from .models import TimetableBlock, BlockCapacity, Booking, CapacityHold, ServiceDefaults
+from django.db.models import Count, F, Min, OuterRef, Subquery
+from .booking_intervals import overlapping
+from .models import (
+    TimetableBlock, BlockCapacity, Booking, CapacityHold, ServiceDefaults,
+    TimetableTemplate, TimetableTemplateBlock, TimetableTemplateCapacity,
+)
 from datetime import datetime, timedelta
 
 HOLD_MINUTES = 10
+# Upper bound on how long a day's capacity snapshot is served from cache
+CAPACITY_CACHE_SECONDS = 60
+AVAILABILITY_CACHE_SECONDS = 30
+# Longest range the availability search will scan in one request
+AVAILABILITY_MAX_DAYS = 31
+# Longest range a single template generation may cover
+TEMPLATE_MAX_DAYS = 366
+BULK_BATCH_SIZE = 500
+INACTIVE_BOOKING_STATUSES = ["cancelled", "canceled", "void", "voided"]
 
 
 def get_default_duration_minutes(service_code: str) -> int:
@@ -24,43 +42,311 @@ def list_blocks_for_date(date):
 
 def block_remaining_capacity(block: TimetableBlock, service_code: str) -> int:
     """
-    Calculate remaining capacity for a service in a block.
-    Counts active bookings and holds against the block capacity.
+    Remaining capacity for a service in a block, counted from bookings and holds.
+    Holds that have expired but not yet been swept are handed back.
     """
     cap = BlockCapacity.objects.filter(block=block, service_code=service_code).first()
     if not cap:
         return 0
-    
-    # Count bookings in this block window for that service
-    tz = timezone.get_current_timezone()
+    return max(cap.capacity - count_capacity_usage(block, service_code, active_holds_only=True), 0)
+
+
+# ---------- Usage ----------
+# Usage is always counted from bookings and holds; nothing stores it, so writes
+# that skip Model.save() (bulk_update, QuerySet.update, raw SQL) can't make a
+# reservation oversell or refuse a free unit.
+
+def count_capacity_usage(block: TimetableBlock, service_code: str, active_holds_only: bool = False) -> int:
+    """Active bookings overlapping the block plus its holds (unexpired ones only if asked)."""
+    start_dt, end_dt = _block_window(block, timezone.get_current_timezone())
+    used = overlapping(
+        Booking.objects.filter(service_code=service_code, deleted=False), start_dt, end_dt
+    ).exclude(status__in=INACTIVE_BOOKING_STATUSES).count()
+    holds = CapacityHold.objects.filter(block_id=block.pk, service_code=service_code)
+    if active_holds_only:
+        holds = holds.filter(expires_at__gt=timezone.now())
+    return used + holds.count()
+
+
+def reserve_capacity(block: TimetableBlock, service_code: str) -> bool:
+    """
+    Check that one more hold or booking fits; False when the block is full.
+
+    A serialized recount: the BlockCapacity row is locked, then bookings and
+    holds are counted against its capacity. Call this inside the transaction
+    that creates the hold or booking, so the lock is held until the row exists
+    and the next reservation's count sees it.
+    """
+    with transaction.atomic():
+        caps = BlockCapacity.objects.filter(block=block, service_code=service_code)
+        # Lock with a no-op write rather than select_for_update(), which SQLite
+        # ignores: concurrent reservers then queue here instead of counting early
+        if not caps.update(capacity=F("capacity")):
+            return False
+        capacity = caps.values_list("capacity", flat=True).get()
+        return count_capacity_usage(block, service_code) < capacity
+
+
+def release_expired_holds(block: TimetableBlock, service_code: str) -> int:
+    """Delete expired holds for one block/service so their units can be re-used."""
+    return CapacityHold.objects.filter(
+        block=block, service_code=service_code, expires_at__lte=timezone.now()
+    ).delete()[0]
+
+
+def reserve_capacity_reclaiming(block: TimetableBlock, service_code: str) -> bool:
+    """
+    reserve_capacity(), retried once after freeing this block's expired holds:
+    lapsed holds keep their unit until the purge job runs.
+    """
+    if reserve_capacity(block, service_code):
+        return True
+    release_expired_holds(block, service_code)
+    return reserve_capacity(block, service_code)
+
+
+def create_hold(block: TimetableBlock, service_code: str, client, minutes: int = HOLD_MINUTES):
+    """
+    Reserve one unit and create a short-lived capacity hold.
+    Returns None when the block has no capacity left for the service.
+    """
+    with transaction.atomic():
+        if not reserve_capacity_reclaiming(block, service_code):
+            return None
+        return CapacityHold.objects.create(
+            block=block,
+            service_code=service_code,
+            client=client,
+            expires_at=timezone.now() + timedelta(minutes=minutes),
+        )
+
+
+def _block_window(block: TimetableBlock, tz):
     start_dt = timezone.make_aware(datetime.combine(block.date, block.start_time), tz)
     end_dt = timezone.make_aware(datetime.combine(block.date, block.end_time), tz)
-    
-    bookings_count = Booking.objects.filter(
-        service_code=service_code,
-        start_dt__lt=end_dt,
-        end_dt__gt=start_dt,
-        deleted=False
-    ).exclude(status__in=["cancelled", "canceled", "void", "voided"]).count()
-    
-    # Count active holds (not expired)
-    CapacityHold.purge_expired()
-    holds_count = CapacityHold.objects.filter(
-        block=block,
-        service_code=service_code,
-        expires_at__gt=timezone.now()
-    ).count()
-    
-    remaining = max(cap.capacity - bookings_count - holds_count, 0)
-    return remaining
+    return start_dt, end_dt
 
 
-def create_hold(block: TimetableBlock, service_code: str, client, minutes: int = HOLD_MINUTES):
-    """Create a short-lived capacity hold."""
-    expires = timezone.now() + timedelta(minutes=minutes)
-    return CapacityHold.objects.create(
-        block=block,
-        service_code=service_code,
-        client=client,
-        expires_at=expires
+def compute_blocks_capacity_range(start_date, end_date, service_code: str):
+    """
+    Remaining capacity for every block between start_date and end_date (inclusive)
+    in three queries: blocks (+ their capacity for the service), overlapping
+    bookings, grouped active holds.
+
+    Bookings are counted per block with a sweep over sorted start/end times:
+    overlapping(s, e) = #(start < e) - #(end <= s).
+
+    Returns (days, hold_expiry): days maps each date that has blocks to a list of
+    dicts ordered by start_time; hold_expiry is the earliest active hold expiry.
+    """
+    tz = timezone.get_current_timezone()
+    now = timezone.now()
+    cap_for_service = BlockCapacity.objects.filter(block=OuterRef("pk"), service_code=service_code).values("capacity")[:1]
+    blocks = list(
+        TimetableBlock.objects.filter(date__gte=start_date, date__lte=end_date)
+        .annotate(service_capacity=Subquery(cap_for_service))
+        .order_by("date", "start_time")
+    )
+    if not blocks:
+        return {}, None
+
+    windows = [_block_window(b, tz) for b in blocks]
+    range_start = min(w[0] for w in windows)
+    range_end = max(w[1] for w in windows)
+    intervals = list(
+        overlapping(Booking.objects.filter(service_code=service_code, deleted=False), range_start, range_end)
+        .exclude(status__in=INACTIVE_BOOKING_STATUSES).values_list("start_dt", "end_dt")
+    )
+    starts = sorted(s for s, _ in intervals)
+    ends = sorted(e for _, e in intervals)
+
+    holds = {}
+    hold_expiry = None
+    for row in (
+        CapacityHold.objects.filter(
+            block__date__gte=start_date, block__date__lte=end_date,
+            service_code=service_code, expires_at__gt=now,
+        )
+        .values("block_id")
+        .annotate(n=Count("token"), first_expiry=Min("expires_at"))
+    ):
+        holds[row["block_id"]] = row["n"]
+        if hold_expiry is None or row["first_expiry"] < hold_expiry:
+            hold_expiry = row["first_expiry"]
+
+    days = {}
+    for blk, (start_dt, end_dt) in zip(blocks, windows):
+        if blk.service_capacity is None:
+            remaining = 0
+        else:
+            booked = bisect_left(starts, end_dt) - bisect_right(ends, start_dt)
+            remaining = max(blk.service_capacity - booked - holds.get(blk.id, 0), 0)
+        days.setdefault(blk.date, []).append({
+            "id": blk.id,
+            "label": blk.label or f"{blk.start_time}–{blk.end_time}",
+            "start": str(blk.start_time),
+            "end": str(blk.end_time),
+            "remaining": remaining,
+        })
+    return days, hold_expiry
+
+
+def compute_blocks_capacity(date, service_code: str):
+    """Single-day form of compute_blocks_capacity_range; returns (items, hold_expiry)."""
+    days, hold_expiry = compute_blocks_capacity_range(date, date, service_code)
+    return days.get(date, []), hold_expiry
+
+
+def _capacity_version_key(date) -> str:
+    return f"blockcap:v:{date.isoformat()}"
+
+
+def invalidate_blocks_capacity(*dates) -> None:
+    """Drop cached capacity for the given dates (all services) by bumping their version."""
+    for d in dates:
+        if d is None:
+            continue
+        key = _capacity_version_key(d)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def blocks_capacity_for_date(date, service_code: str):
+    """
+    Cached wrapper around compute_blocks_capacity, keyed by (date, service_code).
+    Entries never outlive the earliest active hold, so expiring holds free capacity on time.
+    """
+    version = cache.get(_capacity_version_key(date), 0)
+    key = f"blockcap:{date.isoformat()}:{service_code}:{version}"
+    items = cache.get(key)
+    if items is not None:
+        return items
+    items, hold_expiry = compute_blocks_capacity(date, service_code)
+    cache.set(key, items, _cache_ttl(CAPACITY_CACHE_SECONDS, hold_expiry))
+    return items
+
+
+def _cache_ttl(limit: int, hold_expiry) -> int:
+    if hold_expiry is None:
+        return limit
+    return min(limit, max(int((hold_expiry - timezone.now()).total_seconds()), 1))
+
+
+def availability_for_range(start_date, days: int, service_code: str):
+    """
+    Blocks with remaining capacity for `days` consecutive dates from start_date,
+    as [{"date": iso, "blocks": [...]}, ...] (dates without free blocks omitted).
+    Cached briefly; any change on a covered date invalidates via its version.
+    """
+    end_date = start_date + timedelta(days=days - 1)
+    dates = [start_date + timedelta(days=i) for i in range(days)]
+    versions = cache.get_many([_capacity_version_key(d) for d in dates])
+    stamp = ",".join(str(versions.get(_capacity_version_key(d), 0)) for d in dates)
+    key = f"availability:{service_code}:{start_date.isoformat()}:{days}:{hashlib.sha1(stamp.encode()).hexdigest()}"
+    result = cache.get(key)
+    if result is not None:
+        return result
+    by_day, hold_expiry = compute_blocks_capacity_range(start_date, end_date, service_code)
+    result = []
+    for d in dates:
+        free = [item for item in by_day.get(d, []) if item["remaining"] > 0]
+        if free:
+            result.append({"date": d.isoformat(), "blocks": free})
+    cache.set(key, result, _cache_ttl(AVAILABILITY_CACHE_SECONDS, hold_expiry))
+    return result
+
+
+# ---------- Bulk block generation ----------
+
+def bulk_create_blocks(specs):
+    """
+    Insert blocks and capacities in bulk.
+
+    specs: iterable of (date, start_time, end_time, label, capacities) where
+    capacities is a list of (service_code, capacity, allow_overlap). Blocks that
+    already exist (same date/start/end/label) and existing capacities are kept;
+    only missing rows are inserted.
+
+    Returns {"blocks_created": n, "capacities_created": n}.
+    """
+    specs = [(d, st, et, label or "", caps) for d, st, et, label, caps in specs]
+    if not specs:
+        return {"blocks_created": 0, "capacities_created": 0}
+    first, last = min(sp[0] for sp in specs), max(sp[0] for sp in specs)
+    in_range = TimetableBlock.objects.filter(date__gte=first, date__lte=last)
+
+    def _key(blk):
+        return (blk.date, blk.start_time, blk.end_time, blk.label or "")
+
+    existing = {_key(b) for b in in_range.only("date", "start_time", "end_time", "label")}
+    new_blocks = [
+        TimetableBlock(date=d, start_time=st, end_time=et, label=label)
+        for d, st, et, label, _ in specs if (d, st, et, label) not in existing
+    ]
+    TimetableBlock.objects.bulk_create(new_blocks, batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+
+    # ignore_conflicts gives no PKs back; one range query maps keys to ids
+    ids = {_key(b): b.id for b in in_range.only("id", "date", "start_time", "end_time", "label")}
+    have_caps = set(
+        BlockCapacity.objects.filter(block__date__gte=first, block__date__lte=last).values_list("block_id", "service_code")
+    )
+
+    new_caps = []
+    for d, st, et, label, caps in specs:
+        block_id = ids.get((d, st, et, label))
+        if block_id is None:
+            continue
+        for code, capacity, allow_overlap in caps:
+            if (block_id, code) in have_caps:
+                continue
+            have_caps.add((block_id, code))
+            new_caps.append(BlockCapacity(
+                block_id=block_id, service_code=code, capacity=capacity, allow_overlap=allow_overlap,
+            ))
+    BlockCapacity.objects.bulk_create(new_caps, batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+
+    # bulk_create skips signals, so drop cached capacity for the touched dates here
+    invalidate_blocks_capacity(*{sp[0] for sp in specs})
+    return {"blocks_created": len(new_blocks), "capacities_created": len(new_caps)}
+
+
+def generate_blocks_from_template(template: TimetableTemplate, start_date, end_date):
+    """Stamp a weekly template onto every date in [start_date, end_date]."""
+    by_weekday = {}
+    for tb in template.blocks.prefetch_related("capacities"):
+        caps = [(c.service_code, c.capacity, c.allow_overlap) for c in tb.capacities.all()]
+        by_weekday.setdefault(tb.weekday, []).append((tb.start_time, tb.end_time, tb.label, caps))
+    specs = []
+    day = start_date
+    while day <= end_date:
+        for st, et, label, caps in by_weekday.get(day.weekday(), []):
+            specs.append((day, st, et, label, caps))
+        day += timedelta(days=1)
+    return bulk_create_blocks(specs)
+
+
+def save_week_as_template(name: str, week_start) -> TimetableTemplate:
+    """Capture the seven days from week_start as a new (or replaced) template."""
+    template, _ = TimetableTemplate.objects.get_or_create(name=name)
+    template.blocks.all().delete()
+    blocks = list(
+        TimetableBlock.objects.filter(date__gte=week_start, date__lt=week_start + timedelta(days=7))
+        .prefetch_related("capacities")
     )
+    tblocks = TimetableTemplateBlock.objects.bulk_create([
+        TimetableTemplateBlock(
+            template=template, weekday=b.date.weekday(),
+            start_time=b.start_time, end_time=b.end_time, label=b.label or "",
+        )
+        for b in blocks
+    ])
+    TimetableTemplateCapacity.objects.bulk_create([
+        TimetableTemplateCapacity(
+            template_block=tb, service_code=c.service_code, capacity=c.capacity, allow_overlap=c.allow_overlap,
+        )
+        for b, tb in zip(blocks, tblocks)
+        for c in b.capacities.all()
+    ])
+    return template
@@ -2,7 +2,7 @@ from django import forms
 from datetime import datetime, timedelta
 from django.utils import timezone as django_timezone
 from .models import Pet, Client, Tag, Service
-from .models_service_windows import ServiceWindow
+from .service_window_rules import blocking_rule
 from .utils_conflicts import has_conflict
 from .constants import BRISBANE
 
@@ -99,12 +99,10 @@ class PortalBookingForm(forms.Form):
         # Convert naive local datetime to aware for timezone comparisons
         aware_start = django_timezone.make_aware(start_dt, BRISBANE)
         aware_end = django_timezone.make_aware(end_dt, BRISBANE)
-        win_qs = ServiceWindow.objects.filter(active=True, block_in_portal=True)
-        for w in win_qs:
-            if w.applies_on(aware_start) and w.overlaps(aware_start, aware_end) and w.blocks_service_in_portal(svc):
-                self.add_error(None, 
-                    f'"{svc.name}" is not bookable during {w.title} ({w.start_time}–{w.end_time}). '
-                    "Please choose another time."
-                )
-                break
+        w = blocking_rule(svc, aware_start, aware_end)
+        if w is not None:
+            self.add_error(None, 
+                f'"{svc.name}" is not bookable during {w.title} ({w.start_time}–{w.end_time}). '
+                "Please choose another time."
+            )
         return cleaned
\ No newline at end of file
@@ -2,6 +2,7 @@ from datetime import datetime
 from zoneinfo import ZoneInfo
 from django.utils.timezone import make_naive, is_aware
 import logging
+from typing import Dict
 from .models import Booking, Service
 
 log = logging.getLogger(__name__)
@@ -44,66 +45,105 @@ def _cmp_dt(a, b):
     return a == b
 
 
-def validate_invoice_against_bookings(invoice_obj):
-    """
-    For each invoice line with metadata.booking_id:
-      - compare booking_start/booking_end/dogs/location/service_code
-      - if mismatch: set requires_admin_review with a JSON diff
-    Handles multiple line-items and multiple bookings per invoice.
-    """
-    # stripe object or dict
-    invoice_id = getattr(invoice_obj, "id", None) or invoice_obj.get("id")
+def _invoice_lines(invoice_obj):
+    """(invoice_id, lines) for a Stripe object or plain dict."""
+    invoice_id = getattr(invoice_obj, "id", None) or (invoice_obj.get("id") if isinstance(invoice_obj, dict) else None)
     if hasattr(invoice_obj, "lines"):
         lines = getattr(invoice_obj.lines, "data", []) or []
     else:
         lines = (invoice_obj.get("lines") or {}).get("data", []) or []
+    return invoice_id, lines
 
-    for li in lines:
-        # robust access to metadata
-        md = getattr(li, "metadata", None)
-        if md is None and isinstance(li, dict):
-            md = li.get("metadata")
-        if not md:
-            continue
-        booking_id = md.get("booking_id")
-        if not booking_id:
-            continue
+
+def _line_attr(li, name):
+    val = getattr(li, name, None)
+    if val is None and isinstance(li, dict):
+        val = li.get(name)
+    return val
+
+
+def diff_booking_vs_metadata(b: Booking, md: dict, invoice_id=None) -> dict:
+    """
+    Compare booking_start/booking_end/dogs/location/service_code from line
+    metadata against a booking. Returns {"field": {"booking": ..., "invoice": ...}}.
+    """
+    diff = {}
+    inv_start = _parse_iso_local(md.get("booking_start"))
+    inv_end = _parse_iso_local(md.get("booking_end"))
+    if inv_start and not _cmp_dt(b.start_dt, inv_start):
+        diff["start_dt"] = {"booking": b.start_dt.isoformat(), "invoice": inv_start.isoformat()}
+    if inv_end and not _cmp_dt(b.end_dt, inv_end):
+        diff["end_dt"] = {"booking": b.end_dt.isoformat(), "invoice": inv_end.isoformat()}
+
+    if "dogs" in md:
         try:
-            bid = int(str(booking_id))
+            inv_dogs = int(md["dogs"])
+            if getattr(b, "dogs", None) is not None and b.dogs != inv_dogs:
+                diff["dogs"] = {"booking": b.dogs, "invoice": inv_dogs}
         except Exception:
-            log.warning("Invoice %s: non-integer booking_id=%r", invoice_id, booking_id)
-            continue
+            log.warning("Invoice %s b%s: invalid dogs=%r", invoice_id, b.id, md["dogs"])
 
-        b = Booking.objects.filter(id=bid).select_related("service").first()
-        if not b:
-            log.warning("Invoice %s: booking_id %s not found locally", invoice_id, booking_id)
-            continue
+    if "location" in md:
+        inv_loc = (md.get("location") or "").strip()
+        if (b.location or "") != inv_loc:
+            diff["location"] = {"booking": b.location or "", "invoice": inv_loc}
 
-        diff = {}
-        inv_start = _parse_iso_local(md.get("booking_start"))
-        inv_end = _parse_iso_local(md.get("booking_end"))
-        if inv_start and not _cmp_dt(b.start_dt, inv_start):
-            diff["start_dt"] = {"booking": b.start_dt.isoformat(), "invoice": inv_start.isoformat()}
-        if inv_end and not _cmp_dt(b.end_dt, inv_end):
-            diff["end_dt"] = {"booking": b.end_dt.isoformat(), "invoice": inv_end.isoformat()}
+    if "service_code" in md:
+        inv_svc = (md.get("service_code") or "").strip()
+        if b.service and b.service.code and b.service.code != inv_svc:
+            diff["service_code"] = {"booking": b.service.code, "invoice": inv_svc}
+    return diff
 
-        if "dogs" in md:
-            try:
-                inv_dogs = int(md["dogs"])
-                if getattr(b, "dogs", None) is not None and b.dogs != inv_dogs:
-                    diff["dogs"] = {"booking": b.dogs, "invoice": inv_dogs}
-            except Exception:
-                log.warning("Invoice %s b%s: invalid dogs=%r", invoice_id, b.id, md["dogs"])
 
-        if "location" in md:
-            inv_loc = (md.get("location") or "").strip()
-            if (b.location or "") != inv_loc:
-                diff["location"] = {"booking": b.location or "", "invoice": inv_loc}
+def validate_invoices(invoices) -> dict:
+    """
+    Validate many invoices at once. For each line with metadata.booking_id the
+    booking is compared against the line metadata; mismatching bookings get
+    requires_admin_review + review_diff.
 
-        if "service_code" in md:
-            inv_svc = (md.get("service_code") or "").strip()
-            if b.service and b.service.code and b.service.code != inv_svc:
-                diff["service_code"] = {"booking": b.service.code, "invoice": inv_svc}
+    All referenced bookings are loaded in one query and flags are written with
+    one bulk_update, so the query count doesn't grow with the number of lines.
+
+    Returns {"checked", "flagged", "newly_flagged", "missing", "invalid", "results"}
+    where results has one entry per line carrying a booking_id:
+    {"invoice_id", "line_id", "booking_id", "status": ok|flagged|missing|invalid, "diff"}.
+    """
+    refs = []  # (invoice_id, line_id, raw booking_id, bid or None, md)
+    for invoice_obj in invoices:
+        invoice_id, lines = _invoice_lines(invoice_obj)
+        for li in lines:
+            md = _line_attr(li, "metadata")
+            if not md:
+                continue
+            booking_id = md.get("booking_id")
+            if not booking_id:
+                continue
+            try:
+                bid = int(str(booking_id))
+            except Exception:
+                log.warning("Invoice %s: non-integer booking_id=%r", invoice_id, booking_id)
+                bid = None
+            refs.append((invoice_id, _line_attr(li, "id"), booking_id, bid, md))
+
+    bookings = Booking.objects.select_related("service").in_bulk({r[3] for r in refs if r[3] is not None})
+    was_flagged = {bid: b.requires_admin_review for bid, b in bookings.items()}
+    summary = {"checked": 0, "flagged": 0, "newly_flagged": 0, "missing": 0, "invalid": 0, "results": []}
+    flagged: Dict[int, Booking] = {}
+    for invoice_id, line_id, raw_id, bid, md in refs:
+        result = {"invoice_id": invoice_id, "line_id": line_id, "booking_id": bid, "status": "ok", "diff": {}}
+        summary["results"].append(result)
+        if bid is None:
+            result["status"] = "invalid"
+            summary["invalid"] += 1
+            continue
+        b = bookings.get(bid)
+        if b is None:
+            log.warning("Invoice %s: booking_id %s not found locally", invoice_id, raw_id)
+            result["status"] = "missing"
+            summary["missing"] += 1
+            continue
+        summary["checked"] += 1
+        diff = diff_booking_vs_metadata(b, md, invoice_id=invoice_id)
 
         # optional debug: unknown keys present
         unknown = sorted(set(md.keys()) - KNOWN_KEYS)
@@ -111,10 +151,30 @@ def validate_invoice_against_bookings(invoice_obj):
             log.debug("Invoice %s b%s: unused metadata keys: %s", invoice_id, b.id, unknown)
 
         if diff:
+            result["status"] = "flagged"
+            result["diff"] = diff
             b.requires_admin_review = True
             b.review_diff = diff
             b.review_source_invoice_id = invoice_id
-            b.save(update_fields=["requires_admin_review", "review_diff", "review_source_invoice_id"])
+            flagged[b.id] = b
             log.warning("Invoice %s: booking %s flagged for review: %s", invoice_id, b.id, diff)
 
-    return True
+    if flagged:
+        Booking.objects.bulk_update(
+            list(flagged.values()), ["requires_admin_review", "review_diff", "review_source_invoice_id"], batch_size=500
+        )
+        # bulk_update skips signals; the portal's "under review" chip is cached per client version
+        from .portal_cache import bump_client_version
+        for client_id in {b.client_id for b in flagged.values()}:
+            bump_client_version(client_id)
+    summary["flagged"] = len(flagged)
+    summary["newly_flagged"] = sum(1 for bid in flagged if not was_flagged.get(bid))
+    return summary
+
+
+def validate_invoice_against_bookings(invoice_obj):
+    """
+    Validate a single invoice (see validate_invoices). Handles multiple
+    line-items and multiple bookings per invoice.
+    """
+    return validate_invoices([invoice_obj])
@@ -1,85 +1,255 @@
-"""Simple file logging utility for subscription sync operations."""
+"""Buffered file logging for subscription sync operations.
 
+Callers only enqueue a record; a background thread drains the queue in
+batches, appends them as JSON lines and rotates the file by size. This keeps
+file I/O out of the sync hot loop and out of request threads.
+"""
+
+import atexit
+import json
+import logging
 import os
+import queue
+import threading
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+# Records written per flush; the writer drains whatever is queued up to this many
+BATCH_SIZE = 200
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 3
+
+_STOP = object()
+
+
+def _log_path(file_name: str) -> Path:
+    """Resolve a log file name relative to SYNC_LOG_DIR (default: the Django project root)."""
+    try:
+        from django.conf import settings
+        return Path(getattr(settings, "SYNC_LOG_DIR", None) or settings.BASE_DIR) / file_name
+    except Exception:
+        # Fallback if Django not available/configured
+        return Path.cwd() / file_name
+
+
+def _rotation_settings():
+    try:
+        from django.conf import settings
+        return (
+            int(getattr(settings, "SYNC_LOG_MAX_BYTES", DEFAULT_MAX_BYTES)),
+            int(getattr(settings, "SYNC_LOG_BACKUP_COUNT", DEFAULT_BACKUP_COUNT)),
+        )
+    except Exception:
+        return DEFAULT_MAX_BYTES, DEFAULT_BACKUP_COUNT
+
+
+# (path, max_bytes, backup_count) a record is written to
+_Target = Tuple[Path, int, int]
+
+
+class BufferedJsonLineHandler(logging.Handler):
+    """
+    Logging handler that formats records as JSON lines and hands them to a
+    background writer thread. emit() never touches the filesystem; it only
+    resolves the target file (see target()) and queues the line with it.
+    """
+
+    def __init__(self, path: Path, max_bytes: int = DEFAULT_MAX_BYTES, backup_count: int = DEFAULT_BACKUP_COUNT):
+        super().__init__()
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+    # ----- producer side (caller thread) -----
+    def target(self) -> _Target:
+        """File and rotation limits for a record emitted now."""
+        return self.path, self.max_bytes, self.backup_count
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self._queue.put((self.target(), self.format(record)))
+            self._ensure_thread()
+        except Exception:
+            self.handleError(record)
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="seconds"),
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id and request_id != "-":
+            entry["request_id"] = request_id
+        return json.dumps(entry, default=str)
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name=f"sync-log-{self.path.name}", daemon=True
+                )
+                self._thread.start()
+
+    # ----- consumer side (writer thread) -----
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            by_target: Dict[_Target, list] = {}
+            waiters, stop = [], False
+            for item in batch:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    target, line = item
+                    by_target.setdefault(target, []).append(line)
+            for target, lines in by_target.items():
+                self._write(target, lines)
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                return
+
+    def _write(self, target: _Target, lines) -> None:
+        path, max_bytes, backup_count = target
+        data = "".join(f"{line}\n" for line in lines).encode("utf-8")
+        try:
+            if max_bytes and path.exists() and path.stat().st_size + len(data) > max_bytes:
+                self._rotate(path, backup_count)
+            with open(path, "ab") as f:
+                f.write(data)
+        except Exception as e:
+            # Never let logging failures surface in the sync itself
+            log.warning("Failed to write to log file %s: %s", path, e)
+
+    @staticmethod
+    def _rotate(path: Path, backup_count: int) -> None:
+        if backup_count <= 0:
+            path.unlink(missing_ok=True)
+            return
+        for i in range(backup_count - 1, 0, -1):
+            src = path.with_name(f"{path.name}.{i}")
+            if src.exists():
+                os.replace(src, path.with_name(f"{path.name}.{i + 1}"))
+        os.replace(path, path.with_name(f"{path.name}.1"))
+
+    # ----- lifecycle -----
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until everything queued so far is written. Returns False on timeout."""
+        if self._thread is None or not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout=5.0)
+        super().close()
+
+
+class _SyncFileHandler(BufferedJsonLineHandler):
+    """Handler for one sync log file name; location and rotation follow current settings."""
+
+    def __init__(self, file_name: str):
+        super().__init__(Path(file_name))
+        self.file_name = file_name
+
+    def target(self) -> _Target:
+        max_bytes, backups = _rotation_settings()
+        return _log_path(self.file_name), max_bytes, backups
+
+
+_HANDLERS: Dict[str, BufferedJsonLineHandler] = {}
+_HANDLERS_LOCK = threading.Lock()
+
+
+def _logger_for(file_name: str) -> logging.Logger:
+    """One non-propagating logger + buffered handler per log file."""
+    logger = logging.getLogger(f"core.sync_file.{file_name}")
+    if file_name not in _HANDLERS:
+        with _HANDLERS_LOCK:
+            if file_name not in _HANDLERS:
+                handler = _SyncFileHandler(file_name)
+                try:
+                    from .logging_filters import RequestIDLogFilter
+                    handler.addFilter(RequestIDLogFilter())
+                except Exception:
+                    pass
+                logger.addHandler(handler)
+                logger.setLevel(logging.INFO)
+                logger.propagate = False
+                _HANDLERS[file_name] = handler
+    return logger
+
+
+def flush_sync_logs(timeout: float = 5.0) -> bool:
+    """Wait for all queued sync log lines to reach disk."""
+    return all(h.flush(timeout) for h in list(_HANDLERS.values()))
+
+
+def _shutdown() -> None:
+    for handler in list(_HANDLERS.values()):
+        handler.close()
+
+
+atexit.register(_shutdown)
 
 
 def log_subscription_error(message: str, error_file: str = "subscription_error_log.txt") -> None:
-    """Log subscription sync errors to a file.
-    
+    """Queue a subscription sync error for the error log file.
+
     Args:
         message: Error message to log
         error_file: Name of the error log file (default: subscription_error_log.txt)
     """
-    # Determine log file path relative to Django project root
-    try:
-        from django.conf import settings
-        log_path = Path(settings.BASE_DIR) / error_file
-    except ImportError:
-        # Fallback if Django not available
-        log_path = Path.cwd() / error_file
-    
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_entry = f"[{timestamp}] {message}\n"
-    
-    try:
-        with open(log_path, "a", encoding="utf-8") as f:
-            f.write(log_entry)
-    except Exception as e:
-        # Fallback to print if file writing fails
-        print(f"Failed to write to log file {log_path}: {e}")
-        print(f"Original log message: {log_entry.strip()}")
+    _logger_for(error_file).error(message)
 
 
 def log_subscription_info(message: str, info_file: str = "subscription_sync_log.txt") -> None:
-    """Log subscription sync info messages to a file.
-    
+    """Queue a subscription sync info message for the info log file.
+
     Args:
         message: Info message to log
         info_file: Name of the info log file (default: subscription_sync_log.txt)
     """
-    # Determine log file path relative to Django project root
-    try:
-        from django.conf import settings
-        log_path = Path(settings.BASE_DIR) / info_file
-    except ImportError:
-        # Fallback if Django not available
-        log_path = Path.cwd() / info_file
-    
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_entry = f"[{timestamp}] {message}\n"
-    
-    try:
-        with open(log_path, "a", encoding="utf-8") as f:
-            f.write(log_entry)
-    except Exception as e:
-        # Fallback to print if file writing fails
-        print(f"Failed to write to log file {log_path}: {e}")
-        print(f"Original log message: {log_entry.strip()}")
+    _logger_for(info_file).info(message)
 
 
 def clear_log_file(log_file: str) -> bool:
-    """Clear contents of a log file.
-    
+    """Clear contents of a log file (pending lines are flushed first).
+
     Args:
         log_file: Name of the log file to clear
-        
+
     Returns:
         bool: True if successful, False otherwise
     """
-    try:
-        from django.conf import settings
-        log_path = Path(settings.BASE_DIR) / log_file
-    except ImportError:
-        # Fallback if Django not available
-        log_path = Path.cwd() / log_file
-    
+    handler = _HANDLERS.get(log_file)
+    if handler is not None:
+        handler.flush()
+    log_path = _log_path(log_file)
+
     try:
         if log_path.exists():
             log_path.unlink()
         return True
     except Exception as e:
         log_subscription_error(f"Failed to clear log file {log_path}: {e}")
-        return False
\ No newline at end of file
+        return False
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.retention import POLICIES, RETENTION_BATCH_SIZE, apply_retention
+
+
+class Command(BaseCommand):
+    help = "Archive rows past their retention cutoff to gzip JSONL files and delete them from the hot tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--policy", action="append", choices=sorted(POLICIES), help="Only run this policy (repeatable).")
+        parser.add_argument("--batch-size", type=int, default=RETENTION_BATCH_SIZE)
+        parser.add_argument("--dry-run", action="store_true", help="Only count the rows that would be archived.")
+
+    def handle(self, *args, **opts):
+        try:
+            results = apply_retention(opts["policy"], batch_size=opts["batch_size"], dry_run=opts["dry_run"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        verb = "would archive" if opts["dry_run"] else "archived"
+        for res in results:
+            if res.get("disabled"):
+                self.stdout.write(f"{res['policy']}: disabled")
+                continue
+            where = f" -> {res['file']}" if res["file"] else ""
+            self.stdout.write(f"{res['policy']}: {verb} {res['rows']} row(s) older than {res['cutoff']}{where}")
+        self.stdout.write(self.style.SUCCESS("Retention complete."))
@@ -1,6 +1,6 @@
 from django.core.management.base import BaseCommand
 from datetime import timedelta
-from core.models import Booking, SubOccurrence
+from core.models import Booking, StripeSubscriptionLink, SubOccurrence
 
 
 class Command(BaseCommand):
@@ -10,27 +10,38 @@ class Command(BaseCommand):
         created = 0
         skipped = 0
         qs = (SubOccurrence.objects
-              .select_related("service")
+              .select_related("service", "link", "client")
               .order_by("start_dt"))
-        
-        for occ in qs:
+        occurrences = list(qs)
+
+        # Occurrences synced before the client/link FKs existed fall back to one link lookup for all of them
+        missing = {o.stripe_subscription_id for o in occurrences if o.link_id is None}
+        fallback_links = {
+            link.stripe_subscription_id: link
+            for link in StripeSubscriptionLink.objects.filter(stripe_subscription_id__in=missing).select_related("client")
+        }
+        client_ids = {o.client_id for o in occurrences if o.client_id} | {link.client_id for link in fallback_links.values()}
+        booked = set(
+            Booking.objects.filter(client_id__in=client_ids, start_dt__gte=occurrences[0].start_dt)
+            .values_list("client_id", "start_dt")
+        ) if occurrences else set()
+
+        for occ in occurrences:
             if not occ.service or not occ.service.duration_minutes:
                 skipped += 1
                 continue
-            
+
             # Get client from the subscription link
-            from core.models import StripeSubscriptionLink
-            try:
-                sub_link = StripeSubscriptionLink.objects.get(stripe_subscription_id=occ.stripe_subscription_id)
-                client = sub_link.client
-            except StripeSubscriptionLink.DoesNotExist:
+            sub_link = occ.link or fallback_links.get(occ.stripe_subscription_id)
+            if sub_link is None:
                 self.stdout.write(self.style.WARNING(f"No subscription link found for {occ.stripe_subscription_id}"))
                 skipped += 1
                 continue
-            
-            if Booking.objects.filter(client=client, start_dt=occ.start_dt).exists():
+            client = occ.client or sub_link.client
+
+            if (client.id, occ.start_dt) in booked:
                 continue
-            
+
             end_dt = occ.start_dt + timedelta(minutes=occ.service.duration_minutes)
             Booking.objects.create(
                 client=client,
@@ -47,6 +58,7 @@ class Command(BaseCommand):
                 stripe_invoice_id=None,
                 notes="Backfilled from occurrence after setting service duration",
             )
+            booked.add((client.id, occ.start_dt))
             created += 1
-        
+
         self.stdout.write(self.style.SUCCESS(f"Backfill complete. created={created} skipped={skipped}"))
@@ -4,7 +4,7 @@ from zoneinfo import ZoneInfo
 from collections import Counter
 import stripe
 from django.core.management.base import BaseCommand
-from core.models import StripePriceMap
+from core.service_registry import is_price_mapped
 
 BRISBANE = ZoneInfo("Australia/Brisbane")
 
@@ -45,7 +45,7 @@ class Command(BaseCommand):
                     pid = getattr(price, "id", None)
                     if not pid:
                         continue
-                    if StripePriceMap.objects.filter(price_id=pid, active=True).exists():
+                    if is_price_mapped(pid):
                         continue
                     counter[pid] += 1
                     prod = getattr(price, "product", None)
@@ -1,6 +1,8 @@
+import json
+
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from core.subscription_materializer import materialize_all
+from core.subscription_materializer import materialize_all, plan_all
 
 
 class Command(BaseCommand):
@@ -8,9 +10,31 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument("--weeks", type=int, default=12, help="Horizon in weeks (default 12)")
+        parser.add_argument("--full", action="store_true", help="Rebuild every schedule instead of extending unchanged ones")
+        parser.add_argument("--dry-run", action="store_true", help="Show what would change without writing anything")
+        parser.add_argument("--json", action="store_true", help="Print the result as JSON")
 
     def handle(self, *args, **options):
         weeks = options["weeks"]
-        self.stdout.write(f"Materializing bookings for {weeks} weeks ahead...")
-        res = materialize_all(now_dt=timezone.localtime(), horizon_weeks=weeks)
+        if options["dry_run"]:
+            plan = plan_all(now_dt=timezone.localtime(), horizon_weeks=weeks, full=options["full"])
+            if options["json"]:
+                self.stdout.write(json.dumps(plan, indent=2))
+                return
+            for diff in plan["schedules"]:
+                self.stdout.write(
+                    f"sched {diff['schedule_id']} ({diff['subscription_id']}) {diff['mode']}: "
+                    f"create={len(diff['create'])} keep={len(diff['keep'])} "
+                    f"remove={len(diff['remove'])} skip={len(diff['skip'])}"
+                    + (f" [{diff['reason']}]" if diff["reason"] else "")
+                )
+            self.stdout.write(self.style.SUCCESS(f"Dry run: {plan['totals']} timings={plan['timings']}"))
+            return
+
+        if not options["json"]:
+            self.stdout.write(f"Materializing bookings for {weeks} weeks ahead...")
+        res = materialize_all(now_dt=timezone.localtime(), horizon_weeks=weeks, full=options["full"])
+        if options["json"]:
+            self.stdout.write(json.dumps(res, indent=2))
+            return
         self.stdout.write(self.style.SUCCESS(f"Materialization complete: {res}"))
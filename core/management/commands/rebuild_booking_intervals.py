@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from core.booking_intervals import rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuild the SQLite R*Tree interval index used for booking overlap checks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default", help="Database alias (default: default)")
+
+    def handle(self, *args, **opts):
+        total = rebuild(using=opts["database"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} booking interval(s)."))
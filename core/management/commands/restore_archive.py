@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.retention import RETENTION_BATCH_SIZE, read_manifest, restore_archive
+
+
+class Command(BaseCommand):
+    help = "Restore rows from a retention archive file (see apply_retention), or list archives."
+
+    def add_arguments(self, parser):
+        parser.add_argument("file", nargs="?", help="Archive file name from the manifest.")
+        parser.add_argument("--list", action="store_true", help="List archives in the manifest.")
+        parser.add_argument("--batch-size", type=int, default=RETENTION_BATCH_SIZE)
+
+    def handle(self, *args, **opts):
+        if opts["list"] or not opts["file"]:
+            for entry in read_manifest():
+                restored = f" restored {entry['restored_at']}" if entry.get("restored_at") else ""
+                incomplete = " (run did not finish)" if entry.get("complete") is False else ""
+                self.stdout.write(f"{entry['file']}  {entry.get('rows', 0)} row(s) before {entry.get('cutoff')}{restored}{incomplete}")
+            return
+        try:
+            res = restore_archive(opts["file"], batch_size=opts["batch_size"])
+        except FileNotFoundError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"Restored {res['restored']} row(s) from {res['file']} "
+            f"({res['skipped']} skipped, {res['relinked']} audit event(s) re-linked)."
+        ))
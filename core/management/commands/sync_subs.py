@@ -39,7 +39,8 @@ class Command(BaseCommand):
                     f'Sync completed successfully:\n'
                     f'  Processed: {result["processed"]} subscriptions\n'
                     f'  Created: {result["created"]} new SubOccurrence records\n'
-                    f'  Cleaned: {result["cleaned"]} old SubOccurrence records\n'
+                    f'  Updated: {result["updated"]} changed SubOccurrence records\n'
+                    f'  Cleaned: {result["cleaned"]} stale SubOccurrence records\n'
                     f'  Errors: {result["errors"]} errors encountered'
                 )
             )
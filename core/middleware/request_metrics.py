@@ -0,0 +1,61 @@
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from core import request_metrics, stripe_metrics
+
+_METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+
+class _QueryCounter:
+    """connection.execute_wrapper hook: counts queries and their wall time."""
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+
+class RequestMetricsMiddleware:
+    """
+    Records latency, DB query count/time and response size per URL name
+    (see core.request_metrics), and opens the Stripe call budget unit for the
+    request (see core.stripe_metrics). Place first so the timing covers the other
+    middleware. Unresolved paths are grouped under one label to keep the
+    label set bounded. Off when settings.REQUEST_METRICS_ENABLED is False.
+    """
+    def __init__(self, get_response):
+        if not getattr(settings, "REQUEST_METRICS_ENABLED", True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = _QueryCounter()
+        stripe_unit = stripe_metrics.begin()
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(counter):
+                response = self.get_response(request)
+        finally:
+            elapsed = time.perf_counter() - start
+            match = getattr(request, "resolver_match", None)
+            view = (match.view_name or match._func_path) if match else "<unresolved>"
+            stripe_metrics.end(stripe_unit, f"view:{view}", getattr(request, "request_id", None))
+
+        if response.streaming:
+            size = int(response.get("Content-Length") or 0)
+        else:
+            size = len(response.content)
+        method = request.method if request.method in _METHODS else "OTHER"
+        request_metrics.record(view, method, response.status_code, elapsed, counter.count, counter.seconds, size)
+        return response
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 21:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_alter_servicewindow_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stripesubscriptionschedule',
+            name='materialized_anchor',
+            field=models.DateField(blank=True, help_text='Monday the last full rebuild started from.', null=True),
+        ),
+        migrations.AddField(
+            model_name='stripesubscriptionschedule',
+            name='materialized_signature',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
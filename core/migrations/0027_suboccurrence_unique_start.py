@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-18 21:13
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def dedupe_sub_occurrences(apps, schema_editor):
+    """Keep the oldest row per (subscription, start) so the unique constraint can be added."""
+    SubOccurrence = apps.get_model("core", "SubOccurrence")
+    dupes = (
+        SubOccurrence.objects.values("stripe_subscription_id", "start_dt")
+        .annotate(n=Count("id"), keep=Min("id"))
+        .filter(n__gt=1)
+    )
+    for d in dupes:
+        SubOccurrence.objects.filter(
+            stripe_subscription_id=d["stripe_subscription_id"], start_dt=d["start_dt"]
+        ).exclude(id=d["keep"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_schedule_rolling_materialization'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_sub_occurrences, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='suboccurrence',
+            unique_together={('stripe_subscription_id', 'start_dt')},
+        ),
+    ]
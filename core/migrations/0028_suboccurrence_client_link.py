@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-18 21:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_client_and_link(apps, schema_editor):
+    """One UPDATE per subscription link rather than one lookup per occurrence."""
+    SubOccurrence = apps.get_model("core", "SubOccurrence")
+    StripeSubscriptionLink = apps.get_model("core", "StripeSubscriptionLink")
+    for link_id, sub_id, client_id in StripeSubscriptionLink.objects.values_list(
+        "id", "stripe_subscription_id", "client_id"
+    ):
+        SubOccurrence.objects.filter(stripe_subscription_id=sub_id).update(link_id=link_id, client_id=client_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_suboccurrence_unique_start'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='suboccurrence',
+            name='client',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sub_occurrences', to='core.client'),
+        ),
+        migrations.AddField(
+            model_name='suboccurrence',
+            name='link',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='occurrences', to='core.stripesubscriptionlink'),
+        ),
+        migrations.AddIndex(
+            model_name='suboccurrence',
+            index=models.Index(fields=['client', 'start_dt'], name='subocc_client_start_idx'),
+        ),
+        migrations.RunPython(backfill_client_and_link, migrations.RunPython.noop),
+    ]
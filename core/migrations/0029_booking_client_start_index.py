@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-18 21:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0028_suboccurrence_client_link'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['client', 'start_dt'], name='booking_client_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='suboccurrence',
+            index=models.Index(fields=['active', 'start_dt'], name='subocc_active_start_idx'),
+        ),
+    ]
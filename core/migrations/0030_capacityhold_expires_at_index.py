@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 21:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0029_booking_client_start_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='capacityhold',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
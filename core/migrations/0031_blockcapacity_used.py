@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-18 22:05
+
+from datetime import datetime
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_used(apps, schema_editor):
+    """Seed the counter from current bookings + holds (same rules as recount_capacity_usage)."""
+    BlockCapacity = apps.get_model("core", "BlockCapacity")
+    Booking = apps.get_model("core", "Booking")
+    CapacityHold = apps.get_model("core", "CapacityHold")
+    tz = timezone.get_current_timezone()
+    for cap in BlockCapacity.objects.select_related("block"):
+        start_dt = timezone.make_aware(datetime.combine(cap.block.date, cap.block.start_time), tz)
+        end_dt = timezone.make_aware(datetime.combine(cap.block.date, cap.block.end_time), tz)
+        used = Booking.objects.filter(
+            service_code=cap.service_code, start_dt__lt=end_dt, end_dt__gt=start_dt, deleted=False,
+        ).exclude(status__in=["cancelled", "canceled", "void", "voided"]).count()
+        used += CapacityHold.objects.filter(block_id=cap.block_id, service_code=cap.service_code).count()
+        if used:
+            BlockCapacity.objects.filter(pk=cap.pk).update(used=used)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0030_capacityhold_expires_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blockcapacity',
+            name='used',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_used, migrations.RunPython.noop),
+    ]
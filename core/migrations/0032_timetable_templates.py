@@ -0,0 +1,56 @@
+# Generated by Django 5.2.6 on 2026-10-18 22:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0031_blockcapacity_used'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimetableTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('notes', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='TimetableTemplateBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.SmallIntegerField(choices=[(0, 'Mon'), (1, 'Tue'), (2, 'Wed'), (3, 'Thu'), (4, 'Fri'), (5, 'Sat'), (6, 'Sun')])),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('label', models.CharField(blank=True, default='', max_length=128)),
+                ('template', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blocks', to='core.timetabletemplate')),
+            ],
+            options={
+                'ordering': ['template', 'weekday', 'start_time'],
+                'unique_together': {('template', 'weekday', 'start_time', 'end_time', 'label')},
+            },
+        ),
+        migrations.CreateModel(
+            name='TimetableTemplateCapacity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('service_code', models.CharField(max_length=64)),
+                ('capacity', models.PositiveIntegerField(default=0)),
+                ('allow_overlap', models.BooleanField(default=False)),
+                ('template_block', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='capacities', to='core.timetabletemplateblock')),
+            ],
+            options={
+                'verbose_name_plural': 'Timetable template capacities',
+                'unique_together': {('template_block', 'service_code')},
+            },
+        ),
+    ]
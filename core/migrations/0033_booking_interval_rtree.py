@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-18 22:32
+
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import migrations
+
+TABLE = "core_booking_interval"
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def create_rtree(apps, schema_editor):
+    """SQLite only: R*Tree of booking intervals in whole minutes (see core.booking_intervals)."""
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+    Booking = apps.get_model("core", "Booking")
+    with connection.cursor() as cur:
+        cur.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING rtree_i32(id, start_min, end_min)")
+        rows = [
+            (pk, math.floor((s - EPOCH).total_seconds() / 60), math.ceil((e - EPOCH).total_seconds() / 60))
+            for pk, s, e in Booking.objects.values_list("id", "start_dt", "end_dt").iterator()
+            if s and e
+        ]
+        if rows:
+            cur.executemany(f"INSERT INTO {TABLE} (id, start_min, end_min) VALUES (%s, %s, %s)", rows)
+
+
+def drop_rtree(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        with schema_editor.connection.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0032_timetable_templates'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_rtree, drop_rtree),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.6 on 2026-10-18 22:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0033_booking_interval_rtree'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReconcileSnapshotLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('invoice_id', models.CharField(db_index=True, max_length=128)),
+                ('invoice_status', models.CharField(blank=True, max_length=32, null=True)),
+                ('customer_id', models.CharField(blank=True, max_length=128, null=True)),
+                ('hosted_invoice_url', models.URLField(blank=True, max_length=500, null=True)),
+                ('line_id', models.CharField(max_length=128)),
+                ('description', models.TextField(blank=True)),
+                ('amount_total', models.IntegerField(blank=True, null=True)),
+                ('metadata', models.JSONField(blank=True, default=dict)),
+                ('booking_ref', models.BigIntegerField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ('id',),
+            },
+        ),
+        migrations.CreateModel(
+            name='ReconcileSnapshotRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(default='idle', max_length=16)),
+                ('days', models.PositiveIntegerField(default=60)),
+                ('invoices_seen', models.PositiveIntegerField(default=0)),
+                ('lines_unlinked', models.PositiveIntegerField(default=0)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 22:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0034_reconcile_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reconcilesnapshotline',
+            name='price_id',
+            field=models.CharField(blank=True, max_length=128, null=True),
+        ),
+    ]
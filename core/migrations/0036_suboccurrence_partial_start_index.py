@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-19 00:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0035_reconcile_snapshot_price'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='suboccurrence',
+            name='subocc_active_start_idx',
+        ),
+        migrations.AddIndex(
+            model_name='suboccurrence',
+            index=models.Index(condition=models.Q(('active', True)), fields=['start_dt', 'id'], name='subocc_active_start_idx'),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:12
+
+from django.db import migrations
+
+TABLE = "core_booking_interval"
+
+
+def _floor(col):
+    return f"(CAST(strftime('%s', {col}) AS INTEGER) / 60)"
+
+
+def _ceil(col):
+    return f"((CAST(strftime('%s', {col}) AS INTEGER) + 59 + (instr({col}, '.') > 0)) / 60)"
+
+
+def _coords(start, end):
+    return f"min({_floor(start)}, {_floor(end)}), max({_ceil(start)}, {_ceil(end)})"
+
+
+def _has_span(start, end):
+    return f"strftime('%s', {start}) IS NOT NULL AND strftime('%s', {end}) IS NOT NULL"
+
+
+TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLE}_ai AFTER INSERT ON core_booking
+    WHEN {_has_span("NEW.start_dt", "NEW.end_dt")}
+    BEGIN
+        INSERT OR REPLACE INTO {TABLE} (id, start_min, end_min)
+        VALUES (NEW.id, {_coords("NEW.start_dt", "NEW.end_dt")});
+    END""",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLE}_au AFTER UPDATE OF id, start_dt, end_dt ON core_booking
+    BEGIN
+        DELETE FROM {TABLE} WHERE id = OLD.id;
+        INSERT OR REPLACE INTO {TABLE} (id, start_min, end_min)
+        SELECT NEW.id, {_coords("NEW.start_dt", "NEW.end_dt")}
+        WHERE {_has_span("NEW.start_dt", "NEW.end_dt")};
+    END""",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLE}_ad AFTER DELETE ON core_booking
+    BEGIN
+        DELETE FROM {TABLE} WHERE id = OLD.id;
+    END""",
+]
+
+
+def create_triggers(apps, schema_editor):
+    """
+    SQLite only: keep the interval R*Tree in sync from core_booking triggers so
+    bulk and queryset writes are indexed too, then re-index whatever such
+    writes left out of the tree before now.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cur:
+        cur.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING rtree_i32(id, start_min, end_min)")
+        for sql in TRIGGERS:
+            cur.execute(sql)
+        cur.execute(f"DELETE FROM {TABLE}")
+        cur.execute(
+            f"INSERT INTO {TABLE} (id, start_min, end_min) "
+            f"SELECT id, {_coords('start_dt', 'end_dt')} FROM core_booking "
+            f"WHERE {_has_span('start_dt', 'end_dt')}"
+        )
+
+
+def drop_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        with schema_editor.connection.cursor() as cur:
+            for suffix in ("ai", "au", "ad"):
+                cur.execute(f"DROP TRIGGER IF EXISTS {TABLE}_{suffix}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0036_suboccurrence_partial_start_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
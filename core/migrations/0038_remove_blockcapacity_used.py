@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-19 03:54
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0037_booking_interval_triggers'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='blockcapacity',
+            name='used',
+        ),
+    ]
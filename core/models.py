@@ -1,7 +1,7 @@
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
-from django.db.models import JSONField
+from django.db.models import JSONField, Q
 import uuid
 from django.core.validators import RegexValidator
 from django.core.exceptions import ValidationError
@@ -163,6 +163,12 @@ class Booking(models.Model):
     )
     autogenerated = models.BooleanField(default=False, db_index=True)
 
+    class Meta:
+        indexes = [
+            # Per-client time lookups (calendars, "has a booking on this day" anti-joins)
+            models.Index(fields=["client", "start_dt"], name="booking_client_start_idx"),
+        ]
+
     def mark_paid(self, when=None):
         self.payment_status = 'paid'
         self.paid_at = when or timezone.now()
@@ -260,6 +266,21 @@ class SubOccurrence(models.Model):
     active = models.BooleanField(default=True)
     service = models.ForeignKey('Service', on_delete=models.PROTECT, null=True, blank=True,
                                 help_text="Service for this occurrence; determines duration for generated booking.")
+    # Denormalised from StripeSubscriptionLink at sync time so calendars can filter by client with an index
+    link = models.ForeignKey("StripeSubscriptionLink", on_delete=models.SET_NULL, null=True, blank=True,
+                             related_name="occurrences")
+    client = models.ForeignKey(Client, on_delete=models.SET_NULL, null=True, blank=True,
+                               related_name="sub_occurrences")
+
+    class Meta:
+        # One occurrence per subscription start; lets sync merge with upserts instead of delete+recreate
+        unique_together = ("stripe_subscription_id", "start_dt")
+        indexes = [
+            models.Index(fields=["client", "start_dt"], name="subocc_client_start_idx"),
+            # Upcoming active occurrences in keyset order (subs dashboard); partial so
+            # SQLite matches it against the bare `WHERE "active"` that active=True compiles to
+            models.Index(fields=["start_dt", "id"], name="subocc_active_start_idx", condition=Q(active=True)),
+        ]
 
     def __str__(self):
         return f"Sub {self.stripe_subscription_id} ({self.start_dt.date()} - {self.end_dt.date()})"
@@ -300,7 +321,10 @@ class StripeSubscriptionSchedule(models.Model):
     default_duration_minutes = models.PositiveIntegerField(default=60)
     default_block_label = models.CharField(max_length=128, blank=True, null=True)
     last_materialized_until = models.DateField(blank=True, null=True)
-    
+    # Rolling materialization: inputs fingerprint + week anchor of the last full rebuild
+    materialized_signature = models.CharField(max_length=64, blank=True, null=True)
+    materialized_anchor = models.DateField(blank=True, null=True, help_text="Monday the last full rebuild started from.")
+
     # New fields for explicit repeats pattern
     days = models.CharField(max_length=100, blank=True, null=True, help_text="Comma-separated: MON,TUE,...")
     start_time = models.CharField(max_length=20, blank=True, null=True, help_text="HH:MM (24h)")
@@ -492,7 +516,7 @@ class CapacityHold(models.Model):
     block = models.ForeignKey(TimetableBlock, on_delete=models.CASCADE)
     service_code = models.CharField(max_length=64)
     client = models.ForeignKey(Client, on_delete=models.CASCADE)
-    expires_at = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
 
     class Meta:
         verbose_name_plural = "Capacity holds"
@@ -501,8 +525,70 @@ class CapacityHold(models.Model):
         return f"Hold {self.token} for {self.block}"
 
     @classmethod
-    def purge_expired(cls):
-        cls.objects.filter(expires_at__lt=timezone.now()).delete()
+    def purge_expired(cls, batch_size: int = 500) -> int:
+        """
+        Delete expired holds in small batches so each write transaction stays short.
+        Readers never call this; they filter on expires_at instead (see scheduler job).
+        """
+        now = timezone.now()
+        purged = 0
+        while True:
+            tokens = list(cls.objects.filter(expires_at__lt=now).values_list("token", flat=True)[:batch_size])
+            if not tokens:
+                return purged
+            purged += cls.objects.filter(token__in=tokens).delete()[0]
+
+
+# ---------- Weekly timetable templates ----------
+from .models_service_windows import WEEKDAY_CHOICES  # noqa: E402
+
+
+class TimetableTemplate(models.Model):
+    """
+    A reusable week of blocks + capacities. Stamp it onto a date range from the
+    capacity editor instead of building each day by hand.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["name"]
+
+    def __str__(self):
+        return self.name
+
+
+class TimetableTemplateBlock(models.Model):
+    """One block on one weekday of a template (0=Mon ... 6=Sun)."""
+    template = models.ForeignKey(TimetableTemplate, on_delete=models.CASCADE, related_name="blocks")
+    weekday = models.SmallIntegerField(choices=WEEKDAY_CHOICES)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    label = models.CharField(max_length=128, blank=True, default="")
+
+    class Meta:
+        ordering = ["template", "weekday", "start_time"]
+        unique_together = ("template", "weekday", "start_time", "end_time", "label")
+
+    def __str__(self):
+        return f"{self.template} {self.get_weekday_display()} {self.start_time}–{self.end_time} {self.label}"
+
+
+class TimetableTemplateCapacity(models.Model):
+    """Capacity per service for a template block; copied to BlockCapacity on generation."""
+    template_block = models.ForeignKey(TimetableTemplateBlock, on_delete=models.CASCADE, related_name="capacities")
+    service_code = models.CharField(max_length=64)
+    capacity = models.PositiveIntegerField(default=0)
+    allow_overlap = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ("template_block", "service_code")
+        verbose_name_plural = "Timetable template capacities"
+
+    def __str__(self):
+        return f"{self.template_block} - {self.service_code}: {self.capacity}"
 
 
 # ---------- PR15: Stripe price → Service mapping ----------
@@ -527,5 +613,54 @@ class StripePriceMap(models.Model):
         return f"{self.price_id} → {s}"
 
 
+# ---------- Reconcile snapshot (built off the request path) ----------
+class ReconcileSnapshotLine(models.Model):
+    """
+    One Stripe invoice line that looked unlinked when the snapshot was built.
+    The reconcile console renders from these rows instead of calling Stripe.
+    """
+    invoice_id = models.CharField(max_length=128, db_index=True)
+    invoice_status = models.CharField(max_length=32, blank=True, null=True)
+    customer_id = models.CharField(max_length=128, blank=True, null=True)
+    hosted_invoice_url = models.URLField(max_length=500, blank=True, null=True)
+    line_id = models.CharField(max_length=128)
+    price_id = models.CharField(max_length=128, blank=True, null=True)
+    description = models.TextField(blank=True)
+    amount_total = models.IntegerField(blank=True, null=True)
+    metadata = JSONField(default=dict, blank=True)
+    # metadata.booking_id when numeric, re-checked against Booking at render time
+    booking_ref = models.BigIntegerField(blank=True, null=True)
+
+    class Meta:
+        ordering = ("id",)
+
+    def __str__(self):
+        return f"{self.invoice_id} / {self.line_id}"
+
+
+class ReconcileSnapshotRun(models.Model):
+    """Single row describing the current/last snapshot refresh (pk=1)."""
+    STATUS_IDLE = "idle"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+
+    status = models.CharField(max_length=16, default=STATUS_IDLE)
+    days = models.PositiveIntegerField(default=60)
+    invoices_seen = models.PositiveIntegerField(default=0)
+    lines_unlinked = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"Reconcile snapshot ({self.status})"
+
+    @classmethod
+    def current(cls) -> "ReconcileSnapshotRun":
+        obj, _ = cls.objects.get_or_create(pk=1)
+        return obj
+
+
 # import the ServiceWindow model into the app namespace (admin will find it)
 from .models_service_windows import ServiceWindow  # noqa: E402,F401
\ No newline at end of file
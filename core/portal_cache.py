@@ -0,0 +1,46 @@
+"""
+Per-client version stamps for caching rendered portal fragments.
+
+Templates cache their booking lists under (client_id, version, local date);
+signals bump the version whenever one of the client's bookings changes, so
+repeat visits render from cache without touching the booking table.
+"""
+import uuid
+
+from django.core.cache import cache
+from django.utils import timezone
+
+# Fragments also roll over with the date key; the TTL bounds time-of-day drift
+PORTAL_FRAGMENT_SECONDS = 15 * 60
+
+
+def _version_key(client_id) -> str:
+    return f"portal:client:v:{client_id}"
+
+
+def _new_version() -> str:
+    # Random rather than a counter: an evicted version can't resurrect old fragments
+    return uuid.uuid4().hex[:12]
+
+
+def client_version(client_id) -> str:
+    key = _version_key(client_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_client_version(client_id) -> None:
+    if client_id is None:
+        return
+    cache.set(_version_key(client_id), _new_version(), None)
+
+
+def fragment_context(client) -> dict:
+    """Template context for {% cache portal_cache_seconds "<name>" portal_cache_key %}."""
+    return {
+        "portal_cache_seconds": PORTAL_FRAGMENT_SECONDS,
+        "portal_cache_key": f"{client.pk}:{client_version(client.pk)}:{timezone.localdate().isoformat()}",
+    }
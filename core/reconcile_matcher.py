@@ -0,0 +1,224 @@
+"""
+Propose invoice-line → booking links for the reconcile console.
+
+Works off the reconcile snapshot (ReconcileSnapshotLine) so no Stripe calls are
+made. Lines and unlinked bookings are hash-joined on (client, service) where the
+Stripe customer maps to Client.stripe_customer_id and the line's price maps to a
+Service via StripePriceMap (metadata.service_code as fallback). Bookings without
+a service FK (e.g. portal checkouts) are resolved by service_code. Within a bucket,
+candidates are found by bisecting on start time within a tolerance. Each line /
+booking is used at most once, highest score first.
+"""
+from __future__ import annotations
+
+import bisect
+import logging
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .audit import emit_many
+from .booking_filters import filter_active_bookings
+from .models import Booking, Client, ReconcileSnapshotLine, Service
+from .service_registry import get_service, service_for_price
+
+log = logging.getLogger(__name__)
+BRISBANE = ZoneInfo("Australia/Brisbane")
+
+DEFAULT_TOLERANCE_MINUTES = 30
+# Proposals at or above this score are pre-ticked on the review screen
+AUTO_ACCEPT_SCORE = 80
+
+# Score weights (total 100)
+_TIME_POINTS = 70
+_AMOUNT_POINTS = 20
+_UNIQUE_POINTS = 10
+
+MatchProposal = namedtuple("MatchProposal", "line booking score delta_minutes amount_match unique")
+
+
+def unlinked_lines() -> List[ReconcileSnapshotLine]:
+    """
+    Snapshot lines still to be linked: lines of invoices linked since the
+    snapshot, and lines whose booking_ref names an existing booking, are
+    dropped (two IN queries).
+    """
+    snapshot = list(ReconcileSnapshotLine.objects.all())
+    refs = {li.booking_ref for li in snapshot if li.booking_ref is not None}
+    existing = set(Booking.objects.filter(id__in=refs).values_list("id", flat=True)) if refs else set()
+    inv_ids = {li.invoice_id for li in snapshot}
+    linked = set(
+        Booking.objects.filter(stripe_invoice_id__in=inv_ids).values_list("stripe_invoice_id", flat=True).distinct()
+    ) if inv_ids else set()
+    return [li for li in snapshot if li.invoice_id not in linked and li.booking_ref not in existing]
+
+
+def unlinked_invoices() -> List[Dict[str, Any]]:
+    """unlinked_lines() grouped per invoice."""
+    unlinked: Dict[str, Dict[str, Any]] = {}
+    for li in unlinked_lines():
+        inv = unlinked.setdefault(li.invoice_id, {
+            "invoice_id": li.invoice_id,
+            "status": li.invoice_status,
+            "customer_id": li.customer_id,
+            "hosted_invoice_url": li.hosted_invoice_url,
+            "lines": [],
+        })
+        inv["lines"].append({
+            "line_id": li.line_id,
+            "description": li.description,
+            "amount_total": li.amount_total,
+            "metadata": li.metadata,
+        })
+    return list(unlinked.values())
+
+
+def _line_start(line: ReconcileSnapshotLine):
+    """metadata.booking_start as an aware datetime (naive values are Brisbane time)."""
+    raw = str((line.metadata or {}).get("booking_start") or "").strip()
+    if raw.endswith("Z"):
+        raw = raw[:-1] + "+00:00"
+    try:
+        dt = datetime.fromisoformat(raw)
+    except ValueError:
+        return None
+    return dt if timezone.is_aware(dt) else timezone.make_aware(dt, BRISBANE)
+
+
+def _booking_service_id(b: Booking) -> Optional[int]:
+    """The booking's Service id, falling back to its service_code when it has no FK."""
+    if b.service_id:
+        return b.service_id
+    svc = get_service(b.service_code, active_only=False)
+    return svc.id if svc else None
+
+
+def _resolve_services(lines) -> Dict[int, Service]:
+    """line.pk -> Service, via active StripePriceMap then metadata.service_code."""
+    out = {}
+    for li in lines:
+        svc = service_for_price(li.price_id) or get_service(str((li.metadata or {}).get("service_code") or "").strip())
+        if svc is not None:
+            out[li.pk] = svc
+    return out
+
+
+def _score(delta: timedelta, tolerance: timedelta, amount_match: bool, unique: bool) -> int:
+    closeness = 1.0 - (abs(delta) / tolerance) if tolerance else 1.0
+    return round(_TIME_POINTS * max(closeness, 0.0) + (_AMOUNT_POINTS if amount_match else 0) + (_UNIQUE_POINTS if unique else 0))
+
+
+def propose_matches(tolerance_minutes: int = DEFAULT_TOLERANCE_MINUTES, lines: Optional[Iterable[ReconcileSnapshotLine]] = None) -> List[MatchProposal]:
+    """
+    Scored one-to-one proposals between unlinked snapshot lines and unlinked
+    bookings. Query count is constant in the number of lines.
+    """
+    lines = unlinked_lines() if lines is None else list(lines)
+    tolerance = timedelta(minutes=max(int(tolerance_minutes), 0))
+
+    customers = {li.customer_id for li in lines if li.customer_id}
+    client_by_customer = dict(
+        Client.objects.filter(stripe_customer_id__in=customers).values_list("stripe_customer_id", "id")
+    ) if customers else {}
+    services = _resolve_services(lines)
+
+    keyed: List[Tuple[ReconcileSnapshotLine, Tuple[int, int], object]] = []
+    codes = set()
+    for li in lines:
+        client_id = client_by_customer.get(li.customer_id)
+        svc = services.get(li.pk)
+        start = _line_start(li)
+        if client_id and svc and start:
+            keyed.append((li, (client_id, svc.id), start))
+            codes.add(svc.code)
+    if not keyed:
+        return []
+
+    lo = min(k[2] for k in keyed) - tolerance
+    hi = max(k[2] for k in keyed) + tolerance
+    buckets: Dict[Tuple[int, int], List[Tuple[object, int, Booking]]] = defaultdict(list)
+    qs = filter_active_bookings(Booking.objects.filter(
+        Q(service_id__in={k[1][1] for k in keyed}) | Q(service__isnull=True, service_code__in=codes),
+        stripe_invoice_id__isnull=True,
+        client_id__in={k[1][0] for k in keyed},
+        start_dt__gte=lo,
+        start_dt__lte=hi,
+    )).select_related("client", "service")
+    for b in qs:
+        buckets[(b.client_id, _booking_service_id(b))].append((b.start_dt, b.id, b))
+    for rows in buckets.values():
+        rows.sort(key=lambda r: (r[0], r[1]))
+
+    candidates = []
+    for li, key, start in keyed:
+        rows = buckets.get(key)
+        if not rows:
+            continue
+        starts = [r[0] for r in rows]
+        i = bisect.bisect_left(starts, start - tolerance)
+        j = bisect.bisect_right(starts, start + tolerance)
+        window = rows[i:j]
+        for b_start, _, b in window:
+            amount_match = li.amount_total is not None and li.amount_total == b.price_cents
+            candidates.append((li, b, b_start - start, amount_match, len(window) == 1))
+
+    # Greedy one-to-one assignment, best score first
+    proposals = []
+    used_lines, used_bookings = set(), set()
+    scored = [
+        (_score(delta, tolerance, amount_match, unique), abs(delta), li, b, delta, amount_match, unique)
+        for li, b, delta, amount_match, unique in candidates
+    ]
+    scored.sort(key=lambda s: (-s[0], s[1], s[2].pk, s[3].pk))
+    for score, _, li, b, delta, amount_match, unique in scored:
+        if li.pk in used_lines or b.pk in used_bookings:
+            continue
+        used_lines.add(li.pk)
+        used_bookings.add(b.pk)
+        proposals.append(MatchProposal(li, b, score, int(delta.total_seconds() // 60), amount_match, unique))
+    proposals.sort(key=lambda p: (-p.score, p.booking.start_dt))
+    return proposals
+
+
+def accept_matches(pairs: Iterable[Tuple[int, int]], actor=None) -> int:
+    """
+    Link each (snapshot line pk, booking id) pair in one transaction. Bookings
+    already linked in the meantime are skipped. Returns the number linked.
+    """
+    pairs = list(pairs)
+    if not pairs:
+        return 0
+    with transaction.atomic():
+        lines = ReconcileSnapshotLine.objects.in_bulk([p[0] for p in pairs])
+        bookings = Booking.objects.select_for_update().filter(
+            id__in=[p[1] for p in pairs], stripe_invoice_id__isnull=True
+        ).in_bulk()
+        changed = []
+        for line_pk, booking_id in pairs:
+            li, b = lines.get(line_pk), bookings.pop(booking_id, None)
+            if li is None or b is None:
+                continue
+            b.stripe_invoice_id = li.invoice_id
+            b.stripe_invoice_status = li.invoice_status
+            if li.hosted_invoice_url:
+                b.invoice_pdf_url = li.hosted_invoice_url
+            changed.append((li, b))
+        Booking.objects.bulk_update(
+            [b for _, b in changed], ["stripe_invoice_id", "stripe_invoice_status", "invoice_pdf_url"], batch_size=500
+        )
+        # One audit row per booking, like a manual reconcile.link, in one INSERT
+        emit_many("reconcile.link", [
+            (b, f"Linked booking #{b.id} to invoice {li.invoice_id} (match proposal)",
+             {"invoice_id": li.invoice_id, "line_id": li.line_id, "source": "matcher"})
+            for li, b in changed
+        ], actor=actor)
+    if changed:
+        from .portal_cache import bump_client_version
+        for client_id in {b.client_id for _, b in changed}:
+            bump_client_version(client_id)
+    return len(changed)
@@ -0,0 +1,217 @@
+"""
+In-process request metrics, keyed by URL name and method.
+
+RequestMetricsMiddleware (core/middleware/request_metrics.py) calls record()
+once per request; each record is a dict update under a lock, so this is cheap
+enough to leave on. Latency is kept as a fixed-bucket histogram; DB queries,
+DB time and response bytes as sums.
+
+With settings.REQUEST_METRICS_SHARED each process also publishes its cumulative
+snapshot to the cache every REQUEST_METRICS_PUBLISH_SECONDS, and snapshot()
+merges every live process. This only helps with a shared cache backend; the
+default LocMemCache is per-process.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time as time_mod
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+log = logging.getLogger(__name__)
+
+# Upper bounds in seconds (Prometheus "le"); +Inf is implied
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PUBLISH_SECONDS = 15
+# A process that stops publishing drops out of the merged view after this long
+_PROCESS_TTL_SECONDS = 10 * 60
+_PROCS_KEY = "metrics:requests:procs"
+
+_LOCK = threading.Lock()
+# (view, method) -> stats dict; see _new_stats()
+_STATS: Dict[Tuple[str, str], Dict] = {}
+_PROCESS_ID = uuid.uuid4().hex[:12]
+_LAST_PUBLISH = 0.0
+
+
+def _new_stats() -> Dict:
+    return {
+        "count": 0,
+        "seconds": 0.0,
+        "max_seconds": 0.0,
+        "buckets": [0] * len(LATENCY_BUCKETS),
+        "queries": 0,
+        "query_seconds": 0.0,
+        "bytes": 0,
+        "status": {},
+    }
+
+
+def record(view: str, method: str, status: int, seconds: float, queries: int, query_seconds: float, size: int) -> None:
+    """Add one request to the in-process aggregate."""
+    status_class = f"{status // 100}xx"
+    with _LOCK:
+        st = _STATS.get((view, method))
+        if st is None:
+            st = _STATS[(view, method)] = _new_stats()
+        st["count"] += 1
+        st["seconds"] += seconds
+        if seconds > st["max_seconds"]:
+            st["max_seconds"] = seconds
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                st["buckets"][i] += 1
+                break
+        st["queries"] += queries
+        st["query_seconds"] += query_seconds
+        st["bytes"] += size
+        st["status"][status_class] = st["status"].get(status_class, 0) + 1
+    if getattr(settings, "REQUEST_METRICS_SHARED", False):
+        _maybe_publish()
+
+
+def _local_snapshot() -> Dict[Tuple[str, str], Dict]:
+    with _LOCK:
+        return {
+            key: {**st, "buckets": list(st["buckets"]), "status": dict(st["status"])}
+            for key, st in _STATS.items()
+        }
+
+
+def reset() -> None:
+    with _LOCK:
+        _STATS.clear()
+
+
+# ---------- cross-process (cache) ----------
+def _proc_key(process_id: str) -> str:
+    return f"metrics:requests:proc:{process_id}"
+
+
+def _maybe_publish(force: bool = False) -> None:
+    global _LAST_PUBLISH
+    now = time_mod.monotonic()
+    if not force and now - _LAST_PUBLISH < getattr(settings, "REQUEST_METRICS_PUBLISH_SECONDS", PUBLISH_SECONDS):
+        return
+    _LAST_PUBLISH = now
+    try:
+        rows = [[view, method, st] for (view, method), st in _local_snapshot().items()]
+        cache.set(_proc_key(_PROCESS_ID), rows, _PROCESS_TTL_SECONDS)
+        procs = cache.get(_PROCS_KEY) or []
+        if _PROCESS_ID not in procs:
+            # Racy read-modify-write; a process lost here re-adds itself on its next publish
+            cache.set(_PROCS_KEY, procs[-50:] + [_PROCESS_ID], None)
+    except Exception as e:
+        log.debug("request metrics publish failed: %s", e)
+
+
+def _merge(into: Dict[Tuple[str, str], Dict], rows) -> None:
+    for view, method, st in rows:
+        cur = into.get((view, method))
+        if cur is None:
+            into[(view, method)] = {**st, "buckets": list(st["buckets"]), "status": dict(st["status"])}
+            continue
+        for field in ("count", "seconds", "queries", "query_seconds", "bytes"):
+            cur[field] += st[field]
+        cur["max_seconds"] = max(cur["max_seconds"], st["max_seconds"])
+        cur["buckets"] = [a + b for a, b in zip(cur["buckets"], st["buckets"])]
+        for cls, n in st["status"].items():
+            cur["status"][cls] = cur["status"].get(cls, 0) + n
+
+
+def snapshot() -> Dict[Tuple[str, str], Dict]:
+    """(view, method) -> stats; merged across processes when REQUEST_METRICS_SHARED is on."""
+    if not getattr(settings, "REQUEST_METRICS_SHARED", False):
+        return _local_snapshot()
+    _maybe_publish(force=True)
+    merged: Dict[Tuple[str, str], Dict] = {}
+    procs = cache.get(_PROCS_KEY) or []
+    published = cache.get_many([_proc_key(p) for p in procs])
+    for rows in published.values():
+        _merge(merged, rows)
+    if _proc_key(_PROCESS_ID) not in published:
+        _merge(merged, [[v, m, st] for (v, m), st in _local_snapshot().items()])
+    return merged
+
+
+# ---------- rendering ----------
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render_prometheus(stats: Optional[Dict] = None) -> str:
+    """Prometheus text exposition format (0.0.4)."""
+    stats = snapshot() if stats is None else stats
+    keys = sorted(stats)
+    out: List[str] = []
+
+    out.append("# HELP http_request_duration_seconds Request latency by URL name.")
+    out.append("# TYPE http_request_duration_seconds histogram")
+    for view, method in keys:
+        st = stats[(view, method)]
+        labels = f'view="{_label(view)}",method="{method}"'
+        cumulative = 0
+        for bound, n in zip(LATENCY_BUCKETS, st["buckets"]):
+            cumulative += n
+            out.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        out.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {st["count"]}')
+        out.append(f"http_request_duration_seconds_sum{{{labels}}} {st['seconds']:.6f}")
+        out.append(f"http_request_duration_seconds_count{{{labels}}} {st['count']}")
+
+    for name, field, help_text in (
+        ("http_request_db_queries_total", "queries", "DB queries issued while serving requests."),
+        ("http_request_db_seconds_total", "query_seconds", "Time spent in DB queries while serving requests."),
+        ("http_response_bytes_total", "bytes", "Response body bytes (non-streaming responses)."),
+    ):
+        out.append(f"# HELP {name} {help_text}")
+        out.append(f"# TYPE {name} counter")
+        for view, method in keys:
+            value = stats[(view, method)][field]
+            value = f"{value:.6f}" if isinstance(value, float) else value
+            out.append(f'{name}{{view="{_label(view)}",method="{method}"}} {value}')
+
+    out.append("# HELP http_responses_total Responses by status class.")
+    out.append("# TYPE http_responses_total counter")
+    for view, method in keys:
+        for cls, n in sorted(stats[(view, method)]["status"].items()):
+            out.append(f'http_responses_total{{view="{_label(view)}",method="{method}",status="{cls}"}} {n}')
+    return "\n".join(out) + "\n"
+
+
+def _quantile(st: Dict, q: float) -> Optional[float]:
+    """Bucket upper bound containing the q-th request (None past the last bucket)."""
+    target = q * st["count"]
+    cumulative = 0
+    for bound, n in zip(LATENCY_BUCKETS, st["buckets"]):
+        cumulative += n
+        if cumulative >= target:
+            return bound
+    return None
+
+
+def summary_rows(stats: Optional[Dict] = None) -> List[Dict]:
+    """One row per (view, method) for the HTML page, slowest total time first."""
+    stats = snapshot() if stats is None else stats
+    rows = []
+    for (view, method), st in stats.items():
+        n = st["count"] or 1
+        p95 = _quantile(st, 0.95)
+        rows.append({
+            "view": view,
+            "method": method,
+            "count": st["count"],
+            "avg_ms": st["seconds"] / n * 1000,
+            "p95_ms": p95 * 1000 if p95 is not None else None,
+            "max_ms": st["max_seconds"] * 1000,
+            "avg_queries": st["queries"] / n,
+            "avg_db_ms": st["query_seconds"] / n * 1000,
+            "avg_kb": st["bytes"] / n / 1024,
+            "errors": st["status"].get("5xx", 0),
+            "total_seconds": st["seconds"],
+        })
+    rows.sort(key=lambda r: -r["total_seconds"])
+    return rows
@@ -0,0 +1,294 @@
+"""
+Retention: move old rows out of the hot tables into gzip JSONL archives.
+
+Each policy selects rows older than a cutoff (settings.RETENTION_DAYS, 0 turns a
+policy off). Rows are archived in pk-ordered chunks: the chunk is serialized
+(Django's "jsonl" format), written and fsynced to a new
+ARCHIVE_DIR/<policy>-<stamp>-<suffix>.jsonl.gz and recorded in
+ARCHIVE_DIR/manifest.json before it's deleted, so a crash can at worst leave a
+row both archived and live, never lost. The manifest entry stays
+"complete": false until the run finishes. restore_archive() loads a file back
+with its original primary keys.
+
+The booking policy is off unless settings.RETENTION_DAYS["booking"] (env
+RETENTION_BOOKING_DAYS) is set, since bookings are financial history; when on
+it only takes settled or cancelled bookings. Bookings take their BookingPet
+rows with them; AdminEvents that pointed at an archived booking keep living
+(booking set NULL) and are re-linked on restore.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from django.apps import apps
+from django.conf import settings
+from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+log = logging.getLogger(__name__)
+
+RETENTION_BATCH_SIZE = 500
+MANIFEST_NAME = "manifest.json"
+
+
+class ArchiveJSONEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder rounds datetimes to milliseconds; archives must round-trip exactly."""
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class RetentionPolicy(NamedTuple):
+    name: str
+    model: str
+    date_field: str
+    default_days: int
+    # Extra filter narrowing what may be archived (e.g. settled bookings only)
+    condition: Optional[Q] = None
+
+
+# Archive order matters: events/occurrences first, bookings last so events that
+# still point at an old booking are archived with their booking_id intact.
+POLICIES: Dict[str, RetentionPolicy] = {
+    "adminevent": RetentionPolicy("adminevent", "core.AdminEvent", "created_at", 365),
+    "suboccurrence": RetentionPolicy("suboccurrence", "core.SubOccurrence", "end_dt", 180),
+    "capacityhold": RetentionPolicy("capacityhold", "core.CapacityHold", "expires_at", 7),
+    # Opt-in (0 days = off). Unpaid, un-cancelled bookings stay hot however old: money is still owed
+    "booking": RetentionPolicy(
+        "booking", "core.Booking", "end_dt", 0,
+        condition=(
+            Q(payment_status__in=["paid", "void"]) | Q(deleted=True)
+            | Q(status__icontains="cancel") | Q(status__icontains="void")
+        ) & Q(requires_admin_review=False),
+    ),
+}
+
+
+def archive_dir() -> Path:
+    return Path(getattr(settings, "ARCHIVE_DIR", Path(settings.BASE_DIR) / "archive"))
+
+
+def policy_days(policy: RetentionPolicy) -> int:
+    return int((getattr(settings, "RETENTION_DAYS", None) or {}).get(policy.name, policy.default_days))
+
+
+def _queryset(policy: RetentionPolicy, cutoff):
+    qs = apps.get_model(policy.model).objects.filter(**{f"{policy.date_field}__lt": cutoff})
+    return qs.filter(policy.condition) if policy.condition is not None else qs
+
+
+# ---------- manifest ----------
+def read_manifest() -> List[Dict]:
+    path = archive_dir() / MANIFEST_NAME
+    if not path.exists():
+        return []
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh).get("archives", [])
+
+
+def _write_manifest(entries: List[Dict]) -> None:
+    path = archive_dir() / MANIFEST_NAME
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump({"archives": entries}, fh, indent=1, default=str)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, path)
+
+
+def _update_manifest(file_name: str, **changes) -> Dict:
+    entries = read_manifest()
+    entry = next((e for e in entries if e["file"] == file_name), None)
+    if entry is None:
+        entry = {"file": file_name}
+        entries.append(entry)
+    entry.update(changes)
+    _write_manifest(entries)
+    return entry
+
+
+# ---------- related rows ----------
+def _booking_related(pks) -> tuple:
+    """BookingPet rows to archive alongside, and event_id -> booking_id links to restore."""
+    from .models import AdminEvent, BookingPet
+    pets = list(BookingPet.objects.filter(booking_id__in=pks).order_by("pk"))
+    links = dict(AdminEvent.objects.filter(booking_id__in=pks).values_list("id", "booking_id"))
+    return pets, links
+
+
+_RELATED: Dict[str, Callable] = {"booking": _booking_related}
+
+
+# ---------- archive ----------
+def archive_policy(policy: RetentionPolicy, *, cutoff=None, batch_size: int = RETENTION_BATCH_SIZE, dry_run: bool = False) -> Dict:
+    """
+    Archive and delete rows matched by one policy, chunk by chunk.
+    Returns {"policy", "cutoff", "rows", "file"}; dry_run only counts.
+    """
+    days = policy_days(policy)
+    if cutoff is None:
+        if days <= 0:
+            return {"policy": policy.name, "cutoff": None, "rows": 0, "file": None, "disabled": True}
+        cutoff = timezone.now() - timedelta(days=days)
+    result = {"policy": policy.name, "cutoff": cutoff.isoformat(), "rows": 0, "file": None}
+    if dry_run:
+        result["rows"] = _queryset(policy, cutoff).count()
+        return result
+
+    model = apps.get_model(policy.model)
+    related = _RELATED.get(policy.name)
+    out_dir = archive_dir()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    # Random suffix: two runs in the same second must not share a file
+    file_name = f"{policy.name}-{timezone.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}.jsonl.gz"
+    path = out_dir / file_name
+    created_at = timezone.now().isoformat()
+    links: Dict[int, int] = {}
+    digest = hashlib.sha256()
+
+    raw = fh = None
+    try:
+        while True:
+            pks = list(_queryset(policy, cutoff).order_by("pk").values_list("pk", flat=True)[:batch_size])
+            if not pks:
+                break
+            objs = list(model.objects.filter(pk__in=pks).order_by("pk"))
+            extra = []
+            if related is not None:
+                extra, chunk_links = related(pks)
+                links.update(chunk_links)
+            payload = serializers.serialize("jsonl", objs + extra, cls=ArchiveJSONEncoder).encode("utf-8")
+            if fh is None:
+                # "xb": never truncate an existing archive
+                raw = open(path, "xb")
+                fh = gzip.GzipFile(filename=file_name, mode="wb", fileobj=raw)
+            fh.write(payload)
+            # Chunk is durably on disk, and in the manifest, before its rows go
+            fh.flush()
+            os.fsync(raw.fileno())
+            digest.update(payload)
+            _update_manifest(
+                file_name,
+                policy=policy.name,
+                model=policy.model,
+                cutoff=result["cutoff"],
+                rows=result["rows"] + len(objs),
+                sha256=digest.hexdigest(),
+                created_at=created_at,
+                restored_at=None,
+                complete=False,
+                links={str(k): v for k, v in links.items()},
+            )
+            with transaction.atomic():
+                deleted = model.objects.filter(pk__in=pks).delete()[1].get(model._meta.label, 0)
+            result["rows"] += len(objs)
+            if not deleted:
+                log.warning("retention %s: chunk of %d archived but nothing deleted; stopping", policy.name, len(pks))
+                break
+    finally:
+        if fh is not None:
+            fh.close()
+            raw.flush()
+            os.fsync(raw.fileno())
+        if raw is not None:
+            raw.close()
+
+    if result["rows"]:
+        result["file"] = file_name
+        _update_manifest(file_name, complete=True)
+        log.info("retention %s: archived %d row(s) to %s", policy.name, result["rows"], file_name)
+    return result
+
+
+def apply_retention(names: Optional[List[str]] = None, *, batch_size: int = RETENTION_BATCH_SIZE, dry_run: bool = False) -> List[Dict]:
+    """Run the named policies (all by default) in archive order."""
+    unknown = set(names or []) - set(POLICIES)
+    if unknown:
+        raise ValueError(f"Unknown retention policy: {', '.join(sorted(unknown))}")
+    return [
+        archive_policy(policy, batch_size=batch_size, dry_run=dry_run)
+        for name, policy in POLICIES.items()
+        if not names or name in names
+    ]
+
+
+# ---------- restore ----------
+def _restore_chunk(lines: List[str]) -> tuple:
+    restored = skipped = 0
+    objs = list(serializers.deserialize("jsonl", io.StringIO("".join(lines))))
+    try:
+        with transaction.atomic():
+            for obj in objs:
+                obj.save()
+        return len(objs), 0
+    except IntegrityError:
+        pass
+    # A row clashes with something created since (e.g. a rebuilt booking); keep the rest
+    for obj in objs:
+        try:
+            with transaction.atomic():
+                obj.save()
+            restored += 1
+        except IntegrityError as e:
+            skipped += 1
+            log.warning("restore: skipped %s pk=%s: %s", obj.object._meta.label, obj.object.pk, e)
+    return restored, skipped
+
+
+def restore_archive(file_name: str, *, batch_size: int = RETENTION_BATCH_SIZE) -> Dict:
+    """
+    Load an archive file back into its tables with original primary keys.
+    Safe to repeat: existing rows are overwritten with the archived values.
+    """
+    path = archive_dir() / Path(file_name).name
+    if not path.exists():
+        raise FileNotFoundError(f"No archive {path}")
+    result = {"file": path.name, "restored": 0, "skipped": 0, "relinked": 0}
+    chunk: List[str] = []
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        for line in fh:
+            if not line.strip():
+                continue
+            chunk.append(line)
+            if len(chunk) >= batch_size:
+                restored, skipped = _restore_chunk(chunk)
+                result["restored"] += restored
+                result["skipped"] += skipped
+                chunk = []
+    if chunk:
+        restored, skipped = _restore_chunk(chunk)
+        result["restored"] += restored
+        result["skipped"] += skipped
+
+    entry = next((e for e in read_manifest() if e["file"] == path.name), {})
+    links = entry.get("links") or {}
+    if links:
+        from .models import AdminEvent, Booking
+        by_booking: Dict[int, List[int]] = {}
+        for event_id, booking_id in links.items():
+            by_booking.setdefault(booking_id, []).append(int(event_id))
+        live = set(Booking.objects.filter(pk__in=list(by_booking)).values_list("pk", flat=True))
+        with transaction.atomic():
+            for booking_id, event_ids in by_booking.items():
+                if booking_id in live:
+                    result["relinked"] += AdminEvent.objects.filter(
+                        id__in=event_ids, booking__isnull=True
+                    ).update(booking_id=booking_id)
+    if entry:
+        _update_manifest(path.name, restored_at=timezone.now().isoformat())
+    log.info("restore %s: %s", path.name, result)
+    return result
@@ -6,6 +6,8 @@ import logging
 from typing import Optional
 from zoneinfo import ZoneInfo
 
+from . import stripe_metrics
+
 try:
     from apscheduler.schedulers.background import BackgroundScheduler
 except Exception:  # pragma: no cover
@@ -23,6 +25,13 @@ def _env_enabled() -> bool:
     """
     return os.environ.get("NFDW_SCHEDULER", "0") == "1"
 
+def _retention_enabled() -> bool:
+    """
+    The retention job deletes archived rows, so it is opt-in on top of the scheduler
+    switch (NFDW_RETENTION_ENABLED=1); manage.py apply_retention works regardless.
+    """
+    return os.environ.get("NFDW_RETENTION_ENABLED", "0") == "1"
+
 def _is_management_command_process() -> bool:
     """
     Avoid starting the scheduler during management commands (migrate, collectstatic, etc.).
@@ -45,7 +54,8 @@ def job_sync_invoices():
     try:
         from .stripe_invoices_sync import sync_invoices
         lookback = _get_int("NFDW_SYNC_INVOICES_LOOKBACK_DAYS", 90)
-        res = sync_invoices(days=lookback)
+        with stripe_metrics.job("sync_invoices"):
+            res = sync_invoices(days=lookback)
         log.info("scheduler: sync_invoices -> %s", res)
     except Exception as e:
         log.exception("scheduler: sync_invoices failed: %s", e)
@@ -54,11 +64,38 @@ def job_materialize():
     try:
         from .subscription_materializer import materialize_all
         weeks = _get_int("NFDW_MATERIALIZE_WEEKS", 12)
-        res = materialize_all(horizon_weeks=weeks)
+        with stripe_metrics.job("materialize_all"):
+            res = materialize_all(horizon_weeks=weeks)
         log.info("scheduler: materialize_all -> %s", res)
     except Exception as e:
         log.exception("scheduler: materialize_all failed: %s", e)
 
+def job_purge_expired_holds():
+    try:
+        from .models import CapacityHold
+        purged = CapacityHold.purge_expired(batch_size=_get_int("NFDW_PURGE_HOLDS_BATCH", 500))
+        if purged:
+            log.info("scheduler: purge_expired_holds -> %s", purged)
+    except Exception as e:
+        log.exception("scheduler: purge_expired_holds failed: %s", e)
+
+def job_refresh_reconcile_snapshot():
+    try:
+        from .admin_tools_reconcile import refresh_reconcile_snapshot
+        with stripe_metrics.job("refresh_reconcile_snapshot"):
+            res = refresh_reconcile_snapshot(days=_get_int("NFDW_RECONCILE_DAYS", 60))
+        log.info("scheduler: refresh_reconcile_snapshot -> %s", res)
+    except Exception as e:
+        log.exception("scheduler: refresh_reconcile_snapshot failed: %s", e)
+
+def job_apply_retention():
+    try:
+        from .retention import apply_retention
+        res = apply_retention(batch_size=_get_int("NFDW_RETENTION_BATCH", 500))
+        log.info("scheduler: apply_retention -> %s", [(r["policy"], r["rows"]) for r in res])
+    except Exception as e:
+        log.exception("scheduler: apply_retention failed: %s", e)
+
 def job_sync_subscription_links():
     """
     Refresh/ensure local links to Stripe subscriptions (no-ops if code/module absent).
@@ -73,7 +110,8 @@ def job_sync_subscription_links():
         if ensure_links is None:
             log.info("scheduler: no subscription link sync function available; skipping")
             return
-        ensure_links()
+        with stripe_metrics.job("sync_subscription_links"):
+            ensure_links()
         log.info("scheduler: sync_subscription_links -> ok")
     except Exception as e:
         log.exception("scheduler: sync_subscription_links failed: %s", e)
@@ -87,6 +125,9 @@ def _register_jobs(sched: "BackgroundScheduler"):
     inv_mins = _get_int("NFDW_SYNC_INVOICES_MINUTES", 15)
     sub_mins = _get_int("NFDW_SYNC_SUBS_MINUTES", 60)
     mat_mins = _get_int("NFDW_MATERIALIZE_MINUTES", 60)
+    hold_mins = _get_int("NFDW_PURGE_HOLDS_MINUTES", 5)
+    rec_mins = _get_int("NFDW_RECONCILE_MINUTES", 30)
+    ret_hours = _get_int("NFDW_RETENTION_HOURS", 24)
 
     sched.add_job(
         job_sync_invoices,
@@ -115,6 +156,36 @@ def _register_jobs(sched: "BackgroundScheduler"):
         max_instances=1,
         replace_existing=True,
     )
+    sched.add_job(
+        job_purge_expired_holds,
+        "interval",
+        minutes=hold_mins,
+        id="purge_expired_holds",
+        coalesce=True,
+        max_instances=1,
+        replace_existing=True,
+    )
+    sched.add_job(
+        job_refresh_reconcile_snapshot,
+        "interval",
+        minutes=rec_mins,
+        id="refresh_reconcile_snapshot",
+        coalesce=True,
+        max_instances=1,
+        replace_existing=True,
+    )
+    if _retention_enabled():
+        sched.add_job(
+            job_apply_retention,
+            "interval",
+            hours=ret_hours,
+            id="apply_retention",
+            coalesce=True,
+            max_instances=1,
+            replace_existing=True,
+        )
+    else:
+        log.info("scheduler: apply_retention not scheduled (NFDW_RETENTION_ENABLED off)")
 
 def start_scheduler_if_enabled():
     """
@@ -0,0 +1,138 @@
+"""
+In-process registry of Services and active StripePriceMaps.
+
+Both tables are small and read on every line of the invoice/subscription sync
+loops, so they're loaded once into read-only mappings and shared. Saves and
+deletes drop this process's copy at once and bump a version token in the cache
+when the transaction commits (see core.signals); every process compares its
+copy against the token and reloads when it moved. The token is only shared
+with a shared cache backend: under the default per-process LocMemCache other
+workers pick up an edit when REGISTRY_TTL_SECONDS runs out.
+
+Returned Service/StripePriceMap instances are shared: treat them as read-only.
+"""
+from __future__ import annotations
+
+import threading
+import time as time_mod
+import uuid
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional
+
+from django.core.cache import cache
+from django.db import transaction
+
+# Reload at least this often even if no version bump is seen
+REGISTRY_TTL_SECONDS = 300
+_VERSION_KEY = "registry:services:v"
+
+
+class Registry(NamedTuple):
+    version: str
+    built_at: float
+    services_by_code: Mapping[str, object]
+    services_by_id: Mapping[int, object]
+    active_by_code: Mapping[str, object]
+    # price_id -> active StripePriceMap (service attached)
+    price_maps: Mapping[str, object]
+    # First active Service with a duration (by pk); subscription fallback
+    default_service: Optional[object]
+
+
+_LOCK = threading.Lock()
+_STATE: Optional[Registry] = None
+
+
+def _current_version() -> str:
+    version = cache.get(_VERSION_KEY)
+    if version is None:
+        cache.add(_VERSION_KEY, uuid.uuid4().hex[:12], None)
+        version = cache.get(_VERSION_KEY)
+    return version
+
+
+def _build(version: str) -> Registry:
+    from .models import Service, StripePriceMap
+
+    services = list(Service.objects.order_by("pk"))
+    by_id = {s.pk: s for s in services}
+    price_maps = {}
+    for spm in StripePriceMap.objects.filter(active=True):
+        # Attach the registry's Service instead of a second copy per map
+        spm.service = by_id.get(spm.service_id)
+        price_maps[spm.price_id] = spm
+    return Registry(
+        version=version,
+        built_at=time_mod.monotonic(),
+        services_by_code=MappingProxyType({s.code: s for s in services}),
+        services_by_id=MappingProxyType(by_id),
+        active_by_code=MappingProxyType({s.code: s for s in services if s.is_active}),
+        price_maps=MappingProxyType(price_maps),
+        default_service=next((s for s in services if s.is_active and s.duration_minutes), None),
+    )
+
+
+def get_registry() -> Registry:
+    """The current registry; two queries on (re)load, none otherwise."""
+    global _STATE
+    version = _current_version()
+    state = _STATE
+    if state is not None and state.version == version and time_mod.monotonic() - state.built_at < REGISTRY_TTL_SECONDS:
+        return state
+    with _LOCK:
+        state = _STATE
+        if state is None or state.version != version or time_mod.monotonic() - state.built_at >= REGISTRY_TTL_SECONDS:
+            state = _STATE = _build(version)
+        return state
+
+
+def _bump_version() -> None:
+    global _STATE
+    _STATE = None
+    cache.set(_VERSION_KEY, uuid.uuid4().hex[:12], None)
+
+
+def invalidate_registry(**kwargs) -> None:
+    """
+    Drop this process's registry now; bump the shared version once the change
+    commits so other processes don't reload before they can see it. Usable as
+    a signal receiver.
+    """
+    global _STATE
+    _STATE = None
+    transaction.on_commit(_bump_version)
+
+
+def get_service(code: Optional[str], active_only: bool = True):
+    """Service by code (active only by default), or None."""
+    if not code:
+        return None
+    reg = get_registry()
+    return (reg.active_by_code if active_only else reg.services_by_code).get(code)
+
+
+def get_service_by_id(pk):
+    return get_registry().services_by_id.get(pk)
+
+
+def active_services() -> Mapping[str, object]:
+    """code -> active Service."""
+    return get_registry().active_by_code
+
+
+def default_service():
+    return get_registry().default_service
+
+
+def is_price_mapped(price_id: Optional[str]) -> bool:
+    """True when an active StripePriceMap exists for the price."""
+    return bool(price_id) and price_id in get_registry().price_maps
+
+
+def service_for_price(price_id: Optional[str]):
+    """Active Service mapped to a Stripe price, or None."""
+    if not price_id:
+        return None
+    spm = get_registry().price_maps.get(price_id)
+    svc = spm.service if spm else None
+    return svc if svc is not None and svc.is_active else None
@@ -0,0 +1,127 @@
+"""
+Compiled ServiceWindow rules for portal validation.
+
+Active portal-blocking windows are compiled once per process into
+weekday -> intervals sorted by start time -> allowed-service bitset
+(bit N set = Service pk N allowed). Saves, deletes and allowed_services
+changes drop this process's table at once and bump a version token in the
+cache when the transaction commits (see core.signals); every lookup compares
+the table against the token, so all processes rebuild on their next lookup.
+Workers only share the token through a shared cache backend, so run several
+worker processes with one configured (the default LocMemCache is per process).
+"""
+from __future__ import annotations
+
+import threading
+import uuid
+from bisect import bisect_left
+from typing import Dict, List, NamedTuple, Optional
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+_VERSION_KEY = "rules:service_windows:v"
+
+
+class WindowRule(NamedTuple):
+    start_time: object
+    end_time: object
+    allowed_mask: int
+    title: str
+
+
+_LOCK = threading.Lock()
+# (version, table, start times per weekday) swapped in as one object
+_STATE: Optional[tuple] = None
+
+
+def _current_version() -> str:
+    version = cache.get(_VERSION_KEY)
+    if version is None:
+        cache.add(_VERSION_KEY, uuid.uuid4().hex[:12], None)
+        version = cache.get(_VERSION_KEY)
+    return version
+
+
+def _compile() -> Dict[int, List[WindowRule]]:
+    from .models_service_windows import ALL_DAYS, ServiceWindow
+
+    windows = list(ServiceWindow.objects.filter(active=True, block_in_portal=True))
+    masks: Dict[int, int] = {}
+    through = ServiceWindow.allowed_services.through
+    for window_id, service_id in through.objects.filter(
+        servicewindow__in=[w.pk for w in windows]
+    ).values_list("servicewindow_id", "service_id"):
+        masks[window_id] = masks.get(window_id, 0) | (1 << service_id)
+
+    table: Dict[int, List[WindowRule]] = {day: [] for day in range(7)}
+    for w in windows:
+        mask = masks.get(w.pk, 0)
+        if not mask:
+            # No allowed list configured: the window doesn't block anything
+            continue
+        rule = WindowRule(w.start_time, w.end_time, mask, w.title)
+        for day in (range(7) if w.weekday == ALL_DAYS else [w.weekday]):
+            table[day].append(rule)
+    for rules in table.values():
+        rules.sort(key=lambda r: r.start_time)
+    return table
+
+
+def _state() -> tuple:
+    global _STATE
+    version = _current_version()
+    state = _STATE
+    if state is not None and state[0] == version:
+        return state
+    with _LOCK:
+        state = _STATE
+        if state is None or state[0] != version:
+            table = _compile()
+            starts = {day: [r.start_time for r in rules] for day, rules in table.items()}
+            state = _STATE = (version, table, starts)
+        return state
+
+
+def get_rules() -> Dict[int, List[WindowRule]]:
+    """The compiled table, built on first use (two queries) and then shared."""
+    return _state()[1]
+
+
+def _bump_version() -> None:
+    global _STATE
+    with _LOCK:
+        _STATE = None
+    cache.set(_VERSION_KEY, uuid.uuid4().hex[:12], None)
+
+
+def invalidate_rules(**kwargs) -> None:
+    """
+    Drop this process's table now; bump the shared version once the change
+    commits, so every process (including this one, should it have rebuilt
+    from the pre-commit windows in between) rebuilds on its next lookup.
+    Usable directly as a signal receiver.
+    """
+    global _STATE
+    with _LOCK:
+        _STATE = None
+    transaction.on_commit(_bump_version)
+
+
+def blocking_rule(service, start_dt, end_dt) -> Optional[WindowRule]:
+    """
+    First window that blocks `service` for a booking over [start_dt, end_dt),
+    compared by local time of day on start_dt's weekday. None if allowed.
+    """
+    local_start = timezone.localtime(start_dt) if timezone.is_aware(start_dt) else start_dt
+    local_end = timezone.localtime(end_dt) if timezone.is_aware(end_dt) else end_dt
+    _, table, starts = _state()
+    day = local_start.weekday()
+    s, e = local_start.time(), local_end.time()
+    bit = 1 << service.pk
+    # Only windows starting before the booking ends can overlap it
+    for rule in table[day][:bisect_left(starts[day], e)]:
+        if rule.end_time > s and not rule.allowed_mask & bit:
+            return rule
+    return None
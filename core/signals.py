@@ -1,5 +1,15 @@
 from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .capacity_helpers import invalidate_blocks_capacity
+from .models import BlockCapacity, Booking, CapacityHold, Service, ServiceWindow, StripePriceMap, TimetableBlock
+from .portal_cache import bump_client_version
+from .service_registry import invalidate_registry
+from .service_window_rules import invalidate_rules
+
 
 @receiver(user_logged_in)
 def promote_staff_to_superuser(sender, request, user, **kwargs):
@@ -12,3 +22,56 @@ def promote_staff_to_superuser(sender, request, user, **kwargs):
         user.save(update_fields=["is_superuser"])
         # Optional: log this or send email if needed
         print(f"[ADMIN] Promoted {user.username} to superuser for full access.")
+
+
+# ---------- Portal capacity cache invalidation ----------
+def _aware(dt):
+    if isinstance(dt, str):
+        dt = parse_datetime(dt)
+    if dt and timezone.is_naive(dt):
+        dt = timezone.make_aware(dt)
+    return dt
+
+
+def _local_date(dt):
+    dt = _aware(dt)
+    return timezone.localtime(dt).date() if dt else None
+
+
+@receiver([post_save, post_delete], sender=Booking)
+def invalidate_capacity_for_booking(sender, instance, **kwargs):
+    invalidate_blocks_capacity(_local_date(instance.start_dt), _local_date(instance.end_dt))
+
+
+@receiver([post_save, post_delete], sender=CapacityHold)
+@receiver([post_save, post_delete], sender=BlockCapacity)
+def invalidate_capacity_for_block_child(sender, instance, **kwargs):
+    try:
+        block = instance.block
+    except TimetableBlock.DoesNotExist:
+        return
+    invalidate_blocks_capacity(block.date)
+
+
+@receiver([post_save, post_delete], sender=TimetableBlock)
+def invalidate_capacity_for_block(sender, instance, **kwargs):
+    invalidate_blocks_capacity(instance.date)
+
+
+# ---------- Compiled ServiceWindow rules ----------
+for _sender in (ServiceWindow, Service):
+    post_save.connect(invalidate_rules, sender=_sender, dispatch_uid=f"window_rules_save_{_sender.__name__}")
+    post_delete.connect(invalidate_rules, sender=_sender, dispatch_uid=f"window_rules_delete_{_sender.__name__}")
+m2m_changed.connect(invalidate_rules, sender=ServiceWindow.allowed_services.through, dispatch_uid="window_rules_m2m")
+
+
+# ---------- Portal fragment cache versions ----------
+@receiver([post_save, post_delete], sender=Booking)
+def bump_portal_version_for_booking(sender, instance, **kwargs):
+    bump_client_version(instance.client_id)
+
+
+# ---------- Service / price-map registry ----------
+for _sender in (Service, StripePriceMap):
+    post_save.connect(invalidate_registry, sender=_sender, dispatch_uid=f"service_registry_save_{_sender.__name__}")
+    post_delete.connect(invalidate_registry, sender=_sender, dispatch_uid=f"service_registry_delete_{_sender.__name__}")
@@ -0,0 +1,42 @@
+"""
+Short-lived cache of Stripe invoice payloads for the admin tools.
+
+The metadata drill-down and the reconcile link/create actions all retrieve the
+same invoice (lines expanded) within moments of each other. They share this
+cache so a review session costs one Stripe call per invoice. Invoice webhooks
+drop the entry so a changed invoice is re-fetched on next view.
+"""
+import logging
+
+import stripe
+from django.core.cache import cache
+
+log = logging.getLogger(__name__)
+
+INVOICE_CACHE_SECONDS = 5 * 60
+# One expansion for every caller so they can share the cached payload
+INVOICE_EXPAND = ["lines.data"]
+
+
+def _key(invoice_id: str) -> str:
+    return f"stripe:invoice:{invoice_id}"
+
+
+def get_invoice(invoice_id: str):
+    """Invoice with lines expanded, from cache when fresh. Stripe errors propagate."""
+    key = _key(invoice_id)
+    inv = cache.get(key)
+    if inv is not None:
+        return inv
+    inv = stripe.Invoice.retrieve(invoice_id, expand=INVOICE_EXPAND)
+    try:
+        cache.set(key, inv, INVOICE_CACHE_SECONDS)
+    except Exception as e:
+        # Unpicklable payloads (e.g. test doubles) just aren't cached
+        log.debug("Not caching invoice %s: %s", invoice_id, e)
+    return inv
+
+
+def invalidate_invoice(invoice_id) -> None:
+    if invoice_id:
+        cache.delete(_key(invoice_id))
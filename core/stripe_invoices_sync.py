@@ -8,11 +8,14 @@ import stripe
 from django.utils.timezone import make_naive, is_aware
 from django.db import transaction
 
-from .models import Booking, Client, Service, StripePriceMap
-from .invoice_validation import validate_invoice_against_bookings
+from .models import Booking, Client, Service
+from .service_registry import get_service, service_for_price
+from .invoice_validation import validate_invoice_against_bookings, validate_invoices
 
 log = logging.getLogger(__name__)
 BRISBANE = ZoneInfo("Australia/Brisbane")
+# Invoices validated together (one booking prefetch + one bulk_update per batch)
+VALIDATE_BATCH_SIZE = 200
 
 
 def _parse_iso_local(dt_str: Optional[str]):
@@ -57,18 +60,12 @@ def _service_from_line(li, md: Dict[str, Any]) -> Optional[Service]:
     Resolve Service for a line using price→service mapping first, otherwise metadata.service_code.
     """
     # 1) Try mapped price
-    price_id = _safe_get(li, "price.id")
-    if price_id:
-        spm = StripePriceMap.objects.filter(price_id=price_id, active=True).select_related("service").first()
-        if spm and spm.service and spm.service.is_active:
-            return spm.service
+    svc = service_for_price(_safe_get(li, "price.id"))
+    if svc:
+        return svc
     # 2) Fallback to metadata.service_code
     svc_code = (md.get("service_code") or "").strip() if isinstance(md, dict) else None
-    if svc_code:
-        svc = Service.objects.filter(code=svc_code, is_active=True).first()
-        if svc:
-            return svc
-    return None
+    return get_service(svc_code)
 
 
 def _link_by_metadata(booking_id_val) -> Optional[Booking]:
@@ -158,6 +155,16 @@ def _iterate_invoices_since(days: int):
         starting_after = data[-1].id if data else None
 
 
+def _validate_batch(invoices, counts: Dict[str, int]) -> None:
+    """Validate a batch of invoices in one pass; adds newly flagged bookings to counts."""
+    if not invoices:
+        return
+    try:
+        counts["flagged"] += validate_invoices(invoices)["newly_flagged"]
+    except Exception as e:
+        log.exception("Validator error for invoices %s: %s", [getattr(i, "id", None) for i in invoices], e)
+
+
 def sync_invoices(days: int = 90) -> Dict[str, int]:
     """
     Pull recent invoices, link them to bookings, update fields, and run metadata validation.
@@ -171,6 +178,7 @@ def sync_invoices(days: int = 90) -> Dict[str, int]:
         "unlinked": 0,
         "errors": 0,
     }
+    pending = []
     for inv in _iterate_invoices_since(days):
         counts["processed_invoices"] += 1
         try:
@@ -202,18 +210,15 @@ def sync_invoices(days: int = 90) -> Dict[str, int]:
                 else:
                     counts["unlinked"] += 1
 
-            # Run validator to set requires_admin_review + review_diff if mismatches
-            try:
-                pre_flagged = Booking.objects.filter(requires_admin_review=True).count()
-                validate_invoice_against_bookings(inv)
-                post_flagged = Booking.objects.filter(requires_admin_review=True).count()
-                if post_flagged > pre_flagged:
-                    counts["flagged"] += (post_flagged - pre_flagged)
-            except Exception as e:
-                log.exception("Validator error for invoice %s: %s", getattr(inv, "id", None), e)
+            pending.append(inv)
+            if len(pending) >= VALIDATE_BATCH_SIZE:
+                _validate_batch(pending, counts)
+                pending = []
         except Exception as e:
             counts["errors"] += 1
             log.exception("Invoice sync error (id=%s): %s", getattr(inv, "id", None), e)
+    # Run validator to set requires_admin_review + review_diff if mismatches
+    _validate_batch(pending, counts)
     log.info("Invoice sync complete: %s", counts)
     return counts
 
@@ -250,11 +255,7 @@ def process_invoice(inv) -> Dict[str, int]:
             else:
                 counts["unlinked"] += 1
         try:
-            pre = Booking.objects.filter(requires_admin_review=True).count()
-            validate_invoice_against_bookings(inv)
-            post = Booking.objects.filter(requires_admin_review=True).count()
-            if post > pre:
-                counts["flagged"] += (post - pre)
+            counts["flagged"] += validate_invoice_against_bookings(inv)["newly_flagged"]
         except Exception as e:
             log.exception("Validator error (invoice %s): %s", getattr(inv, "id", None), e)
     except Exception as e:
@@ -0,0 +1,315 @@
+"""
+Counters and latency for every Stripe API call, per endpoint and per caller.
+
+install() wraps the stripe library's global HTTP client (everything in this
+repo goes through stripe.default_http_client), so call sites need no changes:
+  - request_with_retries is one logical call: counted and timed per endpoint
+    ("GET /v1/invoices/{id}"), retries included in its latency;
+  - request is one HTTP attempt: attempts beyond the first are retries, and
+    429 responses are counted separately.
+
+Calls are attributed to the current unit of work: a web request (opened by
+RequestMetricsMiddleware, labelled "view:<url name>" with its request id) or a
+job (`with stripe_metrics.job("sync_invoices")`, labelled "job:<name>").
+Per-source totals give the call budget a view or job actually uses; units over
+their budget (settings.STRIPE_CALL_BUDGETS, default DEFAULT_VIEW_BUDGET for
+views) are logged and kept in a short list for the diagnostics page.
+
+Aggregates are per process, like core.request_metrics.
+"""
+from __future__ import annotations
+
+import logging
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+from .request_metrics import LATENCY_BUCKETS, _label
+
+log = logging.getLogger(__name__)
+
+# Stripe calls one page view may make before it's reported as over budget
+DEFAULT_VIEW_BUDGET = 5
+RECENT_OVER_BUDGET = 50
+
+# Object ids ("in_1Nv0...", "cus_Nff..."), not resource names like "line_items"
+_ID_SEGMENT = re.compile(r"^(?:[a-z]+_(?=[A-Za-z0-9]*[0-9A-Z])[A-Za-z0-9]+|\d+)$")
+
+_LOCK = threading.Lock()
+_ENDPOINTS: Dict[str, Dict] = {}
+_SOURCES: Dict[str, Dict] = {}
+_OVER_BUDGET: deque = deque(maxlen=RECENT_OVER_BUDGET)
+_local = threading.local()
+
+
+class Unit:
+    """Stripe usage of one request or job run."""
+    __slots__ = ("calls", "attempts", "rate_limited", "errors", "seconds", "endpoints")
+
+    def __init__(self):
+        self.calls = 0
+        self.attempts = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.endpoints: Dict[str, int] = {}
+
+
+def endpoint_label(method: str, url: str) -> str:
+    """'get', 'https://api.stripe.com/v1/invoices/in_1?x=1' -> 'GET /v1/invoices/{id}'."""
+    path = url.split("://", 1)[-1]
+    path = "/" + path.split("/", 1)[1] if "/" in path else "/"
+    path = path.split("?", 1)[0]
+    parts = ["{id}" if _ID_SEGMENT.match(p) else p for p in path.split("/")]
+    return f"{method.upper()} {'/'.join(parts)}"
+
+
+# ---------- units of work ----------
+def _stack() -> List[Unit]:
+    stack = getattr(_local, "units", None)
+    if stack is None:
+        stack = _local.units = []
+    return stack
+
+
+def begin() -> Unit:
+    unit = Unit()
+    _stack().append(unit)
+    return unit
+
+
+def end(unit: Unit, source: str, request_id: Optional[str] = None) -> None:
+    """Close a unit and fold it into the per-source budget stats."""
+    stack = _stack()
+    if unit in stack:
+        stack.remove(unit)
+    if not unit.calls:
+        return
+    budget = budget_for(source)
+    over = budget is not None and unit.calls > budget
+    with _LOCK:
+        st = _SOURCES.get(source)
+        if st is None:
+            st = _SOURCES[source] = {"runs": 0, "calls": 0, "max_calls": 0, "seconds": 0.0,
+                                     "retries": 0, "rate_limited": 0, "errors": 0, "over_budget": 0}
+        st["runs"] += 1
+        st["calls"] += unit.calls
+        st["max_calls"] = max(st["max_calls"], unit.calls)
+        st["seconds"] += unit.seconds
+        st["retries"] += unit.attempts - unit.calls
+        st["rate_limited"] += unit.rate_limited
+        st["errors"] += unit.errors
+        if over:
+            st["over_budget"] += 1
+            _OVER_BUDGET.append({
+                "source": source, "request_id": request_id, "calls": unit.calls, "budget": budget,
+                "seconds": round(unit.seconds, 3), "endpoints": dict(unit.endpoints), "at": time.time(),
+            })
+    if over:
+        log.warning("stripe budget exceeded by %s: %d call(s) > %d (request %s)", source, unit.calls, budget, request_id or "-")
+
+
+@contextmanager
+def job(name: str):
+    """Attribute Stripe calls made inside the block to job:<name>."""
+    unit = begin()
+    try:
+        yield unit
+    finally:
+        end(unit, f"job:{name}")
+
+
+def budget_for(source: str) -> Optional[int]:
+    budgets = getattr(settings, "STRIPE_CALL_BUDGETS", None) or {}
+    if source in budgets:
+        return budgets[source]
+    return DEFAULT_VIEW_BUDGET if source.startswith("view:") else None
+
+
+# ---------- HTTP client hooks ----------
+def _record_call(endpoint: str, seconds: float, attempts: int, rate_limited: int, error: bool) -> None:
+    with _LOCK:
+        st = _ENDPOINTS.get(endpoint)
+        if st is None:
+            st = _ENDPOINTS[endpoint] = {"calls": 0, "attempts": 0, "rate_limited": 0, "errors": 0,
+                                         "seconds": 0.0, "max_seconds": 0.0, "buckets": [0] * len(LATENCY_BUCKETS)}
+        st["calls"] += 1
+        st["attempts"] += attempts
+        st["rate_limited"] += rate_limited
+        st["errors"] += int(error)
+        st["seconds"] += seconds
+        st["max_seconds"] = max(st["max_seconds"], seconds)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                st["buckets"][i] += 1
+                break
+    for unit in _stack():
+        unit.calls += 1
+        unit.attempts += attempts
+        unit.rate_limited += rate_limited
+        unit.errors += int(error)
+        unit.seconds += seconds
+        unit.endpoints[endpoint] = unit.endpoints.get(endpoint, 0) + 1
+
+
+def _wrap_logical(fn):
+    def wrapped(method, url, *args, **kwargs):
+        outer = getattr(_local, "attempt", None)
+        attempt = _local.attempt = {"n": 0, "rate_limited": 0, "status": None}
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = fn(method, url, *args, **kwargs)
+            failed = False
+            return result
+        finally:
+            _local.attempt = outer
+            elapsed = time.perf_counter() - start
+            status = attempt["status"]
+            error = failed or status is None or status >= 400
+            endpoint = endpoint_label(method, url)
+            _record_call(endpoint, elapsed, max(attempt["n"], 1), attempt["rate_limited"], error)
+            log.debug("stripe %s -> %s in %.3fs (%d attempt(s))", endpoint, status, elapsed, max(attempt["n"], 1))
+    return wrapped
+
+
+def _wrap_attempt(fn):
+    def wrapped(*args, **kwargs):
+        attempt = getattr(_local, "attempt", None)
+        try:
+            response = fn(*args, **kwargs)
+        except Exception:
+            if attempt is not None:
+                attempt["n"] += 1
+                attempt["status"] = None
+            raise
+        if attempt is not None:
+            status = response[1]
+            attempt["n"] += 1
+            attempt["status"] = status
+            if status == 429:
+                attempt["rate_limited"] += 1
+        return response
+    return wrapped
+
+
+def instrument_client(client):
+    """Wrap a stripe HTTPClient instance in place (idempotent); returns it."""
+    if client is None or getattr(client, "_nfdw_instrumented", False):
+        return client
+    for name in ("request_with_retries", "request_stream_with_retries"):
+        setattr(client, name, _wrap_logical(getattr(client, name)))
+    for name in ("request", "request_stream"):
+        setattr(client, name, _wrap_attempt(getattr(client, name)))
+    client._nfdw_instrumented = True
+    return client
+
+
+def _new_default_client(stripe):
+    """The client stripe would create lazily, with its module-level proxy/SSL config."""
+    from stripe import _api_requestor
+    from stripe._http_client import new_default_http_client, new_http_client_async_fallback
+    kwargs = {"verify_ssl_certs": stripe.verify_ssl_certs, "proxy": stripe.proxy}
+    client = new_default_http_client(async_fallback_client=new_http_client_async_fallback(**kwargs), **kwargs)
+    # Record the proxy the client was built with, as stripe does, so it only
+    # warns about stripe.proxy changing after this point
+    _api_requestor._default_proxy = stripe.proxy
+    return client
+
+
+def install() -> None:
+    """Instrument stripe.default_http_client, creating the library's default if unset."""
+    try:
+        import stripe
+        if not stripe.default_http_client:
+            stripe.default_http_client = _new_default_client(stripe)
+        instrument_client(stripe.default_http_client)
+    except Exception as e:
+        log.warning("stripe metrics not installed: %s", e)
+
+
+# ---------- reporting ----------
+def reset() -> None:
+    with _LOCK:
+        _ENDPOINTS.clear()
+        _SOURCES.clear()
+        _OVER_BUDGET.clear()
+
+
+def summary() -> Dict:
+    """JSON-friendly view for stripe_diagnostics_view."""
+    with _LOCK:
+        endpoints = {
+            name: {
+                "calls": st["calls"],
+                "retries": st["attempts"] - st["calls"],
+                "rate_limited": st["rate_limited"],
+                "errors": st["errors"],
+                "avg_ms": round(st["seconds"] / st["calls"] * 1000, 1),
+                "max_ms": round(st["max_seconds"] * 1000, 1),
+            }
+            for name, st in sorted(_ENDPOINTS.items())
+        }
+        sources = {
+            name: {
+                "runs": st["runs"],
+                "calls": st["calls"],
+                "avg_calls": round(st["calls"] / st["runs"], 2),
+                "max_calls": st["max_calls"],
+                "budget": budget_for(name),
+                "over_budget": st["over_budget"],
+                "retries": st["retries"],
+                "rate_limited": st["rate_limited"],
+                "errors": st["errors"],
+                "seconds": round(st["seconds"], 3),
+            }
+            for name, st in sorted(_SOURCES.items())
+        }
+        over = list(_OVER_BUDGET)
+    return {"endpoints": endpoints, "sources": sources, "recent_over_budget": over}
+
+
+def render_prometheus() -> str:
+    with _LOCK:
+        endpoints = {k: {**v, "buckets": list(v["buckets"])} for k, v in _ENDPOINTS.items()}
+        sources = {k: dict(v) for k, v in _SOURCES.items()}
+    out: List[str] = []
+
+    out.append("# HELP stripe_api_duration_seconds Stripe API call latency (retries included) by endpoint.")
+    out.append("# TYPE stripe_api_duration_seconds histogram")
+    for name in sorted(endpoints):
+        st = endpoints[name]
+        labels = f'endpoint="{_label(name)}"'
+        cumulative = 0
+        for bound, n in zip(LATENCY_BUCKETS, st["buckets"]):
+            cumulative += n
+            out.append(f'stripe_api_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        out.append(f'stripe_api_duration_seconds_bucket{{{labels},le="+Inf"}} {st["calls"]}')
+        out.append(f"stripe_api_duration_seconds_sum{{{labels}}} {st['seconds']:.6f}")
+        out.append(f"stripe_api_duration_seconds_count{{{labels}}} {st['calls']}")
+    for metric, help_text, value in (
+        ("stripe_api_retries_total", "Stripe HTTP attempts beyond the first.", lambda st: st["attempts"] - st["calls"]),
+        ("stripe_api_rate_limited_total", "Stripe 429 responses.", lambda st: st["rate_limited"]),
+        ("stripe_api_errors_total", "Stripe calls ending in an error or connection failure.", lambda st: st["errors"]),
+    ):
+        out.append(f"# HELP {metric} {help_text}")
+        out.append(f"# TYPE {metric} counter")
+        for name in sorted(endpoints):
+            out.append(f'{metric}{{endpoint="{_label(name)}"}} {value(endpoints[name])}')
+
+    for metric, kind, help_text, field in (
+        ("stripe_source_runs_total", "counter", "Requests/job runs that called Stripe.", "runs"),
+        ("stripe_source_calls_total", "counter", "Stripe calls by view or job.", "calls"),
+        ("stripe_source_max_calls", "gauge", "Most Stripe calls made by one request/job run.", "max_calls"),
+        ("stripe_source_over_budget_total", "counter", "Requests/job runs over their Stripe call budget.", "over_budget"),
+    ):
+        out.append(f"# HELP {metric} {help_text}")
+        out.append(f"# TYPE {metric} {kind}")
+        for name in sorted(sources):
+            out.append(f'{metric}{{source="{_label(name)}"}} {sources[name][field]}')
+    return "\n".join(out) + "\n"
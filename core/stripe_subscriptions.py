@@ -5,9 +5,10 @@ from django.db import transaction
 import stripe
 import logging
 
-from .models import Client, StripeSubscriptionLink, StripeSubscriptionSchedule, SubOccurrence, Service, Booking
+from .models import Client, StripeSubscriptionLink, StripeSubscriptionSchedule, SubOccurrence, Booking
 from .stripe_integration import get_stripe_key
 from .service_map import get_service_code
+from .service_registry import default_service, get_service
 
 log = logging.getLogger(__name__)
 
@@ -90,9 +91,9 @@ def materialize_future_holds(sub_link: StripeSubscriptionLink, horizon_days: int
     service = None
     service_code = sub_link.service_code
     if service_code:
-        service = Service.objects.filter(code=service_code, is_active=True).first()
+        service = get_service(service_code)
     if service is None:
-        service = Service.objects.filter(is_active=True, duration_minutes__isnull=False).first()
+        service = default_service()
 
     hh, mm = [int(x) for x in sched.default_time.split(":")]
     dur = timedelta(minutes=sched.default_duration_minutes)
@@ -107,12 +108,18 @@ def materialize_future_holds(sub_link: StripeSubscriptionLink, horizon_days: int
             obj, made = SubOccurrence.objects.get_or_create(
                 stripe_subscription_id=sub_link.stripe_subscription_id,
                 start_dt=start,
-                end_dt=end,
-                defaults={"active": True},
+                defaults={"end_dt": end, "active": True, "link": sub_link, "client_id": sub_link.client_id},
             )
+            missing = []
             if obj.service_id is None and service:
                 obj.service = service
-                obj.save(update_fields=["service"])
+                missing.append("service")
+            if obj.link_id != sub_link.id or obj.client_id != sub_link.client_id:
+                obj.link = sub_link
+                obj.client_id = sub_link.client_id
+                missing += ["link", "client"]
+            if missing:
+                obj.save(update_fields=missing)
 
             # Auto-create a Booking if a duration is known
             if made:
@@ -140,8 +147,11 @@ def materialize_future_holds(sub_link: StripeSubscriptionLink, horizon_days: int
                     else:
                         log.warning("Skipping booking creation for %s at %s: no service duration set.",
                                     sub_link.client, start)
-    sched.last_materialized_until = until
-    sched.save(update_fields=["last_materialized_until"])
+    # Once the 12-week materializer has built the schedule the watermark is its own:
+    # advancing it from here would make its next rolling run skip the slots in between.
+    if not sched.materialized_signature:
+        sched.last_materialized_until = until
+        sched.save(update_fields=["last_materialized_until"])
     return {"created": created}
 
 
@@ -1,7 +1,12 @@
+import hashlib
+import time
+from collections import defaultdict
 from datetime import datetime, timedelta
 from django.utils import timezone
 from django.db import transaction
-from .models import StripeSubscriptionSchedule, Service, Booking
+from django.db.models import Q
+from .models import StripeSubscriptionSchedule, Booking
+from .service_registry import active_services, get_service
 import logging
 
 log = logging.getLogger(__name__)
@@ -35,11 +40,12 @@ def _ensure_tz(dt):
     return dt
 
 
-def _plan_slots(sched, week0, horizon_weeks):
+def _plan_slots(sched, week0, horizon_weeks, service=None):
     """
     Yield (start_dt, end_dt, service) tuples for each planned slot in the horizon.
     """
-    service = Service.objects.filter(code=sched.sub.service_code, is_active=True).first()
+    if service is None:
+        service = get_service(sched.sub.service_code)
     if not service or not service.duration_minutes:
         return
     days = sched.parsed_days()
@@ -55,6 +61,35 @@ def _plan_slots(sched, week0, horizon_weeks):
             yield start_dt, end_dt, service
 
 
+def _schedule_signature(sched, service):
+    """
+    Fingerprint of every input that shapes the plan. When it changes the
+    schedule was edited and needs a full rebuild instead of a rolling extension.
+    """
+    parts = [
+        ",".join(str(d) for d in sched.parsed_days()),
+        sched.parsed_time().strftime("%H:%M"),
+        str(sched.interval_weeks()),
+        sched.location or "Home",
+        str(sched.sub.client_id),
+        f"{service.pk}:{service.code}:{service.duration_minutes}",
+    ]
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def _horizon_until(week0, horizon_weeks):
+    """Last local date covered by a plan starting at week0."""
+    return (week0 + timedelta(weeks=horizon_weeks)).date() - timedelta(days=1)
+
+
+def _can_roll(sched, signature):
+    return bool(
+        sched.materialized_signature == signature
+        and sched.last_materialized_until
+        and sched.materialized_anchor
+    )
+
+
 def _delete_future_autogen_for_schedule(sched, cutoff_dt):
     """
     Only delete future, autogenerated bookings owned by this schedule.
@@ -70,13 +105,76 @@ def _delete_future_autogen_for_schedule(sched, cutoff_dt):
     return deleted_count
 
 
+def _create_slots(sched, slots):
+    """
+    Create autogenerated bookings for the given planned slots, skipping any slot
+    that already has a booking. The open invoice is only looked up when needed.
+    Returns (created, skipped).
+    """
+    created = 0
+    skipped = 0
+    location = sched.location or "Home"
+    invoice_id = None
+    invoice_looked_up = False
+    for start_dt, end_dt, svc in slots:
+        # If any booking exists at this slot (manual or autogenerated), skip creation
+        if Booking.slot_exists(sched.sub.client, start_dt, service=svc):
+            skipped += 1
+            continue
+        if not invoice_looked_up:
+            # Try to find or create an open invoice for this client
+            invoice_id = _find_or_create_open_invoice(sched.sub.client)
+            invoice_looked_up = True
+        Booking.objects.create(
+            client=sched.sub.client,
+            service=svc,
+            service_code=sched.sub.service_code,
+            service_name=svc.name,
+            service_label=svc.name,
+            start_dt=start_dt,
+            end_dt=end_dt,
+            price_cents=0,
+            status="pending",
+            location=location,
+            schedule=sched,
+            autogenerated=True,
+            stripe_invoice_id=invoice_id,  # Link to open invoice if available
+        )
+        created += 1
+    return created, skipped
+
+
+def _roll_schedule(sched, service, week0, until):
+    """
+    Extend an unchanged schedule from its watermark to the new horizon end.
+    Slots are planned from the anchor of the last full rebuild so fortnightly
+    parity stays stable, then only dates past the watermark are created.
+    """
+    since = max(sched.last_materialized_until + timedelta(days=1), week0.date())
+    if since > until:
+        return {"created": 0, "skipped": 0, "removed": 0, "mode": "rolling"}
+    anchor = sched.materialized_anchor
+    weeks = (until - anchor).days // 7 + 1
+    slots = (
+        slot for slot in _plan_slots(sched, anchor, weeks, service=service)
+        if since <= timezone.localtime(slot[0]).date() <= until
+    )
+    created, skipped = _create_slots(sched, slots)
+    sched.last_materialized_until = until
+    sched.save(update_fields=["last_materialized_until"])
+    log.info("Sched %s rolled %s..%s: created=%s skipped=%s", sched.id, since, until, created, skipped)
+    return {"created": created, "skipped": skipped, "removed": 0, "mode": "rolling"}
+
+
 @transaction.atomic
-def materialize_for_schedule(sched: StripeSubscriptionSchedule, now_dt=None, horizon_weeks=HORIZON_WEEKS):
+def materialize_for_schedule(sched: StripeSubscriptionSchedule, now_dt=None, horizon_weeks=HORIZON_WEEKS, full=False):
     """
     Deterministically (re)build future bookings for a single schedule.
     Strategy:
       - If inactive: delete future autogenerated bookings and stop.
       - If incomplete or invalid service/duration: skip (no deletions).
+      - If inputs are unchanged since the last full rebuild (and not `full`):
+        only create slots between `last_materialized_until` and the new horizon end.
       - Else: delete future autogenerated, then re-create exact plan.
       - Never overwrite or delete manual bookings.
       - Include open invoices when materializing bookings.
@@ -88,6 +186,9 @@ def materialize_for_schedule(sched: StripeSubscriptionSchedule, now_dt=None, hor
     # Inactive schedules stop producing new bookings; remove future autogenerated
     if not sched.sub.active:
         removed = _delete_future_autogen_for_schedule(sched, week0)
+        if sched.materialized_signature:
+            sched.materialized_signature = None
+            sched.save(update_fields=["materialized_signature"])
         log.info("Sched %s inactive → removed future autogenerated=%s", sched.id, removed)
         return {"created": 0, "skipped": 0, "removed": removed}
 
@@ -95,61 +196,202 @@ def materialize_for_schedule(sched: StripeSubscriptionSchedule, now_dt=None, hor
     if not sched.is_complete():
         log.info("Skip sched %s: incomplete (%s)", sched.id, ",".join(sched.missing_fields()))
         return {"created": 0, "skipped": 0, "removed": 0}
-    service = Service.objects.filter(code=sched.sub.service_code, is_active=True).first()
+    service = get_service(sched.sub.service_code)
     if not service or not service.duration_minutes:
         log.info("Skip sched %s: service missing/invalid duration", sched.id)
         return {"created": 0, "skipped": 0, "removed": 0}
 
+    signature = _schedule_signature(sched, service)
+    until = _horizon_until(week0, horizon_weeks)
+    if not full and _can_roll(sched, signature):
+        return _roll_schedule(sched, service, week0, until)
+
     removed = _delete_future_autogen_for_schedule(sched, week0)
-    created = 0
-    skipped = 0
-    location = sched.location or "Home"
-    
-    # Try to find or create an open invoice for this client
-    invoice_id = _find_or_create_open_invoice(sched.sub.client)
+    created, skipped = _create_slots(sched, _plan_slots(sched, week0, horizon_weeks, service=service))
 
-    for start_dt, end_dt, svc in _plan_slots(sched, week0, horizon_weeks):
-        # If any booking exists at this slot (manual or autogenerated), skip creation
-        if Booking.slot_exists(sched.sub.client, start_dt, service=svc):
-            skipped += 1
-            continue
-        Booking.objects.create(
-            client=sched.sub.client,
-            service=svc,
-            service_code=sched.sub.service_code,
-            service_name=svc.name,
-            service_label=svc.name,
-            start_dt=start_dt,
-            end_dt=end_dt,
-            price_cents=0,
-            status="pending",
-            location=location,
-            schedule=sched,
-            autogenerated=True,
-            stripe_invoice_id=invoice_id,  # Link to open invoice if available
-        )
-        created += 1
+    sched.last_materialized_until = until
+    sched.materialized_signature = signature
+    sched.materialized_anchor = week0.date()
+    sched.save(update_fields=["last_materialized_until", "materialized_signature", "materialized_anchor"])
 
     log.info("Sched %s materialized: created=%s skipped=%s removed=%s", sched.id, created, skipped, removed)
-    return {"created": created, "skipped": skipped, "removed": removed}
+    return {"created": created, "skipped": skipped, "removed": removed, "mode": "full"}
 
 
 @transaction.atomic
-def materialize_all(now_dt=None, horizon_weeks=HORIZON_WEEKS):
+def materialize_all(now_dt=None, horizon_weeks=HORIZON_WEEKS, full=False):
     """
     Rebuild future bookings for all schedules in a deterministic way.
+    Unchanged schedules are extended incrementally unless `full` is set.
     """
     now_dt = now_dt or timezone.localtime()
-    totals = {"created": 0, "skipped": 0, "removed": 0, "processed": 0}
+    totals = {"created": 0, "skipped": 0, "removed": 0, "processed": 0, "rolled": 0}
     for sched in StripeSubscriptionSchedule.objects.all().select_related("sub__client"):
-        res = materialize_for_schedule(sched, now_dt=now_dt, horizon_weeks=horizon_weeks)
+        res = materialize_for_schedule(sched, now_dt=now_dt, horizon_weeks=horizon_weeks, full=full)
         for k in ("created", "skipped", "removed"):
             totals[k] += res.get(k, 0)
+        if res.get("mode") == "rolling":
+            totals["rolled"] += 1
         totals["processed"] += 1
     log.info("Materialize all: %s", totals)
     return totals
 
 
+# ---------- Dry-run planner ----------
+def _ms(t0):
+    return round((time.perf_counter() - t0) * 1000, 2)
+
+
+def _booking_index(client_ids, sched_ids, since_dt):
+    """
+    One query for every booking that could collide with or be removed by the plan.
+    Returns ({(client_id, start_dt, service_id): [row, ...]}, {schedule_id: [owned autogenerated row, ...]}).
+    """
+    by_slot = defaultdict(list)
+    owned = defaultdict(list)
+    rows = Booking.objects.filter(
+        Q(client_id__in=client_ids) | Q(schedule_id__in=sched_ids),
+        start_dt__gte=since_dt,
+    ).values("id", "client_id", "start_dt", "service_id", "schedule_id", "autogenerated")
+    for r in rows:
+        by_slot[(r["client_id"], r["start_dt"], r["service_id"])].append(r)
+        if r["autogenerated"] and r["schedule_id"]:
+            owned[r["schedule_id"]].append(r)
+    return by_slot, owned
+
+
+def _slot_row(start_dt, end_dt, svc, booking_id=None, reason=None):
+    row = {"start": start_dt.isoformat(), "end": end_dt.isoformat(), "service": svc.code}
+    if booking_id is not None:
+        row["booking_id"] = booking_id
+    if reason:
+        row["reason"] = reason
+    return row
+
+
+def _owned_row(r):
+    return {"booking_id": r["id"], "start": r["start_dt"].isoformat()}
+
+
+def _diff_schedule(sched, week0, horizon_weeks, full, service, by_slot, owned):
+    """
+    Compute, without writing, what materialize_for_schedule would do.
+    `create` are new bookings, `keep` are owned bookings a full rebuild would
+    recreate identically, `remove` are owned bookings that would disappear and
+    `skip` are planned slots already taken by another booking.
+    """
+    diff = {
+        "schedule_id": sched.id,
+        "subscription_id": sched.sub.stripe_subscription_id,
+        "client_id": sched.sub.client_id,
+        "mode": "skip",
+        "reason": "",
+        "create": [],
+        "keep": [],
+        "remove": [],
+        "skip": [],
+    }
+    own = owned.get(sched.id, [])
+    if not sched.sub.active:
+        diff.update(mode="inactive", reason="subscription inactive")
+        diff["remove"] = [_owned_row(r) for r in own]
+        return diff
+    if not sched.is_complete():
+        diff["reason"] = f"incomplete ({','.join(sched.missing_fields())})"
+        return diff
+    if not service or not service.duration_minutes:
+        diff["reason"] = "service missing/invalid duration"
+        return diff
+
+    until = _horizon_until(week0, horizon_weeks)
+    if not full and _can_roll(sched, _schedule_signature(sched, service)):
+        diff["mode"] = "rolling"
+        since = max(sched.last_materialized_until + timedelta(days=1), week0.date())
+        weeks = (until - sched.materialized_anchor).days // 7 + 1
+        slots = [
+            slot for slot in _plan_slots(sched, sched.materialized_anchor, weeks, service=service)
+            if since <= timezone.localtime(slot[0]).date() <= until
+        ]
+        replaced = set()
+    else:
+        diff["mode"] = "full"
+        slots = list(_plan_slots(sched, week0, horizon_weeks, service=service))
+        replaced = {r["id"] for r in own}
+
+    kept = set()
+    for start_dt, end_dt, svc in slots:
+        rows = by_slot.get((sched.sub.client_id, start_dt, svc.pk), ())
+        others = [r for r in rows if r["id"] not in replaced]
+        if others:
+            reason = "booking exists" if others[0]["autogenerated"] else "manual booking exists"
+            diff["skip"].append(_slot_row(start_dt, end_dt, svc, others[0]["id"], reason))
+            continue
+        mine = [r for r in rows if r["id"] in replaced]
+        if mine:
+            kept.add(mine[0]["id"])
+            diff["keep"].append(_slot_row(start_dt, end_dt, svc, mine[0]["id"]))
+        else:
+            diff["create"].append(_slot_row(start_dt, end_dt, svc))
+    diff["remove"] = [_owned_row(r) for r in own if r["id"] in replaced and r["id"] not in kept]
+    return diff
+
+
+def _plan(scheds, now_dt, horizon_weeks, full, timings):
+    week0 = _monday_of_week(now_dt)
+    t0 = time.perf_counter()
+    services = active_services()
+    by_slot, owned = _booking_index(
+        {s.sub.client_id for s in scheds}, [s.id for s in scheds], _ensure_tz(week0)
+    )
+    timings["load_bookings_ms"] = _ms(t0)
+
+    t0 = time.perf_counter()
+    diffs = [
+        _diff_schedule(s, week0, horizon_weeks, full, services.get(s.sub.service_code), by_slot, owned)
+        for s in scheds
+    ]
+    timings["diff_ms"] = _ms(t0)
+    return diffs
+
+
+def _summarize(diffs):
+    totals = {"processed": len(diffs), "create": 0, "keep": 0, "remove": 0, "skip": 0}
+    for d in diffs:
+        for k in ("create", "keep", "remove", "skip"):
+            totals[k] += len(d[k])
+    return totals
+
+
+def plan_for_schedule(sched: StripeSubscriptionSchedule, now_dt=None, horizon_weeks=HORIZON_WEEKS, full=False):
+    """
+    Dry-run of materialize_for_schedule: returns the diff for one schedule
+    (which may carry unsaved edits) without writing anything.
+    """
+    now_dt = now_dt or timezone.localtime()
+    timings = {}
+    t0 = time.perf_counter()
+    diff = _plan([sched], now_dt, horizon_weeks, full, timings)[0]
+    timings["total_ms"] = _ms(t0)
+    return {"schedule": diff, "timings": timings}
+
+
+def plan_all(now_dt=None, horizon_weeks=HORIZON_WEEKS, full=False):
+    """
+    Dry-run of materialize_all. Loads schedules, services and every relevant
+    booking with one query each, then diffs each schedule set-wise in memory.
+    Returns {"totals", "schedules": [diff, ...], "timings"}.
+    """
+    now_dt = now_dt or timezone.localtime()
+    timings = {}
+    t_all = time.perf_counter()
+    t0 = time.perf_counter()
+    scheds = list(StripeSubscriptionSchedule.objects.all().select_related("sub__client"))
+    timings["load_schedules_ms"] = _ms(t0)
+    diffs = _plan(scheds, now_dt, horizon_weeks, full, timings)
+    timings["total_ms"] = _ms(t_all)
+    return {"totals": _summarize(diffs), "schedules": diffs, "timings": timings}
+
+
 # Backward compatibility alias
 @transaction.atomic
 def materialize_future_holds(now_dt=None):
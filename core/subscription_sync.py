@@ -1,18 +1,22 @@
 """Core subscription sync functionality to materialize Stripe subscriptions to SubOccurrence."""
 
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, time, timedelta, timezone
 from typing import Dict, List, Optional
 import stripe
 import logging
 
+from django.db import transaction
 from django.utils import timezone as django_tz
-from .models import SubOccurrence
+from .models import StripeSubscriptionLink, SubOccurrence
 from .secrets_config import get_stripe_key
 from .stripe_integration import list_active_subscriptions
 from .log_utils import log_subscription_error, log_subscription_info
 
 log = logging.getLogger(__name__)
 
+# Rows per INSERT/DELETE statement; keeps SQLite well under its variable limit
+SYNC_BATCH_SIZE = 500
+
 
 def _get_fake_subscriptions() -> List[Dict]:
     """Generate fake subscription data for when Stripe is not configured.
@@ -188,18 +192,91 @@ def _get_active_subscriptions(horizon_days: int) -> List[Dict]:
         return _get_fake_subscriptions()
 
 
+def _today_start():
+    """Aware local midnight of today (same cutoff as start_dt__date >= localdate())."""
+    today = django_tz.localdate()
+    return django_tz.make_aware(datetime.combine(today, time.min), django_tz.get_current_timezone())
+
+
+def _merge_occurrences(desired: Dict, failed_subs: set, result: Dict) -> None:
+    """Merge desired occurrences into future SubOccurrence rows.
+
+    link/client are denormalised from StripeSubscriptionLink on every merge.
+
+    Args:
+        desired: {(subscription_id, start_dt): occurrence dict}
+        failed_subs: subscription ids whose expansion failed; their rows are left alone
+        result: sync result dict; created/updated/unchanged/cleaned are filled in
+    """
+    links = {
+        sub_id: (link_id, client_id)
+        for link_id, sub_id, client_id in StripeSubscriptionLink.objects.filter(
+            stripe_subscription_id__in={key[0] for key in desired}
+        ).values_list('id', 'stripe_subscription_id', 'client_id')
+    }
+    existing = {
+        (sub_id, start): (pk, (end, active, link_id, client_id))
+        for pk, sub_id, start, end, active, link_id, client_id in SubOccurrence.objects.filter(
+            start_dt__gte=_today_start()
+        ).values_list('id', 'stripe_subscription_id', 'start_dt', 'end_dt', 'active', 'link_id', 'client_id')
+    }
+
+    upserts = []
+    for key, occ in desired.items():
+        link_id, client_id = links.get(occ['subscription_id'], (None, None))
+        current = existing.get(key)
+        if current and current[1] == (occ['end_dt'], occ['active'], link_id, client_id):
+            result['unchanged'] += 1
+            continue
+        result['updated' if current else 'created'] += 1
+        upserts.append(SubOccurrence(
+            stripe_subscription_id=occ['subscription_id'],
+            start_dt=occ['start_dt'],
+            end_dt=occ['end_dt'],
+            active=occ['active'],
+            link_id=link_id,
+            client_id=client_id,
+        ))
+
+    stale_ids = [
+        pk for key, (pk, _values) in existing.items()
+        if key not in desired and key[0] not in failed_subs
+    ]
+
+    result['cleaned'] = len(stale_ids)
+    if not upserts and not stale_ids:
+        return
+    with transaction.atomic():
+        if upserts:
+            SubOccurrence.objects.bulk_create(
+                upserts,
+                batch_size=SYNC_BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=['stripe_subscription_id', 'start_dt'],
+                update_fields=['end_dt', 'active', 'link', 'client'],
+            )
+        for i in range(0, len(stale_ids), SYNC_BATCH_SIZE):
+            SubOccurrence.objects.filter(id__in=stale_ids[i:i + SYNC_BATCH_SIZE]).delete()
+
+
 def sync_subscriptions_to_bookings_and_calendar(horizon_days: int = 90) -> Dict:
-    """Clear future SubOccurrence (>= today) then rebuild from active Stripe subscriptions.
+    """Merge future SubOccurrence (>= today) with occurrences of active Stripe subscriptions.
+
+    New occurrences are inserted, changed ones updated in place and stale ones
+    deleted, all in bulk, so the calendar never goes empty mid-sync and a
+    no-change sync writes nothing.
     
     Args:
         horizon_days: Number of days to look ahead for creating subscription occurrences
         
     Returns:
-        Dict with keys: processed, created, cleaned, errors
+        Dict with keys: processed, created, updated, unchanged, cleaned, errors
     """
     result = {
         'processed': 0,
         'created': 0,
+        'updated': 0,
+        'unchanged': 0,
         'cleaned': 0,
         'errors': 0
     }
@@ -207,52 +284,43 @@ def sync_subscriptions_to_bookings_and_calendar(horizon_days: int = 90) -> Dict:
     log_subscription_info(f"Starting subscription sync with horizon_days={horizon_days}")
     
     try:
-        # Step 1: Clear future SubOccurrence records (>= today)
-        today = django_tz.now().date()
-        future_occurrences = SubOccurrence.objects.filter(start_dt__date__gte=today)
-        cleaned_count = future_occurrences.count()
-        future_occurrences.delete()
-        result['cleaned'] = cleaned_count
-        
-        log_subscription_info(f"Cleaned {cleaned_count} future SubOccurrence records")
-        
-        # Step 2: Get active subscriptions
+        # Step 1: Get active subscriptions
         subscriptions = _get_active_subscriptions(horizon_days)
         result['processed'] = len(subscriptions)
         
-        # Step 3: Generate and create new SubOccurrence records
+        # Step 2: Expand into the desired occurrence set
+        desired = {}
+        failed_subs = set()
         for subscription in subscriptions:
             try:
                 occurrences = _expand_subscription_occurrences(subscription, horizon_days)
-                
                 for occurrence in occurrences:
-                    SubOccurrence.objects.create(
-                        stripe_subscription_id=occurrence['subscription_id'],
-                        start_dt=occurrence['start_dt'],
-                        end_dt=occurrence['end_dt'],
-                        active=occurrence['active']
-                    )
-                    result['created'] += 1
+                    desired[(occurrence['subscription_id'], occurrence['start_dt'])] = occurrence
                 
                 log_subscription_info(
-                    f"Created {len(occurrences)} occurrences for subscription {subscription['id']}"
+                    f"Planned {len(occurrences)} occurrences for subscription {subscription['id']}"
                 )
                 
             except Exception as e:
                 sub_id = subscription.get('id')
+                failed_subs.add(sub_id)
                 log.exception("[Sync] Error materializing subscription %s: %s", sub_id, e)
                 result['errors'] += 1
         
+        # Step 3: Merge against existing future SubOccurrence records
+        _merge_occurrences(desired, failed_subs, result)
+        
         if result['errors']:
             log.error("[Sync] Completed with %s errors", result['errors'])
         
         log_subscription_info(
             f"Sync completed: processed={result['processed']}, "
-            f"created={result['created']}, cleaned={result['cleaned']}, errors={result['errors']}"
+            f"created={result['created']}, updated={result['updated']}, "
+            f"unchanged={result['unchanged']}, cleaned={result['cleaned']}, errors={result['errors']}"
         )
         
     except Exception as e:
         log_subscription_error(f"Critical error in subscription sync: {e}")
         result['errors'] += 1
     
-    return result
\ No newline at end of file
+    return result
@@ -11,6 +11,8 @@ from django.apps import apps
 from django.utils.timezone import make_aware
 from django.core.exceptions import FieldDoesNotExist
 
+from .stripe_metrics import instrument_client
+
 log = logging.getLogger(__name__)
 
 # ---------- Helpers ----------
@@ -46,7 +48,7 @@ def _ensure_stripe():
         raise RuntimeError("STRIPE_API_KEY or STRIPE_SECRET_KEY missing")
     stripe.api_key = api_key
     # make requests modestly sized
-    stripe.default_http_client = stripe.http_client.new_default_http_client(timeout=30)
+    stripe.default_http_client = instrument_client(stripe.http_client.new_default_http_client(timeout=30))
 
 _EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
 
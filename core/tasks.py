@@ -4,7 +4,7 @@ from django.conf import settings
 from django.core.mail import send_mail
 from django.utils import timezone
 from .models import Booking
-from . import subscription_sync
+from . import stripe_metrics, subscription_sync
 
 @shared_task(bind=True, autoretry_for=(Exception,), retry_backoff=10, max_retries=5)
 def sync_subscriptions_daily(self):
@@ -12,7 +12,8 @@ def sync_subscriptions_daily(self):
     Materialize/refresh future subscription occurrences and calendar holds.
     Mirrors the manual 'Troubleshoot Sync' but runs unattended daily when beat is enabled.
     """
-    stats = subscription_sync.sync_subscriptions_to_bookings_and_calendar()
+    with stripe_metrics.job("sync_subscriptions_daily"):
+        stats = subscription_sync.sync_subscriptions_to_bookings_and_calendar()
     return stats
 
 @shared_task(bind=True, autoretry_for=(Exception,), retry_backoff=5, max_retries=3)
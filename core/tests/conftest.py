@@ -0,0 +1,13 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def _synchronous_audit(settings):
+    """Write AdminEvents inline so tests can read them back (see settings.AUDIT_ASYNC)."""
+    settings.AUDIT_ASYNC = False
+
+
+@pytest.fixture(autouse=True)
+def _sync_logs_in_tmp(settings, tmp_path):
+    """Keep subscription sync log files out of the project root (see settings.SYNC_LOG_DIR)."""
+    settings.SYNC_LOG_DIR = tmp_path
@@ -343,3 +343,149 @@ def test_reconcile_create_from_line_creates_booking():
     assert booking.location == 'Park'
     assert booking.stripe_invoice_id == 'in_test123'
     assert booking.autogenerated is False
+
+
+def _fake_invoice(inv_id, lines, customer="cus_x"):
+    inv = MagicMock()
+    inv.id = inv_id
+    inv.status = "open"
+    inv.customer = customer
+    inv.hosted_invoice_url = f"https://example.com/{inv_id}"
+    inv.lines = MagicMock()
+    inv.lines.data = lines
+    return inv
+
+
+def _fake_line(line_id, metadata=None):
+    li = MagicMock()
+    li.id = line_id
+    li.description = f"Line {line_id}"
+    li.amount = 5000
+    li.metadata = metadata or {}
+    li.price = None
+    return li
+
+
+@pytest.mark.django_db
+def test_refresh_reconcile_snapshot_stores_unlinked_lines():
+    """Refresh keeps only lines with no local booking/invoice link, with set-based lookups per page"""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from core.admin_tools_reconcile import refresh_reconcile_snapshot
+    from core.models import ReconcileSnapshotLine, ReconcileSnapshotRun
+
+    service = Service.objects.create(code="walk30", name="30min Walk", duration_minutes=30)
+    c = ClientModel.objects.create(name="Snap", email="snap@example.com", phone="1", address="a", status="active")
+    start = timezone.now()
+    linked = Booking.objects.create(
+        client=c, service=service, start_dt=start, end_dt=start + timezone.timedelta(minutes=30),
+        location="x", status="confirmed", stripe_invoice_id="in_linked",
+    )
+    referenced = Booking.objects.create(
+        client=c, service=service, start_dt=start, end_dt=start + timezone.timedelta(minutes=30),
+        location="x", status="confirmed",
+    )
+    pages = [
+        [_fake_invoice("in_linked", [_fake_line("li_1")]),
+         _fake_invoice("in_ref", [_fake_line("li_2", {"booking_id": str(referenced.id)}), _fake_line("li_3")])],
+        [_fake_invoice("in_orphan", [_fake_line("li_4", {"booking_id": "999999"})])],
+    ]
+    with patch("core.admin_tools_reconcile._recent_invoices", return_value=iter(pages)), \
+         CaptureQueriesContext(connection) as ctx:
+        res = refresh_reconcile_snapshot(days=30)
+
+    assert res == {"invoices": 3, "lines": 2}
+    rows = {r.line_id: r for r in ReconcileSnapshotLine.objects.all()}
+    assert set(rows) == {"li_3", "li_4"}
+    assert rows["li_4"].booking_ref == 999999
+    run = ReconcileSnapshotRun.current()
+    assert run.status == ReconcileSnapshotRun.STATUS_DONE
+    assert run.invoices_seen == 3 and run.lines_unlinked == 2
+    # Constant per page, not per line/invoice
+    booking_selects = [q for q in ctx.captured_queries if 'FROM "core_booking"' in q["sql"]]
+    assert len(booking_selects) == 4
+
+
+@pytest.mark.django_db
+def test_refresh_reconcile_snapshot_failure_keeps_previous_rows():
+    """A Stripe error marks the run failed and leaves the old snapshot in place"""
+    from core.admin_tools_reconcile import refresh_reconcile_snapshot
+    from core.models import ReconcileSnapshotLine, ReconcileSnapshotRun
+
+    ReconcileSnapshotLine.objects.create(invoice_id="in_old", line_id="li_old")
+    with patch("core.admin_tools_reconcile._recent_invoices", side_effect=RuntimeError("stripe down")):
+        res = refresh_reconcile_snapshot(days=30)
+
+    assert res == {"error": "stripe down"}
+    assert ReconcileSnapshotLine.objects.filter(invoice_id="in_old").exists()
+    run = ReconcileSnapshotRun.current()
+    assert run.status == ReconcileSnapshotRun.STATUS_FAILED
+    assert "stripe down" in run.error
+
+
+@pytest.mark.django_db
+def test_reconcile_index_renders_snapshot_without_stripe():
+    """The console reads the snapshot and drops invoices linked since it was taken"""
+    from core.models import ReconcileSnapshotLine
+
+    User.objects.create_user(username="staff", password="p", is_staff=True)
+    service = Service.objects.create(code="walk30", name="30min Walk", duration_minutes=30)
+    c = ClientModel.objects.create(name="Snap", email="snap2@example.com", phone="1", address="a", status="active")
+    start = timezone.now()
+    Booking.objects.create(
+        client=c, service=service, start_dt=start, end_dt=start + timezone.timedelta(minutes=30),
+        location="x", status="confirmed", stripe_invoice_id="in_now_linked",
+    )
+    ReconcileSnapshotLine.objects.create(invoice_id="in_open", line_id="li_open", description="Still unlinked")
+    ReconcileSnapshotLine.objects.create(invoice_id="in_now_linked", line_id="li_gone", description="Linked since")
+
+    client = Client()
+    client.login(username="staff", password="p")
+    with patch("stripe.Invoice.list") as mock_list:
+        resp = client.get(reverse("admin_reconcile"))
+
+    assert resp.status_code == 200
+    mock_list.assert_not_called()
+    assert b"Still unlinked" in resp.content
+    assert b"Linked since" not in resp.content
+
+
+@pytest.mark.django_db
+def test_reconcile_refresh_starts_background_job():
+    """POST to refresh kicks off the background rebuild and redirects back"""
+    User.objects.create_user(username="staff", password="p", is_staff=True)
+    client = Client()
+    client.login(username="staff", password="p")
+    with patch("core.admin_tools_reconcile.start_background_refresh", return_value=True) as mock_start:
+        resp = client.post(reverse("admin_reconcile_refresh"), {"days": "45"})
+
+    assert resp.status_code == 302
+    mock_start.assert_called_once_with(days=45)
+    status = client.get(reverse("admin_reconcile_status")).json()
+    assert status["status"] == "idle"
+
+
+@pytest.mark.django_db
+def test_reconcile_bulk_mark_paid():
+    """Bulk mark-paid updates every selected unpaid booking and audits each once"""
+    from core.models import AdminEvent
+
+    User.objects.create_user(username="staff", password="p", is_staff=True)
+    service = Service.objects.create(code="walk30", name="30min Walk", duration_minutes=30)
+    c = ClientModel.objects.create(name="Payer", email="payer@example.com", phone="1", address="a", status="active")
+    start = timezone.now()
+    bookings = [
+        Booking.objects.create(
+            client=c, service=service, start_dt=start, end_dt=start + timezone.timedelta(minutes=30),
+            location="x", status="confirmed", payment_status=status,
+        )
+        for status in ("unpaid", "unpaid", "paid")
+    ]
+    client = Client()
+    client.login(username="staff", password="p")
+    resp = client.post(reverse("admin_reconcile_bulk_paid"), {"booking_ids": [b.id for b in bookings]})
+
+    assert resp.status_code == 302
+    assert Booking.objects.filter(payment_status="paid").count() == 3
+    assert all(Booking.objects.get(id=b.id).paid_at for b in bookings[:2])
+    assert AdminEvent.objects.filter(event_type="booking.mark_paid").count() == 2
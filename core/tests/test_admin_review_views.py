@@ -272,3 +272,99 @@ class AdminReviewViewsTests(TestCase):
             # First should be the later booking (self.booking)
             self.assertEqual(int(ids_in_order[0]), self.booking.id)
             self.assertEqual(int(ids_in_order[1]), earlier_booking.id)
+
+
+class AdminReviewBulkTests(TestCase):
+    """Tests for multi-select review actions."""
+
+    def setUp(self):
+        self.staff_user = User.objects.create_user(username='staff', password='testpass123', is_staff=True)
+        self.client_obj = Client.objects.create(name="Bulk Client", email="bulk@example.com", phone="1")
+        self.walk30 = Service.objects.create(code="walk30", name="30 Minute Walk", duration_minutes=30)
+        self.walk60 = Service.objects.create(code="walk60", name="60 Minute Walk", duration_minutes=60)
+        self.bookings = []
+        for i in range(6):
+            diff = {"dogs": {"booking": 1, "invoice": 2}} if i % 2 else {"service_code": {"booking": "walk30", "invoice": "walk60"}}
+            self.bookings.append(Booking.objects.create(
+                client=self.client_obj, service=self.walk30, service_code="walk30",
+                service_name="30 Minute Walk", service_label="30 Minute Walk",
+                start_dt=datetime(2025, 10, 21 + i, 10, 0, tzinfo=BRISBANE),
+                end_dt=datetime(2025, 10, 21 + i, 10, 30, tzinfo=BRISBANE),
+                location="Park", dogs=1, status="confirmed", price_cents=3000,
+                requires_admin_review=True, review_diff=diff, review_source_invoice_id=f"in_{i}",
+            ))
+        self.test_client = TestClient()
+        self.test_client.login(username='staff', password='testpass123')
+
+    def test_bulk_apply_updates_all_selected(self):
+        from core.admin_tools_review import bulk_apply_reviews
+        from core.models import AdminEvent
+
+        ids = [b.id for b in self.bookings]
+        n = bulk_apply_reviews(ids, actor=self.staff_user)
+
+        self.assertEqual(n, 6)
+        for i, b in enumerate(self.bookings):
+            b.refresh_from_db()
+            self.assertFalse(b.requires_admin_review)
+            self.assertIsNone(b.review_diff)
+            if i % 2:
+                self.assertEqual(b.dogs, 2)
+            else:
+                self.assertEqual(b.service_id, self.walk60.id)
+                self.assertEqual(b.service_code, "walk60")
+        self.assertEqual(AdminEvent.objects.filter(event_type="review.apply", actor=self.staff_user).count(), 6)
+
+    def test_bulk_apply_query_count_is_flat_for_non_timing_diffs(self):
+        from core.admin_tools_review import bulk_apply_reviews
+
+        dogs_only = [b.id for i, b in enumerate(self.bookings) if i % 2]
+        with self.assertNumQueries(5):  # savepoint, select, bulk_update, audit insert, release
+            bulk_apply_reviews(dogs_only)
+
+    def test_bulk_apply_moved_rows_update_capacity_usage(self):
+        from core.admin_tools_review import bulk_apply_reviews
+        from core.capacity_helpers import block_remaining_capacity
+        from core.models import BlockCapacity, TimetableBlock
+        from datetime import time
+
+        block = TimetableBlock.objects.create(date=datetime(2025, 10, 21).date(), start_time=time(9, 0), end_time=time(12, 0))
+        BlockCapacity.objects.create(block=block, service_code="walk30", capacity=3)
+        BlockCapacity.objects.create(block=block, service_code="walk60", capacity=3)
+        self.assertEqual(block_remaining_capacity(block, "walk30"), 2)
+
+        bulk_apply_reviews([self.bookings[0].id])
+
+        self.assertEqual(block_remaining_capacity(block, "walk30"), 3)
+        self.assertEqual(block_remaining_capacity(block, "walk60"), 2)
+
+    def test_bulk_dismiss_bumps_the_portal_version(self):
+        from core.admin_tools_review import bulk_dismiss_reviews
+        from core.portal_cache import client_version
+
+        before = client_version(self.client_obj.id)
+        self.assertEqual(bulk_dismiss_reviews([self.bookings[0].id]), 1)
+        self.assertNotEqual(client_version(self.client_obj.id), before)
+
+    def test_bulk_dismiss_view(self):
+        from core.models import AdminEvent
+
+        selected = [self.bookings[0].id, self.bookings[1].id]
+        response = self.test_client.post(
+            reverse('admin_review_bulk'), {"action": "dismiss", "booking_ids": selected}, follow=True
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Booking.objects.filter(id__in=selected, requires_admin_review=True).exists())
+        self.assertEqual(Booking.objects.filter(requires_admin_review=True).count(), 4)
+        self.bookings[1].refresh_from_db()
+        self.assertEqual(self.bookings[1].dogs, 1)
+        self.assertEqual(AdminEvent.objects.filter(event_type="review.dismiss").count(), 2)
+
+    def test_bulk_apply_view(self):
+        response = self.test_client.post(
+            reverse('admin_review_bulk'), {"action": "apply", "booking_ids": [self.bookings[1].id]}, follow=True
+        )
+        self.assertEqual(response.status_code, 200)
+        self.bookings[1].refresh_from_db()
+        self.assertEqual(self.bookings[1].dogs, 2)
+        self.assertFalse(self.bookings[1].requires_admin_review)
@@ -0,0 +1,156 @@
+"""Tests for the subs dashboard 'occurrences without a booking' list."""
+from datetime import timedelta
+
+import pytest
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Booking, Client, StripeSubscriptionLink, SubOccurrence
+from core.views_admin_subs import _unbooked_occurrences, _unbooked_queryset
+
+
+def _client(name="Sub Client", email="subdash@example.com"):
+    return Client.objects.create(name=name, email=email, phone="1", address="1 St", status="active")
+
+
+def _occ(client, start, sub_id="sub_dash"):
+    link, _ = StripeSubscriptionLink.objects.get_or_create(
+        stripe_subscription_id=sub_id, defaults={"client": client, "service_code": "walk30", "active": True}
+    )
+    return SubOccurrence.objects.create(
+        stripe_subscription_id=sub_id, start_dt=start, end_dt=start + timedelta(hours=1),
+        active=True, link=link, client=client,
+    )
+
+
+def _booking(client, start, **extra):
+    fields = dict(
+        client=client, service_code="walk30", service_name="Walk", service_label="Walk",
+        start_dt=start, end_dt=start + timedelta(hours=1), location="Park", status="confirmed",
+    )
+    fields.update(extra)
+    return Booking.objects.create(**fields)
+
+
+def _day(days, hour=9):
+    base = timezone.localtime() + timedelta(days=days)
+    return base.replace(hour=hour, minute=0, second=0, microsecond=0)
+
+
+@pytest.mark.django_db
+def test_occurrence_with_same_day_booking_is_excluded():
+    c = _client()
+    booked = _occ(c, _day(2))
+    open_occ = _occ(c, _day(3))
+    # Staff picked a different time on the same day: still counts as booked
+    _booking(c, _day(2, hour=14))
+
+    rows, has_more = _unbooked_occurrences()
+    ids = [o.id for o in rows]
+    assert open_occ.id in ids
+    assert booked.id not in ids
+    assert has_more is False
+
+
+@pytest.mark.django_db
+def test_cancelled_deleted_or_other_client_bookings_do_not_count():
+    c = _client()
+    other = _client("Other", "other-subdash@example.com")
+    cancelled = _occ(c, _day(2))
+    deleted = _occ(c, _day(3))
+    foreign = _occ(c, _day(4))
+    _booking(c, _day(2), status="cancelled")
+    _booking(c, _day(3), deleted=True)
+    _booking(other, _day(4))
+
+    ids = {o.id for o in _unbooked_occurrences()[0]}
+    assert {cancelled.id, deleted.id, foreign.id} <= ids
+
+
+@pytest.mark.django_db
+def test_same_day_is_the_local_calendar_day():
+    c = _client()
+    occ = _occ(c, _day(3, hour=9))
+    # 23:59 the evening before and 00:00 the next day are other local days
+    _booking(c, _day(2, hour=23).replace(minute=59))
+    _booking(c, _day(4, hour=0))
+    assert occ.id in {o.id for o in _unbooked_occurrences()[0]}
+
+    _booking(c, _day(3, hour=0))
+    assert occ.id not in {o.id for o in _unbooked_occurrences()[0]}
+
+
+@pytest.mark.django_db
+def test_same_day_holds_across_a_dst_change():
+    with timezone.override("Australia/Sydney"):
+        now_offset = timezone.localtime().utcoffset()
+        # First day whose offset differs from today's, i.e. past the next DST change
+        days = next(d for d in range(2, 370) if _day(d).utcoffset() != now_offset)
+        c = _client()
+        occ = _occ(c, _day(days, hour=9))
+        _booking(c, _day(days - 1, hour=23).replace(minute=30))
+        _booking(c, _day(days + 1, hour=0).replace(minute=30))
+        assert occ.id in {o.id for o in _unbooked_occurrences()[0]}
+
+        _booking(c, _day(days, hour=23).replace(minute=30))
+        assert occ.id not in {o.id for o in _unbooked_occurrences()[0]}
+
+        plan = _unbooked_queryset().explain()
+        assert "booking_client_start_idx (client_id=? AND start_dt>? AND start_dt<?)" in plan
+
+
+@pytest.mark.django_db
+def test_query_plan_uses_indexes():
+    from django.db import connection
+    if connection.vendor != "sqlite":
+        pytest.skip("plan text is SQLite-specific")
+    plan = _unbooked_queryset().explain()
+    assert "subocc_active_start_idx" in plan
+    assert "TEMP B-TREE" not in plan
+    assert "booking_client_start_idx (client_id=? AND start_dt>? AND start_dt<?)" in plan
+
+
+@pytest.mark.django_db
+def test_keyset_pagination_walks_all_rows_once():
+    c = _client()
+    same_start = _day(2)
+    occs = [_occ(c, same_start, sub_id=f"sub_dash_{i}") for i in range(3)]
+    occs += [_occ(c, _day(3 + i), sub_id=f"sub_dash_late_{i}") for i in range(2)]
+
+    seen, after_dt, after_id = [], None, None
+    while True:
+        rows, has_more = _unbooked_occurrences(after_dt, after_id, limit=2)
+        seen.extend(o.id for o in rows)
+        if not has_more:
+            break
+        after_dt, after_id = rows[-1].start_dt, rows[-1].id
+    assert seen == [o.id for o in occs]
+
+
+@pytest.mark.django_db
+def test_dashboard_renders_next_cursor(client, monkeypatch):
+    monkeypatch.setattr("core.views_admin_subs.DASHBOARD_PAGE_SIZE", 1)
+    staff = User.objects.create_user("subdash-staff", password="pw", is_staff=True)
+    client.force_login(staff)
+    c = _client()
+    first = _occ(c, _day(2), sub_id="sub_dash_a")
+    _occ(c, _day(3), sub_id="sub_dash_b")
+
+    resp = client.get(reverse("admin_subs_dashboard"))
+    assert resp.status_code == 200
+    assert [o.id for o in resp.context["upcoming"]] == [first.id]
+    assert resp.context["next_cursor"]
+    assert f"after_id={first.id}" in resp.context["next_cursor"]
+
+
+@pytest.mark.django_db
+def test_invalid_cursor_shows_the_first_page(client):
+    staff = User.objects.create_user("subdash-staff2", password="pw", is_staff=True)
+    client.force_login(staff)
+    first = _occ(_client(), _day(2), sub_id="sub_dash_c")
+
+    resp = client.get(reverse("admin_subs_dashboard"), {"after": "2025-13-40T00:00:00", "after_id": "1"})
+    assert resp.status_code == 200
+    assert [o.id for o in resp.context["upcoming"]] == [first.id]
+    assert not resp.context["paged"]
@@ -1,7 +1,7 @@
 import pytest
 from django.test import Client as TestClient
 from django.contrib.auth.models import User
-from core.models import Client, Service, StripeSubscriptionLink, StripeSubscriptionSchedule
+from core.models import Booking, Client, Service, StripeSubscriptionLink, StripeSubscriptionSchedule
 from core.subscription_materializer import materialize_future_holds
 
 
@@ -303,3 +303,45 @@ def test_wizard_view_creates_schedule():
     assert sched.location == "Home"
     assert sched.repeats == "weekly"
     assert sched.is_complete() is True
+
+
+@pytest.mark.django_db
+def test_wizard_preview_shows_plan_without_saving():
+    """Preview renders the materialization diff and leaves the schedule untouched."""
+    user = User.objects.create_user(username="admin", password="test", is_staff=True)
+    client = Client.objects.create(
+        name="Test Client",
+        email="test@example.com",
+        phone="1234567890",
+        address="123 Test St",
+        status="active"
+    )
+    Service.objects.create(code="walk30", name="Walk 30", duration_minutes=30, is_active=True)
+    link = StripeSubscriptionLink.objects.create(
+        stripe_subscription_id="sub_123",
+        client=client,
+        service_code="walk30",
+        active=True
+    )
+
+    test_client = TestClient()
+    test_client.force_login(user)
+    response = test_client.post(f"/admin-tools/subs/wizard/{link.id}/", {
+        "service_code": "walk30",
+        "days": "MON,THU",
+        "start_time": "10:30",
+        "repeats": "weekly",
+        "location": "Park",
+        "action": "preview",
+    })
+
+    assert response.status_code == 200
+    plan = response.context["plan"]
+    assert plan["schedule"]["mode"] == "full"
+    assert len(plan["schedule"]["create"]) > 0
+    assert b"Preview" in response.content
+
+    link.refresh_from_db()
+    assert link.schedule.days is None
+    assert link.schedule.location == "Home"
+    assert not Booking.objects.exists()
@@ -108,3 +108,64 @@ class TestAuditEmit:
         # emit should return None on failure but not raise
         # This behavior depends on implementation
         # The key is it doesn't crash the calling code
+
+
+class TestAuditWriter:
+    """Background batch writer; the DB write is swapped for a recorder"""
+
+    def test_submit_and_flush_writes_in_batches(self, monkeypatch):
+        from core import audit
+
+        written = []
+        monkeypatch.setattr(audit, "write_events", lambda events: written.append(list(events)))
+        writer = audit.AuditWriter(batch_size=3, interval=5.0)
+        events = [AdminEvent(event_type=f"test.{i}") for i in range(5)]
+        for ev in events:
+            assert writer.submit(ev) is True
+        assert writer.flush(timeout=5.0) is True
+        writer.close()
+
+        assert [ev for batch in written for ev in batch] == events
+        assert all(len(batch) <= 3 for batch in written)
+
+    def test_full_queue_falls_back_to_synchronous_write(self, monkeypatch):
+        from core import audit
+
+        class FullWriter:
+            def submit(self, ev):
+                return False
+
+        written = []
+        monkeypatch.setattr(audit, "_writer", lambda: FullWriter())
+        monkeypatch.setattr(audit, "write_events", lambda events: written.extend(events))
+        events = [AdminEvent(event_type="test.overflow")]
+        audit._enqueue(events)
+        assert written == events
+
+
+@pytest.mark.django_db
+class TestAuditAsync:
+
+    def test_emit_queues_after_commit(self, settings, monkeypatch, django_capture_on_commit_callbacks):
+        from core import audit
+
+        settings.AUDIT_ASYNC = True
+        queued = []
+        monkeypatch.setattr(audit, "_enqueue", lambda events: queued.extend(events))
+        with django_capture_on_commit_callbacks(execute=True):
+            ev = emit("test.async", message="queued")
+            assert queued == []
+
+        assert queued == [ev]
+        assert ev.pk is None
+        assert not AdminEvent.objects.filter(event_type="test.async").exists()
+
+    def test_write_events_retries_rows_alone(self, monkeypatch):
+        from core.audit import write_events
+
+        def failing_bulk_create(*args, **kwargs):
+            raise RuntimeError("batch rejected")
+
+        monkeypatch.setattr(AdminEvent.objects, "bulk_create", failing_bulk_create)
+        write_events([AdminEvent(event_type="test.a"), AdminEvent(event_type="test.b")])
+        assert AdminEvent.objects.filter(event_type__in=["test.a", "test.b"]).count() == 2
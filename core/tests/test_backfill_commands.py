@@ -511,3 +511,31 @@ def test_backfill_invoice_links_calls_sync():
         # Should call sync_invoices with correct days parameter
         mock_sync.assert_called_once_with(days=30)
         assert "backfill_invoice_links complete" in output
+
+
+@pytest.mark.django_db
+def test_backfill_bookings_for_occurrences_uses_occurrence_client():
+    """Occurrences with a denormalised link/client get bookings without per-row link lookups"""
+    from core.models import SubOccurrence
+    client = Client.objects.create(name="Occ Client", email="occ@example.com", phone="1", address="x", status="active")
+    svc = Service.objects.create(code="walk30", name="Walk 30", duration_minutes=30)
+    link = StripeSubscriptionLink.objects.create(stripe_subscription_id="sub_occ", client=client, service_code="walk30")
+    start = timezone.now() + timedelta(days=1)
+    for i in range(3):
+        s = start + timedelta(days=7 * i)
+        SubOccurrence.objects.create(
+            stripe_subscription_id="sub_occ", start_dt=s, end_dt=s + timedelta(hours=1),
+            service=svc, link=link, client=client,
+        )
+    # Legacy row without FKs still resolves via the fallback map
+    legacy = start + timedelta(days=30)
+    SubOccurrence.objects.create(stripe_subscription_id="sub_occ", start_dt=legacy, end_dt=legacy, service=svc)
+
+    out = StringIO()
+    call_command("backfill_bookings_for_occurrences", stdout=out)
+    assert "created=4" in out.getvalue()
+    assert Booking.objects.filter(client=client).count() == 4
+
+    out = StringIO()
+    call_command("backfill_bookings_for_occurrences", stdout=out)
+    assert "created=0" in out.getvalue()
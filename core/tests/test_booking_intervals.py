@@ -0,0 +1,152 @@
+"""Tests for the SQLite R*Tree booking interval index."""
+from datetime import datetime, timedelta
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
+
+from core import booking_intervals
+from core.models import Booking, Client
+from core.utils_conflicts import has_conflict
+
+
+def _client(email="rtree@example.com"):
+    return Client.objects.create(name="R", email=email, phone="1", address="a", status="active")
+
+
+def _booking(client, start, minutes=60, **extra):
+    fields = dict(
+        client=client, service_code="walk", service_name="Walk", service_label="Walk",
+        start_dt=start, end_dt=start + timedelta(minutes=minutes), location="Park", status="confirmed",
+    )
+    fields.update(extra)
+    return Booking.objects.create(**fields)
+
+
+def _indexed():
+    with connection.cursor() as cur:
+        cur.execute(f"SELECT id, start_min, end_min FROM {booking_intervals.TABLE} ORDER BY id")
+        return cur.fetchall()
+
+
+def _start():
+    return timezone.make_aware(datetime(2030, 3, 4, 10, 0))
+
+
+@pytest.mark.django_db
+def test_index_follows_save_and_delete():
+    assert booking_intervals.index_available()
+    b = _booking(_client(), _start())
+    (row,) = _indexed()
+    assert row[0] == b.id and row[2] - row[1] == 60
+
+    b.end_dt += timedelta(minutes=30)
+    b.save()
+    assert _indexed()[0][2] - _indexed()[0][1] == 90
+
+    b.delete()
+    assert _indexed() == []
+
+
+@pytest.mark.django_db
+def test_inverted_interval_saves_and_is_indexed_over_its_span(monkeypatch):
+    bumped = []
+    monkeypatch.setattr("core.signals.bump_client_version", bumped.append)
+    client = _client()
+    b = _booking(client, _start(), minutes=-60)  # end_dt before start_dt, as the baseline allowed
+
+    assert Booking.objects.count() == 1
+    assert bumped == [client.id]  # later post_save receivers still ran
+    (row,) = _indexed()
+    assert row[0] == b.id and row[2] - row[1] == 60
+    window = (_start() - timedelta(minutes=90), _start() + timedelta(minutes=30))
+    exact = Booking.objects.filter(start_dt__lt=window[1], end_dt__gt=window[0])
+    assert list(booking_intervals.overlapping(Booking.objects.all(), *window)) == list(exact) == [b]
+
+    assert booking_intervals.rebuild() == 1
+    assert _indexed() == [row]
+
+
+@pytest.mark.django_db
+def test_bulk_and_queryset_writes_are_indexed():
+    c = _client()
+    (b,) = Booking.objects.bulk_create([
+        Booking(
+            client=c, service_code="walk", service_name="Walk", service_label="Walk",
+            start_dt=_start(), end_dt=_start() + timedelta(hours=1), location="Park", status="confirmed",
+        )
+    ])
+    assert has_conflict(c, _start() + timedelta(minutes=30), _start() + timedelta(hours=2))
+
+    b.start_dt += timedelta(days=1)
+    b.end_dt += timedelta(days=1)
+    Booking.objects.bulk_update([b], ["start_dt", "end_dt"])
+    assert not has_conflict(c, _start(), _start() + timedelta(hours=1))
+    assert has_conflict(c, b.start_dt, b.end_dt)
+
+    Booking.objects.filter(pk=b.pk).update(start_dt=_start(), end_dt=_start() + timedelta(minutes=30, seconds=1))
+    assert has_conflict(c, _start() + timedelta(minutes=30), _start() + timedelta(hours=1))
+    assert _indexed() == [(b.id, booking_intervals._minutes(_start()), booking_intervals._minutes(_start()) + 31)]
+
+    Booking.objects.filter(pk=b.pk).delete()
+    assert _indexed() == []
+
+
+@pytest.mark.django_db
+def test_raw_sql_writes_are_indexed():
+    c = _client()
+    b = _booking(c, _start())
+    with connection.cursor() as cur:
+        cur.execute(
+            "UPDATE core_booking SET start_dt = %s, end_dt = %s WHERE id = %s",
+            [
+                connection.ops.adapt_datetimefield_value(_start() + timedelta(days=2)),
+                connection.ops.adapt_datetimefield_value(_start() + timedelta(days=2, hours=1)),
+                b.id,
+            ],
+        )
+    assert not has_conflict(c, _start(), _start() + timedelta(hours=1))
+    assert has_conflict(c, _start() + timedelta(days=2), _start() + timedelta(days=2, minutes=5))
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("use_index", [True, False])
+def test_has_conflict_exact_at_sub_minute_edges(monkeypatch, use_index):
+    if not use_index:
+        monkeypatch.setattr(booking_intervals, "index_available", lambda using="default": False)
+    c = _client()
+    start = _start()
+    b = _booking(c, start, minutes=0)
+    b.end_dt = start + timedelta(minutes=30, seconds=30)
+    b.save()
+
+    assert has_conflict(c, start + timedelta(minutes=30, seconds=15), start + timedelta(hours=1))
+    assert not has_conflict(c, start + timedelta(minutes=30, seconds=30), start + timedelta(hours=1))
+    assert not has_conflict(c, start - timedelta(hours=1), start)
+    assert not has_conflict(c, start, start + timedelta(hours=1), exclude_booking_id=b.id)
+    assert not has_conflict(_client("other@example.com"), start, start + timedelta(hours=1))
+
+
+@pytest.mark.django_db
+def test_overlap_query_uses_rtree():
+    qs = booking_intervals.overlapping(Booking.objects.all(), _start(), _start() + timedelta(hours=1))
+    sql, params = qs.query.sql_with_params()
+    with connection.cursor() as cur:
+        cur.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        plan = " ".join(str(row[-1]) for row in cur.fetchall())
+    assert booking_intervals.TABLE in plan and "VIRTUAL TABLE INDEX" in plan
+
+
+@pytest.mark.django_db
+def test_rebuild_command_restores_index():
+    c = _client()
+    b1 = _booking(c, _start())
+    b2 = _booking(c, _start() + timedelta(days=1))
+    with connection.cursor() as cur:
+        cur.execute(f"DELETE FROM {booking_intervals.TABLE}")
+
+    call_command("rebuild_booking_intervals")
+
+    assert [row[0] for row in _indexed()] == [b1.id, b2.id]
+    assert has_conflict(c, _start(), _start() + timedelta(minutes=5))
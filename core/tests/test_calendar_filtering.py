@@ -164,3 +164,28 @@ class TestCalendarFiltering:
         calendar_days = resp.context['calendar_days']
         total_bookings = sum(day['bookings'] for day in calendar_days.values())
         assert total_bookings == 1
+
+    def test_sub_occurrences_filtered_by_client(self):
+        """Client-scoped calendars only count that client's subscription holds"""
+        from unittest.mock import patch
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from core import views
+        from core.models import SubOccurrence
+        now = timezone.now()
+        for sub_id, client in (("sub_one", self.client1), ("sub_two", self.client2)):
+            SubOccurrence.objects.create(
+                stripe_subscription_id=sub_id, client=client,
+                start_dt=now, end_dt=now + timedelta(hours=1),
+            )
+
+        def total_holds(user):
+            request = RequestFactory().get("/ops/calendar/")
+            request.user = user
+            with patch("core.views.render", return_value=HttpResponse()) as render:
+                views.calendar_view(request)
+            days = render.call_args[0][2]["calendar_days"]
+            return sum(day["sub_occurrences"] for day in days.values())
+
+        assert total_holds(self.staff_user) == 1
+        assert total_holds(self.admin_user) == 2
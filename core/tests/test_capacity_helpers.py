@@ -1,13 +1,21 @@
 """Tests for capacity helpers and flexible timetable blocks."""
+import threading
+import time as time_mod
+
 import pytest
 from django.utils import timezone
 from datetime import date, time, timedelta
 from core.models import ServiceDefaults, TimetableBlock, BlockCapacity, Client, Booking, CapacityHold
 from core.capacity_helpers import (
+    availability_for_range,
     get_default_duration_minutes,
     list_blocks_for_date,
     block_remaining_capacity,
+    blocks_capacity_for_date,
+    compute_blocks_capacity,
     create_hold,
+    reserve_capacity,
+    reserve_capacity_reclaiming,
 )
 
 
@@ -109,8 +117,28 @@ def test_expired_holds_dont_affect_capacity():
         expires_at=expired_time,
     )
     
-    # Capacity should be full (expired hold is purged)
+    # Capacity should be full (expired hold is ignored, not deleted on read)
     assert block_remaining_capacity(block, "walk") == 5
+    assert CapacityHold.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_purge_expired_deletes_in_batches():
+    """The sweeper removes only expired holds, batch by batch."""
+    today = date.today()
+    block = TimetableBlock.objects.create(date=today, start_time=time(9, 0), end_time=time(12, 0), label="Morning")
+    client = Client.objects.create(
+        name="Test", email="test@test.com", phone="123", address="addr", status="active"
+    )
+    BlockCapacity.objects.create(block=block, service_code="walk", capacity=10)
+    past = timezone.now() - timedelta(minutes=1)
+    for _ in range(5):
+        CapacityHold.objects.create(block=block, service_code="walk", client=client, expires_at=past)
+    live = create_hold(block, "walk", client)
+
+    assert CapacityHold.purge_expired(batch_size=2) == 5
+    assert list(CapacityHold.objects.values_list("token", flat=True)) == [live.token]
+    assert block_remaining_capacity(block, "walk") == 9
 
 
 @pytest.mark.django_db
@@ -121,3 +149,297 @@ def test_no_capacity_when_block_capacity_not_defined():
     
     # No BlockCapacity created, so should return 0
     assert block_remaining_capacity(block, "walk") == 0
+
+
+def _walk_booking(client, day, start, end, **extra):
+    tz = timezone.get_current_timezone()
+    fields = dict(
+        client=client, service_code="walk", service_name="Walk", service_label="Walk",
+        start_dt=timezone.make_aware(timezone.datetime.combine(day, start), tz),
+        end_dt=timezone.make_aware(timezone.datetime.combine(day, end), tz),
+        status="active", price_cents=2000, location="Park", deleted=False,
+    )
+    fields.update(extra)
+    return Booking.objects.create(**fields)
+
+
+@pytest.mark.django_db
+def test_batch_capacity_matches_per_block(django_assert_num_queries):
+    """The single-pass calculator agrees with block_remaining_capacity for every block."""
+    today = date.today()
+    client = Client.objects.create(name="Test", email="test@test.com", phone="123", address="addr", status="active")
+    morning = TimetableBlock.objects.create(date=today, start_time=time(9, 0), end_time=time(12, 0), label="Morning")
+    midday = TimetableBlock.objects.create(date=today, start_time=time(11, 0), end_time=time(14, 0), label="Midday")
+    evening = TimetableBlock.objects.create(date=today, start_time=time(17, 0), end_time=time(19, 0))
+    BlockCapacity.objects.create(block=morning, service_code="walk", capacity=3)
+    BlockCapacity.objects.create(block=midday, service_code="walk", capacity=2)
+    BlockCapacity.objects.create(block=evening, service_code="other", capacity=4)
+
+    _walk_booking(client, today, time(11, 30), time(12, 30))  # overlaps morning + midday
+    _walk_booking(client, today, time(8, 0), time(9, 0))  # touches morning start only
+    _walk_booking(client, today, time(9, 30), time(10, 0), status="cancelled")
+    create_hold(morning, "walk", client)
+
+    with django_assert_num_queries(3):
+        items, hold_expiry = compute_blocks_capacity(today, "walk")
+
+    assert [i["id"] for i in items] == [morning.id, midday.id, evening.id]
+    assert {i["id"]: i["remaining"] for i in items} == {
+        blk.id: block_remaining_capacity(blk, "walk") for blk in (morning, midday, evening)
+    }
+    assert [i["remaining"] for i in items] == [1, 1, 0]
+    assert hold_expiry is not None
+
+
+@pytest.mark.django_db
+def test_blocks_capacity_cache_invalidated_by_changes(django_assert_num_queries):
+    """Cached day results are reused until a booking, hold or capacity change."""
+    today = date.today() + timedelta(days=40)
+    client = Client.objects.create(name="Test", email="test@test.com", phone="123", address="addr", status="active")
+    block = TimetableBlock.objects.create(date=today, start_time=time(9, 0), end_time=time(12, 0), label="Morning")
+    cap = BlockCapacity.objects.create(block=block, service_code="walk", capacity=5)
+
+    assert blocks_capacity_for_date(today, "walk")[0]["remaining"] == 5
+    with django_assert_num_queries(0):
+        assert blocks_capacity_for_date(today, "walk")[0]["remaining"] == 5
+
+    booking = _walk_booking(client, today, time(10, 0), time(11, 0))
+    assert blocks_capacity_for_date(today, "walk")[0]["remaining"] == 4
+
+    hold = create_hold(block, "walk", client)
+    assert blocks_capacity_for_date(today, "walk")[0]["remaining"] == 3
+
+    cap.capacity = 10
+    cap.save()
+    assert blocks_capacity_for_date(today, "walk")[0]["remaining"] == 8
+
+    hold.delete()
+    booking.delete()
+    assert blocks_capacity_for_date(today, "walk")[0]["remaining"] == 10
+
+
+@pytest.mark.django_db
+def test_usage_follows_rows_even_when_written_by_queryset_update():
+    """Display and reservations both count the rows, so bulk writes can't make them drift."""
+    today = date.today()
+    block = TimetableBlock.objects.create(date=today, start_time=time(9, 0), end_time=time(12, 0), label="Morning")
+    BlockCapacity.objects.create(block=block, service_code="walk", capacity=2)
+    client = Client.objects.create(name="Test", email="test@test.com", phone="123", address="addr", status="active")
+
+    booking = _walk_booking(client, today, time(10, 0), time(11, 0))
+    hold = create_hold(block, "walk", client)
+    assert block_remaining_capacity(block, "walk") == 0
+    assert create_hold(block, "walk", client) is None
+
+    Booking.objects.filter(pk=booking.pk).update(status="cancelled")
+    assert block_remaining_capacity(block, "walk") == 1
+    assert compute_blocks_capacity(today, "walk")[0][0]["remaining"] == 1
+    assert create_hold(block, "walk", client) is not None
+
+    Booking.objects.filter(pk=booking.pk).update(
+        status="active", start_dt=booking.start_dt + timedelta(hours=3), end_dt=booking.end_dt + timedelta(hours=3),
+    )  # moved out of the block
+    CapacityHold.objects.filter(pk=hold.pk).delete()
+    assert block_remaining_capacity(block, "walk") == 1
+    assert compute_blocks_capacity(today, "walk")[0][0]["remaining"] == 1
+    assert reserve_capacity(block, "walk") is True
+
+
+@pytest.mark.django_db
+def test_create_hold_refuses_when_full_but_reuses_expired_holds():
+    """A full block yields no hold until an expired hold can be swept."""
+    today = date.today()
+    block = TimetableBlock.objects.create(date=today, start_time=time(9, 0), end_time=time(12, 0), label="Morning")
+    BlockCapacity.objects.create(block=block, service_code="walk", capacity=1)
+    client = Client.objects.create(name="Test", email="test@test.com", phone="123", address="addr", status="active")
+
+    first = create_hold(block, "walk", client)
+    assert first is not None
+    assert create_hold(block, "walk", client) is None
+
+    CapacityHold.objects.filter(pk=first.pk).update(expires_at=timezone.now() - timedelta(minutes=1))
+    assert block_remaining_capacity(block, "walk") == 1
+    second = create_hold(block, "walk", client)
+    assert second is not None
+    assert not CapacityHold.objects.filter(pk=first.pk).exists()
+    assert block_remaining_capacity(block, "walk") == 0
+
+
+@pytest.mark.django_db
+def test_reserve_capacity_reclaiming_frees_expired_holds():
+    """A unit stuck on a lapsed hold is reclaimed; live holds are left alone."""
+    block = TimetableBlock.objects.create(date=date.today(), start_time=time(9, 0), end_time=time(12, 0))
+    BlockCapacity.objects.create(block=block, service_code="walk", capacity=1)
+    client = Client.objects.create(name="Test", email="test@test.com", phone="123", address="addr", status="active")
+
+    hold = create_hold(block, "walk", client)
+    assert reserve_capacity_reclaiming(block, "walk") is False
+    assert CapacityHold.objects.filter(pk=hold.pk).exists()
+
+    CapacityHold.objects.filter(pk=hold.pk).update(expires_at=timezone.now() - timedelta(minutes=1))
+    assert reserve_capacity_reclaiming(block, "walk") is True
+    assert not CapacityHold.objects.filter(pk=hold.pk).exists()
+
+
+def _finalize_setup(client):
+    from django.contrib.auth.models import User
+    user = User.objects.create_user(username="cli", password="p")
+    owner = Client.objects.create(name="Test", email="test@test.com", phone="123", address="addr", status="active", user=user)
+    client.force_login(user)
+    block = TimetableBlock.objects.create(date=date.today() + timedelta(days=2), start_time=time(9, 0), end_time=time(12, 0))
+    cap = BlockCapacity.objects.create(block=block, service_code="walk", capacity=1)
+    return owner, block, cap
+
+
+@pytest.mark.django_db
+def test_checkout_finalize_lapsed_hold_reclaims_expired_holds(client, monkeypatch):
+    """Our hold lapsed and another expired hold has the last unit: finalize still books."""
+    from types import SimpleNamespace
+    from django.urls import reverse
+    monkeypatch.setattr("core.views_portal.retrieve_payment_intent", lambda pi_id: SimpleNamespace(latest_charge="ch_1"))
+    monkeypatch.setattr("core.views_portal.cancel_payment_intent", lambda pi_id: pytest.fail("payment cancelled"))
+    owner, block, cap = _finalize_setup(client)
+    other = Client.objects.create(name="Other", email="o@test.com", phone="1", address="a", status="active")
+
+    mine = create_hold(block, "walk", owner)
+    CapacityHold.objects.filter(pk=mine.pk).update(expires_at=timezone.now() - timedelta(minutes=1))
+    # The purge job hasn't run: our hold is gone and someone else's lapsed hold has the unit
+    CapacityHold.objects.filter(pk=mine.pk).delete()
+    stale = create_hold(block, "walk", other)
+    CapacityHold.objects.filter(pk=stale.pk).update(expires_at=timezone.now() - timedelta(minutes=1))
+
+    resp = client.post(reverse("portal_checkout_finalize"), {
+        "hold_token": str(mine.token), "payment_intent_id": "pi_1",
+        "service_code": "walk", "block_id": block.id, "price_cents": 2000,
+    })
+    assert resp.status_code == 200, resp.content
+    assert Booking.objects.filter(payment_intent_id="pi_1", charge_id="ch_1").exists()
+    assert block_remaining_capacity(block, "walk") == 0
+
+
+@pytest.mark.django_db
+def test_checkout_finalize_stripe_failure_reserves_nothing(client, monkeypatch):
+    """A PaymentIntent lookup failure leaves the block's usage untouched."""
+    from django.urls import reverse
+
+    def boom(pi_id):
+        raise RuntimeError("stripe down")
+
+    monkeypatch.setattr("core.views_portal.retrieve_payment_intent", boom)
+    owner, block, cap = _finalize_setup(client)
+    client.raise_request_exception = True
+
+    with pytest.raises(RuntimeError):
+        client.post(reverse("portal_checkout_finalize"), {
+            "payment_intent_id": "pi_1", "service_code": "walk", "block_id": block.id,
+        })
+    assert block_remaining_capacity(block, "walk") == cap.capacity
+    assert not Booking.objects.exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_create_hold_never_oversells_under_concurrency():
+    """Many threads racing for a block get exactly `capacity` holds."""
+    from concurrent.futures import ThreadPoolExecutor
+    from django.db import OperationalError, connection
+
+    block = TimetableBlock.objects.create(date=date.today(), start_time=time(9, 0), end_time=time(12, 0))
+    BlockCapacity.objects.create(block=block, service_code="walk", capacity=5)
+    owner = Client.objects.create(name="Test", email="test@test.com", phone="123", address="addr", status="active")
+    barrier = threading.Barrier(16)
+
+    gave_up = object()
+
+    def attempt():
+        try:
+            barrier.wait()
+            for _ in range(50):
+                try:
+                    return create_hold(block, "walk", owner) is not None
+                except OperationalError:  # SQLite busy; retry like a client would
+                    time_mod.sleep(0.01)
+            return gave_up
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(lambda _: attempt(), range(16)))
+
+    # Every thread got an answer; a lock timeout must not pass for "full"
+    assert gave_up not in results
+    assert results.count(True) == 5
+    assert results.count(False) == 11
+    assert CapacityHold.objects.count() == 5
+
+
+@pytest.mark.django_db
+def test_availability_for_range_single_pass(django_assert_num_queries):
+    """A two-week search returns only free blocks, in three queries, then from cache."""
+    start = date.today() + timedelta(days=60)
+    client = Client.objects.create(name="Test", email="test@test.com", phone="123", address="addr", status="active")
+    full = TimetableBlock.objects.create(date=start, start_time=time(9, 0), end_time=time(12, 0), label="Morning")
+    later = TimetableBlock.objects.create(date=start + timedelta(days=3), start_time=time(9, 0), end_time=time(12, 0))
+    TimetableBlock.objects.create(date=start + timedelta(days=20), start_time=time(9, 0), end_time=time(12, 0))
+    BlockCapacity.objects.create(block=full, service_code="walk", capacity=1)
+    BlockCapacity.objects.create(block=later, service_code="walk", capacity=2)
+    _walk_booking(client, start, time(9, 0), time(10, 0))
+
+    with django_assert_num_queries(3):
+        result = availability_for_range(start, 14, "walk")
+    assert result == [{
+        "date": (start + timedelta(days=3)).isoformat(),
+        "blocks": [{"id": later.id, "label": "09:00:00–12:00:00", "start": "09:00:00", "end": "12:00:00", "remaining": 2}],
+    }]
+    with django_assert_num_queries(0):
+        assert availability_for_range(start, 14, "walk") == result
+
+    create_hold(later, "walk", client)
+    assert availability_for_range(start, 14, "walk")[0]["blocks"][0]["remaining"] == 1
+
+
+@pytest.mark.django_db
+def test_portal_availability_endpoint(client):
+    """The availability view validates params and returns the range payload."""
+    from django.contrib.auth.models import User
+    from django.urls import reverse
+
+    user = User.objects.create_user("avail", password="pw")
+    client.force_login(user)
+    start = date.today() + timedelta(days=90)
+    block = TimetableBlock.objects.create(date=start + timedelta(days=1), start_time=time(9, 0), end_time=time(12, 0))
+    BlockCapacity.objects.create(block=block, service_code="walk", capacity=4)
+    url = reverse("portal_availability")
+
+    resp = client.get(url, {"service_code": "walk", "start": start.isoformat(), "days": 7})
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["end"] == (start + timedelta(days=6)).isoformat()
+    assert [d["date"] for d in body["days"]] == [block.date.isoformat()]
+
+    assert client.get(url, {"start": start.isoformat()}).status_code == 400
+    assert client.get(url, {"service_code": "walk", "days": 400}).status_code == 400
+    assert client.get(url, {"service_code": "walk", "start": "nope"}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_set_capacity_counts_existing_bookings(client):
+    from django.contrib.auth.models import User
+    from django.urls import reverse
+    staff = User.objects.create_user("cap-staff", password="pw", is_staff=True)
+    client.force_login(staff)
+    day = date.today() + timedelta(days=3)
+    block = TimetableBlock.objects.create(date=day, start_time=time(9, 0), end_time=time(12, 0))
+    owner = Client.objects.create(name="Test", email="test@test.com", phone="123", address="addr", status="active")
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(timezone.datetime.combine(day, time(10, 0)), tz)
+    Booking.objects.create(client=owner, service_code="walk", service_name="Walk", service_label="Walk",
+                           start_dt=start, end_dt=start + timedelta(hours=1), status="active", location="Park")
+    url = f"{reverse('admin_capacity_edit')}?date={day}"
+
+    client.post(url, {"action": "set_capacity", "block_id": block.id, "service_code": "walk", "capacity": 1})
+    assert BlockCapacity.objects.get(block=block, service_code="walk").capacity == 1
+    assert reserve_capacity(block, "walk") is False
+
+    client.post(url, {"action": "set_capacity", "block_id": block.id, "service_code": "walk", "capacity": 3})
+    assert reserve_capacity(block, "walk") is True
+    assert block_remaining_capacity(block, "walk") == 2
@@ -2,7 +2,7 @@ from django.test import TestCase
 from datetime import datetime
 from zoneinfo import ZoneInfo
 from core.models import Booking, Client, Service
-from core.invoice_validation import validate_invoice_against_bookings, _parse_iso_local
+from core.invoice_validation import validate_invoice_against_bookings, validate_invoices, _parse_iso_local
 
 
 BRISBANE = ZoneInfo("Australia/Brisbane")
@@ -406,3 +406,55 @@ class InvoiceValidationTests(TestCase):
         self.booking.refresh_from_db()
         self.assertTrue(self.booking.requires_admin_review)
         self.assertIn("start_dt", self.booking.review_diff or {})
+
+    def test_validate_invoices_batches_queries(self):
+        """Many invoices validate with one booking fetch and one bulk write."""
+        bookings = [self.booking] + [
+            Booking.objects.create(
+                client=self.client, service=self.service, service_code="walk30",
+                service_name="30 Minute Walk", service_label="30 Minute Walk",
+                start_dt=self.start_dt, end_dt=self.end_dt, location="Test Park",
+                dogs=1, status="confirmed", price_cents=3000,
+            )
+            for _ in range(9)
+        ]
+        invoices = [
+            {"id": f"in_{b.id}", "lines": {"data": [
+                {"id": f"li_{b.id}", "metadata": {"booking_id": str(b.id), "dogs": "2" if i % 2 else "1"}},
+            ]}}
+            for i, b in enumerate(bookings)
+        ]
+        invoices.append({"id": "in_missing", "lines": {"data": [{"metadata": {"booking_id": "999999"}}]}})
+
+        with self.assertNumQueries(2):
+            summary = validate_invoices(invoices)
+
+        self.assertEqual(summary["checked"], 10)
+        self.assertEqual(summary["flagged"], 5)
+        self.assertEqual(summary["newly_flagged"], 5)
+        self.assertEqual(summary["missing"], 1)
+        by_booking = {r["booking_id"]: r for r in summary["results"]}
+        self.assertEqual(by_booking[bookings[1].id]["status"], "flagged")
+        self.assertEqual(by_booking[bookings[1].id]["diff"]["dogs"], {"booking": 1, "invoice": 2})
+        self.assertEqual(by_booking[bookings[0].id]["status"], "ok")
+        self.assertEqual(by_booking[999999]["status"], "missing")
+        bookings[1].refresh_from_db()
+        self.assertTrue(bookings[1].requires_admin_review)
+        self.assertEqual(bookings[1].review_source_invoice_id, f"in_{bookings[1].id}")
+
+    def test_validate_invoices_counts_already_flagged_once(self):
+        """Re-validating an already flagged booking isn't counted as newly flagged."""
+        invoice = {"id": "in_1", "lines": {"data": [{"metadata": {"booking_id": str(self.booking.id), "dogs": "3"}}]}}
+        self.assertEqual(validate_invoices([invoice])["newly_flagged"], 1)
+        summary = validate_invoices([invoice])
+        self.assertEqual(summary["flagged"], 1)
+        self.assertEqual(summary["newly_flagged"], 0)
+
+    def test_flagging_bumps_the_portal_version(self):
+        """The portal's cached "under review" chip is refreshed for flagged clients."""
+        from core.portal_cache import client_version
+        before = client_version(self.client.id)
+        validate_invoices([{"id": "in_ok", "lines": {"data": [{"metadata": {"booking_id": str(self.booking.id), "dogs": "1"}}]}}])
+        self.assertEqual(client_version(self.client.id), before)
+        validate_invoices([{"id": "in_1", "lines": {"data": [{"metadata": {"booking_id": str(self.booking.id), "dogs": "3"}}]}}])
+        self.assertNotEqual(client_version(self.client.id), before)
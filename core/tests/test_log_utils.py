@@ -0,0 +1,87 @@
+import json
+import logging
+
+from core import log_utils
+from core.log_utils import BufferedJsonLineHandler
+
+
+def _record(msg, level=logging.INFO):
+    return logging.LogRecord("t", level, __file__, 1, msg, None, None)
+
+
+def test_handler_writes_json_lines_off_thread(tmp_path):
+    path = tmp_path / "sync.log"
+    handler = BufferedJsonLineHandler(path)
+    for i in range(50):
+        handler.emit(_record(f"line {i}"))
+    assert handler.flush()
+    lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [entry["message"] for entry in lines] == [f"line {i}" for i in range(50)]
+    assert lines[0]["level"] == "INFO"
+    handler.close()
+
+
+def test_handler_rotates_by_size(tmp_path):
+    path = tmp_path / "sync.log"
+    handler = BufferedJsonLineHandler(path, max_bytes=200, backup_count=2)
+    for i in range(20):
+        handler.emit(_record("x" * 40))
+        handler.flush()
+    handler.close()
+    assert path.exists()
+    assert path.with_name("sync.log.1").exists()
+    assert path.with_name("sync.log.2").exists()
+    assert not path.with_name("sync.log.3").exists()
+    assert path.stat().st_size <= 200
+
+
+def test_log_subscription_helpers_queue_and_clear(tmp_path):
+    # core/tests/conftest.py points SYNC_LOG_DIR at tmp_path
+    name = "test_sync_helpers_log.txt"
+    log_utils.log_subscription_info("hello", info_file=name)
+    log_utils.log_subscription_error("boom", error_file=name)
+    assert log_utils.flush_sync_logs()
+    entries = [json.loads(line) for line in (tmp_path / name).read_text(encoding="utf-8").splitlines()]
+    assert [(e["level"], e["message"]) for e in entries] == [("INFO", "hello"), ("ERROR", "boom")]
+    assert log_utils.clear_log_file(name)
+    assert not (tmp_path / name).exists()
+
+
+def test_rotation_measures_encoded_bytes(tmp_path):
+    path = tmp_path / "sync.log"
+    handler = BufferedJsonLineHandler(path, max_bytes=300, backup_count=1)
+    for _ in range(10):
+        handler.emit(_record("héllo wörld ✓ " * 4))
+        handler.flush()
+    handler.close()
+    assert path.with_name("sync.log.1").exists()
+    assert path.stat().st_size <= 300
+
+
+def test_helpers_follow_setting_changes(settings, tmp_path):
+    name = "test_sync_moves_log.txt"
+    first, second = tmp_path / "first", tmp_path / "second"
+    first.mkdir()
+    second.mkdir()
+    settings.SYNC_LOG_DIR = first
+    log_utils.log_subscription_info("one", info_file=name)
+    settings.SYNC_LOG_DIR = second
+    settings.SYNC_LOG_MAX_BYTES = 1
+    settings.SYNC_LOG_BACKUP_COUNT = 1
+    log_utils.log_subscription_info("two", info_file=name)
+    assert log_utils.flush_sync_logs()
+    log_utils.log_subscription_info("three", info_file=name)
+    assert log_utils.flush_sync_logs()
+    assert [json.loads(line)["message"] for line in (first / name).read_text(encoding="utf-8").splitlines()] == ["one"]
+    assert json.loads((second / name).read_text(encoding="utf-8"))["message"] == "three"
+    assert json.loads((second / f"{name}.1").read_text(encoding="utf-8"))["message"] == "two"
+
+
+def test_write_failure_goes_to_the_module_logger(tmp_path, caplog):
+    path = tmp_path / "missing-dir" / "sync.log"
+    handler = BufferedJsonLineHandler(path)
+    with caplog.at_level(logging.WARNING, logger="core.log_utils"):
+        handler.emit(_record("lost"))
+        assert handler.flush()
+    handler.close()
+    assert "Failed to write to log file" in caplog.text
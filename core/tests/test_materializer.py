@@ -1,7 +1,7 @@
 from datetime import datetime, timedelta
 from django.test import TestCase
 from core.models import Client, Service, Booking, StripeSubscriptionLink, StripeSubscriptionSchedule
-from core.subscription_materializer import materialize_for_schedule
+from core.subscription_materializer import materialize_for_schedule, plan_all, plan_for_schedule
 
 NAIVE_MONDAY = datetime(2025, 10, 20, 9, 0, 0)  # Monday
 
@@ -79,3 +79,114 @@ class MaterializerTests(TestCase):
         sched.sub.save(update_fields=["active"])
         res = materialize_for_schedule(sched, now_dt=NAIVE_MONDAY, horizon_weeks=2)
         self.assertGreaterEqual(res["removed"], 1)
+
+    def test_rolling_run_only_adds_new_week(self):
+        sched = self._make_sched(days="MON", time_str="10:30", repeats="weekly", active=True)
+        first = materialize_for_schedule(sched, now_dt=NAIVE_MONDAY, horizon_weeks=2)
+        self.assertEqual(first["mode"], "full")
+        sched.refresh_from_db()
+        self.assertEqual(sched.last_materialized_until, datetime(2025, 11, 2).date())
+
+        res = materialize_for_schedule(sched, now_dt=NAIVE_MONDAY + timedelta(weeks=1), horizon_weeks=2)
+        self.assertEqual(res["mode"], "rolling")
+        self.assertEqual(res["created"], 1)
+        self.assertEqual(res["removed"], 0)
+        sched.refresh_from_db()
+        self.assertEqual(sched.last_materialized_until, datetime(2025, 11, 9).date())
+        self.assertEqual(Booking.objects.filter(schedule=sched, autogenerated=True).count(), 3)
+
+    def test_rolling_run_same_week_is_noop(self):
+        sched = self._make_sched(days="MON,WED", time_str="10:30", repeats="weekly", active=True)
+        materialize_for_schedule(sched, now_dt=NAIVE_MONDAY, horizon_weeks=2)
+        ids = set(Booking.objects.filter(schedule=sched).values_list("id", flat=True))
+        res = materialize_for_schedule(sched, now_dt=NAIVE_MONDAY, horizon_weeks=2)
+        self.assertEqual((res["mode"], res["created"], res["removed"]), ("rolling", 0, 0))
+        self.assertEqual(set(Booking.objects.filter(schedule=sched).values_list("id", flat=True)), ids)
+
+    def test_schedule_edit_forces_full_rebuild(self):
+        sched = self._make_sched(days="MON", time_str="10:30", repeats="weekly", active=True)
+        materialize_for_schedule(sched, now_dt=NAIVE_MONDAY, horizon_weeks=2)
+        sched.days = "TUE"
+        sched.save()
+        res = materialize_for_schedule(sched, now_dt=NAIVE_MONDAY, horizon_weeks=2)
+        self.assertEqual(res["mode"], "full")
+        self.assertEqual(res["removed"], 2)
+        weekdays = {b.start_dt.weekday() for b in Booking.objects.filter(schedule=sched)}
+        self.assertEqual(weekdays, {1})
+
+    def test_rolling_keeps_fortnightly_parity(self):
+        sched = self._make_sched(days="MON", time_str="10:30", repeats="fortnightly", active=True)
+        materialize_for_schedule(sched, now_dt=NAIVE_MONDAY, horizon_weeks=4)
+        for wk in (1, 2, 3):
+            materialize_for_schedule(sched, now_dt=NAIVE_MONDAY + timedelta(weeks=wk), horizon_weeks=4)
+        starts = sorted(Booking.objects.filter(schedule=sched).values_list("start_dt", flat=True))
+        gaps = {(b - a).days for a, b in zip(starts, starts[1:])}
+        self.assertEqual(gaps, {14})
+        self.assertEqual(len(starts), 4)
+
+    def test_legacy_holds_do_not_advance_the_rolling_watermark(self):
+        from django.utils import timezone
+        from core.stripe_subscriptions import materialize_future_holds
+        # Legacy path plans from weekdays_csv, the materializer from days
+        sched = self._make_sched(days="MON", time_str="10:30", repeats="weekly", active=True)
+        sched.weekdays_csv = "tue"
+        sched.save(update_fields=["weekdays_csv"])
+        now = timezone.localtime()
+
+        materialize_for_schedule(sched, now_dt=now, horizon_weeks=1)
+        sched.refresh_from_db()
+        watermark = sched.last_materialized_until
+        materialize_future_holds(sched.sub, horizon_days=30)
+        sched.refresh_from_db()
+        self.assertEqual(sched.last_materialized_until, watermark)
+
+        res = materialize_for_schedule(sched, now_dt=now, horizon_weeks=8)
+        self.assertEqual((res["mode"], res["created"]), ("rolling", 7))
+        mondays = {timezone.localtime(b.start_dt).date() for b in Booking.objects.filter(schedule=sched)}
+        week0 = (now - timedelta(days=now.weekday())).date()
+        self.assertEqual(mondays, {week0 + timedelta(weeks=wk) for wk in range(8)})
+
+    def test_plan_matches_materialization_without_writing(self):
+        sched = self._make_sched(days="MON,WED", time_str="10:30", repeats="weekly", active=True)
+        plan = plan_for_schedule(sched, now_dt=NAIVE_MONDAY, horizon_weeks=2)
+        self.assertFalse(Booking.objects.exists())
+        d = plan["schedule"]
+        self.assertEqual(d["mode"], "full")
+        self.assertIn("total_ms", plan["timings"])
+
+        res = materialize_for_schedule(sched, now_dt=NAIVE_MONDAY, horizon_weeks=2)
+        self.assertEqual(res["created"], len(d["create"]))
+
+    def test_plan_reports_removed_kept_and_skipped(self):
+        sched = self._make_sched(days="MON", time_str="10:30", repeats="weekly", active=True)
+        materialize_for_schedule(sched, now_dt=NAIVE_MONDAY, horizon_weeks=2)
+        manual_start = datetime(2025, 10, 22, 10, 30)
+        Booking.objects.create(
+            client=self.client_obj, service=self.service, service_code=self.service.code,
+            service_name=self.service.name, service_label=self.service.name,
+            start_dt=manual_start, end_dt=manual_start + timedelta(minutes=30),
+            status="pending", location="Home",
+        )
+        sched.days = "MON,WED"
+        sched.save()
+
+        plan = plan_all(now_dt=NAIVE_MONDAY, horizon_weeks=2)
+        d = plan["schedules"][0]
+        self.assertEqual(d["mode"], "full")
+        self.assertEqual(len(d["keep"]), 2)
+        self.assertEqual(len(d["create"]), 1)
+        self.assertEqual([s["reason"] for s in d["skip"]], ["manual booking exists"])
+        self.assertEqual(plan["totals"]["skip"], 1)
+
+    def test_dry_run_command_outputs_json(self):
+        import json
+        from io import StringIO
+        from django.core.management import call_command
+
+        self._make_sched(days="MON", time_str="10:30", repeats="weekly", active=True)
+        out = StringIO()
+        call_command("materialize_all", "--dry-run", "--json", "--weeks", "2", stdout=out)
+        data = json.loads(out.getvalue())
+        self.assertEqual(data["totals"]["processed"], 1)
+        self.assertIn("diff_ms", data["timings"])
+        self.assertFalse(Booking.objects.exists())
@@ -0,0 +1,56 @@
+"""Tests for per-client portal fragment caching."""
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.utils import timezone
+
+from core.models import Booking, Client
+from core.portal_cache import client_version
+
+User = get_user_model()
+
+
+class PortalFragmentCacheTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="cached", password="pass")
+        self.client_obj = Client.objects.create(
+            name="Cache Client", email="cache@example.com", phone="1", address="a", status="active", user=self.user,
+        )
+        start = timezone.now() + timedelta(days=2)
+        self.booking = Booking.objects.create(
+            client=self.client_obj, service_code="walk", service_name="Morning Walk", service_label="Morning Walk",
+            start_dt=start, end_dt=start + timedelta(hours=1), location="Park", status="confirmed",
+        )
+        self.client.login(username="cached", password="pass")
+
+    def _booking_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, [q["sql"] for q in ctx.captured_queries if "core_booking" in q["sql"]]
+
+    def test_repeat_visits_skip_booking_queries(self):
+        for url in ("/portal/", "/portal/calendar/"):
+            response, first = self._booking_queries(url)
+            self.assertContains(response, "Morning Walk")
+            self.assertTrue(first)
+            response, repeat = self._booking_queries(url)
+            self.assertContains(response, "Morning Walk")
+            self.assertEqual(repeat, [])
+
+    def test_booking_change_invalidates_only_that_client(self):
+        other = Client.objects.create(name="Other", email="o@example.com", phone="2", address="b", status="active")
+        self._booking_queries("/portal/calendar/")
+        mine, theirs = client_version(self.client_obj.pk), client_version(other.pk)
+
+        self.booking.service_name = "Evening Walk"
+        self.booking.save()
+
+        self.assertNotEqual(client_version(self.client_obj.pk), mine)
+        self.assertEqual(client_version(other.pk), theirs)
+        response, queries = self._booking_queries("/portal/calendar/")
+        self.assertTrue(queries)
+        self.assertContains(response, "Evening Walk")
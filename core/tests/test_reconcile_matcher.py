@@ -0,0 +1,172 @@
+"""
+Tests for the invoice-line ↔ booking matcher (reconcile proposals).
+"""
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import pytest
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.models import AdminEvent, Booking, ReconcileSnapshotLine, Service, StripePriceMap
+from core.models import Client as ClientModel
+from core.reconcile_matcher import accept_matches, propose_matches
+
+BRISBANE = ZoneInfo("Australia/Brisbane")
+START = datetime(2026, 3, 2, 9, 0, tzinfo=BRISBANE)
+
+
+@pytest.fixture
+def walk():
+    svc = Service.objects.create(code="walk30", name="30min Walk", duration_minutes=30)
+    StripePriceMap.objects.create(price_id="price_walk", service=svc)
+    return svc
+
+
+def _client(n):
+    return ClientModel.objects.create(
+        name=f"Client {n}", email=f"c{n}@example.com", phone="1", address="a", status="active",
+        stripe_customer_id=f"cus_{n}",
+    )
+
+
+def _booking(client, service, start, price=2500, **kw):
+    return Booking.objects.create(
+        client=client, service=service, service_code=service.code, service_name=service.name,
+        service_label=service.name, start_dt=start, end_dt=start + timedelta(minutes=30),
+        location="Home", status="confirmed", price_cents=price, **kw,
+    )
+
+
+def _line(n, start, price_id="price_walk", amount=2500, **md):
+    return ReconcileSnapshotLine.objects.create(
+        invoice_id=f"in_{n}", invoice_status="open", customer_id=f"cus_{n}", line_id=f"li_{n}",
+        price_id=price_id, amount_total=amount,
+        metadata={"booking_start": start.isoformat(), **md},
+    )
+
+
+@pytest.mark.django_db
+def test_propose_matches_joins_on_client_service_and_time(walk):
+    c = _client(1)
+    exact = _booking(c, walk, START)
+    _booking(c, walk, START + timedelta(hours=3))  # outside tolerance
+    line = _line(1, START)
+
+    proposals = propose_matches(tolerance_minutes=30)
+
+    assert len(proposals) == 1
+    p = proposals[0]
+    assert (p.line.pk, p.booking.pk) == (line.pk, exact.pk)
+    assert p.score == 100 and p.delta_minutes == 0
+
+
+@pytest.mark.django_db
+def test_propose_matches_scores_drift_and_amount(walk):
+    c = _client(1)
+    b = _booking(c, walk, START + timedelta(minutes=15), price=3000)
+    _line(1, START, amount=2500)
+
+    [p] = propose_matches(tolerance_minutes=30)
+    assert p.booking.pk == b.pk
+    assert p.delta_minutes == 15
+    assert p.score == 45  # 35 for time, no amount match, 10 for unique
+    assert propose_matches(tolerance_minutes=10) == []
+
+
+@pytest.mark.django_db
+def test_propose_matches_is_one_to_one_and_falls_back_to_service_code(walk):
+    c = _client(1)
+    b1 = _booking(c, walk, START)
+    b2 = _booking(c, walk, START + timedelta(minutes=20))
+    _line(1, START + timedelta(minutes=20))
+    ReconcileSnapshotLine.objects.create(
+        invoice_id="in_1b", customer_id="cus_1", line_id="li_1b", amount_total=2500,
+        metadata={"booking_start": START.isoformat(), "service_code": "walk30"},
+    )
+
+    pairs = {(p.line.line_id, p.booking.pk) for p in propose_matches(tolerance_minutes=30)}
+    assert pairs == {("li_1", b2.pk), ("li_1b", b1.pk)}
+
+
+@pytest.mark.django_db
+def test_propose_matches_resolves_bookings_without_a_service_fk(walk):
+    c = _client(1)
+    # Portal checkouts store only service_code/service_name
+    portal = Booking.objects.create(
+        client=c, service_code=walk.code, service_name="Walk30", service_label="Walk30",
+        start_dt=START, end_dt=START + timedelta(minutes=30), location="", status="active", price_cents=2500,
+    )
+    assert portal.service_id is None
+    _booking(_client(2), walk, START)  # other client, never a candidate
+    line = _line(1, START)
+
+    [p] = propose_matches(tolerance_minutes=30)
+    assert (p.line.pk, p.booking.pk, p.score) == (line.pk, portal.pk, 100)
+
+
+@pytest.mark.django_db
+def test_propose_matches_skips_lines_already_tied_to_a_booking(walk):
+    c = _client(1)
+    tied = _booking(c, walk, START)
+    _booking(c, walk, START + timedelta(minutes=10))
+    _line(1, START)
+    ReconcileSnapshotLine.objects.filter(line_id="li_1").update(booking_ref=tied.pk)
+    open_line = ReconcileSnapshotLine.objects.create(
+        invoice_id="in_1", invoice_status="open", customer_id="cus_1", line_id="li_1b", price_id="price_walk",
+        amount_total=2500, metadata={"booking_start": (START + timedelta(minutes=10)).isoformat()},
+    )
+
+    proposals = propose_matches(tolerance_minutes=30)
+    assert [(p.line.pk, p.booking.start_dt) for p in proposals] == [(open_line.pk, START + timedelta(minutes=10))]
+
+
+@pytest.mark.django_db
+def test_propose_matches_query_count_is_constant(walk):
+    for n in range(40):
+        c = _client(n)
+        _booking(c, walk, START + timedelta(days=n))
+        _line(n, START + timedelta(days=n))
+
+    with CaptureQueriesContext(connection) as ctx:
+        proposals = propose_matches()
+    assert len(proposals) == 40
+    assert len(ctx.captured_queries) <= 8
+
+
+@pytest.mark.django_db
+def test_accept_matches_links_in_bulk_and_skips_stale(walk):
+    c1, c2 = _client(1), _client(2)
+    b1 = _booking(c1, walk, START)
+    b2 = _booking(c2, walk, START, stripe_invoice_id="in_elsewhere")
+    l1, l2 = _line(1, START), _line(2, START)
+
+    assert accept_matches([(l1.pk, b1.pk), (l2.pk, b2.pk)]) == 1
+
+    b1.refresh_from_db()
+    b2.refresh_from_db()
+    assert b1.stripe_invoice_id == "in_1" and b1.stripe_invoice_status == "open"
+    assert b2.stripe_invoice_id == "in_elsewhere"
+    assert AdminEvent.objects.filter(event_type="reconcile.link", booking=b1).count() == 1
+
+
+@pytest.mark.django_db
+def test_matches_review_screen_and_bulk_accept(walk):
+    User.objects.create_user(username="staff", password="p", is_staff=True)
+    c = _client(1)
+    b = _booking(c, walk, START)
+    line = _line(1, START)
+    http = Client()
+    http.login(username="staff", password="p")
+
+    resp = http.get(reverse("admin_reconcile_matches"))
+    assert resp.status_code == 200
+    assert f'value="{line.pk}:{b.pk}" checked'.encode() in resp.content
+
+    resp = http.post(reverse("admin_reconcile_accept_matches"), {"accept": [f"{line.pk}:{b.pk}", "junk"]})
+    assert resp.status_code == 302
+    b.refresh_from_db()
+    assert b.stripe_invoice_id == "in_1"
@@ -0,0 +1,96 @@
+import pytest
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.urls import resolve
+
+from core import request_metrics
+from core.middleware.request_metrics import RequestMetricsMiddleware
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    request_metrics.reset()
+    cache.clear()
+    yield
+    request_metrics.reset()
+
+
+def test_record_builds_cumulative_histogram():
+    request_metrics.record("ops_bookings", "GET", 200, 0.003, 4, 0.001, 100)
+    request_metrics.record("ops_bookings", "GET", 500, 0.2, 6, 0.05, 300)
+
+    text = request_metrics.render_prometheus()
+
+    assert 'http_request_duration_seconds_bucket{view="ops_bookings",method="GET",le="0.005"} 1' in text
+    assert 'http_request_duration_seconds_bucket{view="ops_bookings",method="GET",le="0.25"} 2' in text
+    assert 'http_request_duration_seconds_count{view="ops_bookings",method="GET"} 2' in text
+    assert 'http_request_db_queries_total{view="ops_bookings",method="GET"} 10' in text
+    assert 'http_response_bytes_total{view="ops_bookings",method="GET"} 400' in text
+    assert 'http_responses_total{view="ops_bookings",method="GET",status="5xx"} 1' in text
+    row = request_metrics.summary_rows()[0]
+    assert row["count"] == 2 and row["errors"] == 1 and row["avg_queries"] == 5
+
+
+@pytest.mark.django_db
+def test_middleware_counts_queries_per_url_name():
+    def view(request):
+        request.resolver_match = resolve("/ops/bookings/")
+        list(User.objects.all())
+        list(User.objects.all())
+        return HttpResponse("x" * 42)
+
+    RequestMetricsMiddleware(view)(RequestFactory().get("/ops/bookings/"))
+
+    st = request_metrics.snapshot()[("ops_bookings", "GET")]
+    assert st["count"] == 1 and st["queries"] == 2 and st["bytes"] == 42
+
+
+def test_middleware_groups_unresolved_paths():
+    RequestMetricsMiddleware(lambda r: HttpResponse(status=404))(RequestFactory().get("/no/such/page/"))
+    assert ("<unresolved>", "GET") in request_metrics.snapshot()
+
+
+def test_shared_mode_merges_published_processes(settings):
+    settings.REQUEST_METRICS_SHARED = True
+    other = request_metrics._new_stats()
+    other.update(count=3, seconds=0.3, buckets=[0, 0, 0, 0, 3] + [0] * 6, status={"2xx": 3})
+    cache.set(request_metrics._proc_key("other"), [["healthz", "GET", other]])
+    cache.set(request_metrics._PROCS_KEY, ["other"])
+
+    request_metrics.record("healthz", "GET", 200, 0.001, 0, 0.0, 2)
+
+    st = request_metrics.snapshot()[("healthz", "GET")]
+    assert st["count"] == 4
+    assert st["status"] == {"2xx": 4}
+
+
+@pytest.mark.django_db
+class TestMetricsEndpoint:
+
+    def test_staff_gets_prometheus_and_html(self, client):
+        staff = User.objects.create_user("ops", password="pw", is_staff=True)
+        client.force_login(staff)
+        client.get("/healthz/")
+
+        resp = client.get("/ops/metrics/")
+        assert resp.status_code == 200
+        assert resp["Content-Type"].startswith("text/plain")
+        assert 'view="healthz"' in resp.content.decode()
+
+        resp = client.get("/ops/metrics/", HTTP_ACCEPT="text/html")
+        assert resp.status_code == 200
+        assert b"Request metrics" in resp.content
+
+    def test_non_staff_and_anonymous_denied(self, client):
+        resp = client.get("/ops/metrics/")
+        assert resp.status_code == 302
+        client.force_login(User.objects.create_user("walker", password="pw"))
+        resp = client.get("/ops/metrics/")
+        assert resp.status_code == 302
+
+    def test_bearer_token(self, client, settings):
+        settings.METRICS_TOKEN = "s3cret"
+        assert client.get("/ops/metrics/", HTTP_AUTHORIZATION="Bearer s3cret").status_code == 200
+        assert client.get("/ops/metrics/", HTTP_AUTHORIZATION="Bearer nope").status_code == 302
@@ -0,0 +1,185 @@
+import gzip
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+from core.models import AdminEvent, Booking, BookingPet, Client, Pet, SubOccurrence
+from core import retention
+from core.retention import POLICIES, apply_retention, archive_policy, read_manifest, restore_archive
+
+
+@pytest.fixture
+def archive_settings(settings, tmp_path):
+    settings.ARCHIVE_DIR = tmp_path
+    settings.RETENTION_DAYS = {"adminevent": 365, "suboccurrence": 30, "capacityhold": 7, "booking": 365}
+    return tmp_path
+
+
+def _booking(client, days_ago, **kw):
+    start = timezone.now() - timedelta(days=days_ago)
+    fields = dict(
+        client=client, service_code="walk30", service_name="Walk", service_label="Walk",
+        start_dt=start, end_dt=start + timedelta(minutes=30), location="Home", status="confirmed",
+    )
+    fields.update(kw)
+    return Booking.objects.create(**fields)
+
+
+@pytest.mark.django_db
+class TestRetention:
+
+    def setup_method(self):
+        self.client = Client.objects.create(name="Old Client", email="old@example.com", phone="1", address="x", status="active")
+        self.pet = Pet.objects.create(client=self.client, name="Rex")
+
+    def test_archives_settled_bookings_with_pets_and_restores(self, archive_settings):
+        old_paid = _booking(self.client, 800, payment_status="paid")
+        BookingPet.objects.create(booking=old_paid, pet=self.pet)
+        old_unpaid = _booking(self.client, 800)
+        recent = _booking(self.client, 10, payment_status="paid")
+        ev = AdminEvent.objects.create(event_type="booking.paid", booking=old_paid)
+
+        res = archive_policy(POLICIES["booking"], batch_size=1)
+
+        assert res["rows"] == 1
+        assert set(Booking.objects.values_list("pk", flat=True)) == {old_unpaid.pk, recent.pk}
+        assert not BookingPet.objects.exists()
+        ev.refresh_from_db()
+        assert ev.booking_id is None
+        with gzip.open(archive_settings / res["file"], "rt") as fh:
+            assert len(fh.readlines()) == 2  # booking + its BookingPet
+        entry = read_manifest()[0]
+        assert entry["file"] == res["file"] and entry["rows"] == 1 and entry["restored_at"] is None
+
+        out = restore_archive(res["file"])
+
+        assert out["restored"] == 2 and out["relinked"] == 1
+        restored = Booking.objects.get(pk=old_paid.pk)
+        assert restored.payment_status == "paid" and restored.start_dt == old_paid.start_dt
+        assert BookingPet.objects.filter(booking=restored, pet=self.pet).exists()
+        ev.refresh_from_db()
+        assert ev.booking_id == old_paid.pk
+        assert read_manifest()[0]["restored_at"]
+
+    def test_old_events_and_occurrences_archived_in_chunks(self, archive_settings):
+        now = timezone.now()
+        for i in range(5):
+            SubOccurrence.objects.create(
+                stripe_subscription_id="sub_1", start_dt=now - timedelta(days=60 + i),
+                end_dt=now - timedelta(days=60 + i) + timedelta(minutes=30),
+            )
+        keep = SubOccurrence.objects.create(stripe_subscription_id="sub_1", start_dt=now, end_dt=now + timedelta(minutes=30))
+        old_ev = AdminEvent.objects.create(event_type="old", context={"k": "v"})
+        AdminEvent.objects.filter(pk=old_ev.pk).update(created_at=now - timedelta(days=400))
+        AdminEvent.objects.create(event_type="new")
+
+        results = {r["policy"]: r for r in apply_retention(["adminevent", "suboccurrence"], batch_size=2)}
+
+        assert results["suboccurrence"]["rows"] == 5
+        assert results["adminevent"]["rows"] == 1
+        assert list(SubOccurrence.objects.values_list("pk", flat=True)) == [keep.pk]
+        assert list(AdminEvent.objects.values_list("event_type", flat=True)) == ["new"]
+
+        restore_archive(results["adminevent"]["file"])
+        back = AdminEvent.objects.get(pk=old_ev.pk)
+        assert back.context == {"k": "v"}
+        assert back.created_at < now - timedelta(days=399)
+
+    def test_each_chunk_is_in_the_manifest_before_it_is_deleted(self, archive_settings, monkeypatch):
+        now = timezone.now()
+        for i in range(5):
+            SubOccurrence.objects.create(
+                stripe_subscription_id="sub_1", start_dt=now - timedelta(days=60 + i),
+                end_dt=now - timedelta(days=60 + i) + timedelta(minutes=30),
+            )
+        seen = []
+        update = retention._update_manifest
+
+        def spy(file_name, **changes):
+            entry = update(file_name, **changes)
+            seen.append((entry["rows"], entry["complete"], SubOccurrence.objects.count()))
+            return entry
+
+        monkeypatch.setattr(retention, "_update_manifest", spy)
+        archive_policy(POLICIES["suboccurrence"], batch_size=2)
+
+        assert seen == [(2, False, 5), (4, False, 3), (5, False, 1), (5, True, 0)]
+
+    def test_runs_in_the_same_second_get_their_own_files(self, archive_settings):
+        _booking(self.client, 800, payment_status="paid")
+        first = archive_policy(POLICIES["booking"])
+        _booking(self.client, 800, payment_status="paid")
+        second = archive_policy(POLICIES["booking"])
+
+        assert first["file"] != second["file"]
+        assert [e["rows"] for e in read_manifest()] == [1, 1]
+        for res in (first, second):
+            with gzip.open(archive_settings / res["file"], "rt") as fh:
+                assert len([line for line in fh if line.strip()]) == 1
+
+    def test_restore_leaves_capacity_usage_matching_the_rows(self, archive_settings):
+        from datetime import time
+        from core.capacity_helpers import block_remaining_capacity, count_capacity_usage, create_hold
+        from core.models import BlockCapacity, CapacityHold, TimetableBlock
+
+        block = TimetableBlock.objects.create(date=timezone.localdate(), start_time=time(9, 0), end_time=time(12, 0))
+        BlockCapacity.objects.create(block=block, service_code="walk", capacity=5)
+        hold = create_hold(block, "walk", self.client)
+        CapacityHold.objects.filter(pk=hold.pk).update(expires_at=timezone.now() - timedelta(days=30))
+        res = archive_policy(POLICIES["capacityhold"])
+        assert res["rows"] == 1 and count_capacity_usage(block, "walk") == 0
+
+        restore_archive(res["file"])
+        restore_archive(res["file"])  # repeatable
+        assert CapacityHold.objects.count() == 1
+        assert count_capacity_usage(block, "walk") == 1
+
+        day = timezone.localdate() - timedelta(days=800)
+        start = timezone.make_aware(timezone.datetime.combine(day, time(10, 0)))
+        _booking(self.client, 800, service_code="walk", payment_status="paid",
+                 start_dt=start, end_dt=start + timedelta(minutes=30))
+        old_block = TimetableBlock.objects.create(date=day, start_time=time(9, 0), end_time=time(12, 0))
+        BlockCapacity.objects.create(block=old_block, service_code="walk", capacity=5)
+        assert block_remaining_capacity(old_block, "walk") == 4
+        res = archive_policy(POLICIES["booking"])
+        assert res["rows"] == 1 and block_remaining_capacity(old_block, "walk") == 5
+
+        restore_archive(res["file"])
+        assert block_remaining_capacity(old_block, "walk") == 4
+
+    def test_dry_run_and_disabled_policy(self, archive_settings, settings):
+        _booking(self.client, 800, payment_status="paid")
+        settings.RETENTION_DAYS = {**settings.RETENTION_DAYS, "suboccurrence": 0}
+
+        results = {r["policy"]: r for r in apply_retention(dry_run=True)}
+
+        assert results["booking"]["rows"] == 1
+        assert results["suboccurrence"].get("disabled")
+        assert Booking.objects.count() == 1
+        assert read_manifest() == []
+
+    def test_booking_policy_is_opt_in(self, archive_settings, settings):
+        _booking(self.client, 5000, payment_status="paid")
+        del settings.RETENTION_DAYS
+        assert POLICIES["booking"].default_days == 0
+        assert archive_policy(POLICIES["booking"]).get("disabled")
+        assert Booking.objects.count() == 1
+
+    def test_commands(self, archive_settings):
+        _booking(self.client, 800, status="cancelled")
+        out = StringIO()
+        call_command("apply_retention", "--policy", "booking", stdout=out)
+        assert "archived 1 row(s)" in out.getvalue()
+        assert not Booking.objects.exists()
+
+        file_name = read_manifest()[0]["file"]
+        out = StringIO()
+        call_command("restore_archive", "--list", stdout=out)
+        assert file_name in out.getvalue()
+        out = StringIO()
+        call_command("restore_archive", file_name, stdout=out)
+        assert "Restored 1 row(s)" in out.getvalue()
+        assert Booking.objects.count() == 1
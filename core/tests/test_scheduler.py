@@ -128,6 +128,7 @@ def test_start_scheduler_when_apscheduler_missing(reset_scheduler_state, monkeyp
 def test_start_scheduler_successfully(reset_scheduler_state, monkeypatch):
     """Test successful scheduler startup"""
     monkeypatch.setenv("NFDW_SCHEDULER", "1")
+    monkeypatch.delenv("NFDW_RETENTION_ENABLED", raising=False)
     original_argv = sys.argv.copy()
     sys.argv = ["manage.py", "runserver"]
     try:
@@ -141,8 +142,8 @@ def test_start_scheduler_successfully(reset_scheduler_state, monkeypatch):
             # Verify scheduler was created and started
             mock_scheduler_class.assert_called_once()
             mock_scheduler.start.assert_called_once()
-            # Verify jobs were added
-            assert mock_scheduler.add_job.call_count == 3
+            # Verify jobs were added (retention is opt-in)
+            assert mock_scheduler.add_job.call_count == 5
             assert result == mock_scheduler
     finally:
         sys.argv = original_argv
@@ -169,19 +170,40 @@ def test_start_scheduler_only_once(reset_scheduler_state, monkeypatch):
         sys.argv = original_argv
 
 
-def test_register_jobs_adds_three_jobs(reset_scheduler_state):
-    """Test that _register_jobs adds all three jobs"""
+def test_register_jobs_adds_all_jobs(reset_scheduler_state, monkeypatch):
+    """Test that _register_jobs adds all periodic jobs"""
+    monkeypatch.setenv("NFDW_RETENTION_ENABLED", "1")
     mock_scheduler = MagicMock()
     from core.scheduler import _register_jobs
     
     _register_jobs(mock_scheduler)
     
-    assert mock_scheduler.add_job.call_count == 3
+    assert mock_scheduler.add_job.call_count == 6
     # Check job IDs
     job_ids = [call[1]["id"] for call in mock_scheduler.add_job.call_args_list]
     assert "sync_invoices" in job_ids
     assert "sync_subscription_links" in job_ids
     assert "materialize_all" in job_ids
+    assert "purge_expired_holds" in job_ids
+    assert "refresh_reconcile_snapshot" in job_ids
+    assert "apply_retention" in job_ids
+
+
+@pytest.mark.parametrize("value", [None, "0"])
+def test_register_jobs_skips_retention_unless_enabled(reset_scheduler_state, monkeypatch, value):
+    """Test that the retention job is only scheduled with NFDW_RETENTION_ENABLED=1"""
+    if value is None:
+        monkeypatch.delenv("NFDW_RETENTION_ENABLED", raising=False)
+    else:
+        monkeypatch.setenv("NFDW_RETENTION_ENABLED", value)
+    mock_scheduler = MagicMock()
+    from core.scheduler import _register_jobs
+
+    _register_jobs(mock_scheduler)
+
+    job_ids = [call[1]["id"] for call in mock_scheduler.add_job.call_args_list]
+    assert "apply_retention" not in job_ids
+    assert len(job_ids) == 5
 
 
 def test_register_jobs_respects_env_intervals(reset_scheduler_state, monkeypatch):
@@ -275,6 +297,28 @@ def test_job_materialize_handles_exception(reset_scheduler_state):
         job_materialize()
 
 
+@pytest.mark.django_db
+def test_job_purge_expired_holds_uses_batch_size(reset_scheduler_state, monkeypatch):
+    """Test job_purge_expired_holds purges in env-configured batches"""
+    monkeypatch.setenv("NFDW_PURGE_HOLDS_BATCH", "50")
+    with patch('core.models.CapacityHold.purge_expired', return_value=3) as mock_purge:
+        from core.scheduler import job_purge_expired_holds
+        job_purge_expired_holds()
+
+        mock_purge.assert_called_once_with(batch_size=50)
+
+
+@pytest.mark.django_db
+def test_job_refresh_reconcile_snapshot_uses_window(reset_scheduler_state, monkeypatch):
+    """Test job_refresh_reconcile_snapshot passes the env-configured window"""
+    monkeypatch.setenv("NFDW_RECONCILE_DAYS", "30")
+    with patch('core.admin_tools_reconcile.refresh_reconcile_snapshot', return_value={}) as mock_refresh:
+        from core.scheduler import job_refresh_reconcile_snapshot
+        job_refresh_reconcile_snapshot()
+
+        mock_refresh.assert_called_once_with(days=30)
+
+
 @pytest.mark.django_db
 def test_job_sync_subscription_links_success(reset_scheduler_state):
     """Test job_sync_subscription_links calls ensure_links successfully"""
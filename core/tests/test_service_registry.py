@@ -0,0 +1,106 @@
+"""
+Tests for the in-process Service / StripePriceMap registry.
+"""
+from types import SimpleNamespace
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from core import service_registry
+from core.models import Service, StripePriceMap
+from core.service_registry import (
+    active_services,
+    default_service,
+    get_registry,
+    get_service,
+    is_price_mapped,
+    service_for_price,
+)
+
+
+@pytest.fixture(autouse=True)
+def _fresh_registry():
+    service_registry.invalidate_registry()
+    yield
+    service_registry.invalidate_registry()
+
+
+@pytest.fixture
+def catalog():
+    walk = Service.objects.create(code="walk30", name="Walk", duration_minutes=30)
+    old = Service.objects.create(code="old", name="Old", duration_minutes=30, is_active=False)
+    StripePriceMap.objects.create(price_id="price_walk", service=walk)
+    StripePriceMap.objects.create(price_id="price_old", service=old)
+    StripePriceMap.objects.create(price_id="price_off", service=walk, active=False)
+    return walk, old
+
+
+@pytest.mark.django_db
+def test_lookups(catalog):
+    walk, old = catalog
+    assert get_service("walk30").pk == walk.pk
+    assert get_service("old") is None
+    assert get_service("old", active_only=False).pk == old.pk
+    assert set(active_services()) == {"walk30"}
+    assert default_service().pk == walk.pk
+    assert service_for_price("price_walk").pk == walk.pk
+    assert service_for_price("price_old") is None  # service inactive
+    assert is_price_mapped("price_old") is True
+    assert is_price_mapped("price_off") is False
+    assert service_for_price("price_unknown") is None
+    with pytest.raises(TypeError):
+        get_registry().services_by_code["x"] = walk
+
+
+@pytest.mark.django_db
+def test_repeat_lookups_do_no_queries(catalog):
+    get_registry()
+    with CaptureQueriesContext(connection) as ctx:
+        for _ in range(100):
+            get_service("walk30")
+            service_for_price("price_walk")
+            is_price_mapped("price_x")
+    assert len(ctx.captured_queries) == 0
+
+
+@pytest.mark.django_db
+def test_save_and_delete_bump_the_version(catalog, django_capture_on_commit_callbacks):
+    walk, _ = catalog
+    before = get_registry().version
+    with django_capture_on_commit_callbacks() as callbacks:
+        Service.objects.create(code="walk60", name="Long", duration_minutes=60)
+        # This process reloads at once; other processes wait for the commit
+        assert get_service("walk60") is not None
+        assert get_registry().version == before
+    for callback in callbacks:
+        callback()
+    assert get_registry().version != before
+    assert get_service("walk60") is not None
+
+    StripePriceMap.objects.filter(price_id="price_walk").delete()
+    assert service_for_price("price_walk") is None
+
+
+@pytest.mark.django_db
+def test_version_bump_from_another_process_is_picked_up(catalog):
+    get_registry()
+    Service.objects.filter(code="walk30").update(name="Renamed")  # no signal
+    assert get_service("walk30").name == "Walk"
+    # Another worker's save lands as a new token in the shared cache
+    cache.set(service_registry._VERSION_KEY, "other-worker", None)
+    assert get_service("walk30").name == "Renamed"
+
+
+@pytest.mark.django_db
+def test_invoice_line_service_resolution_is_query_free(catalog):
+    from core.stripe_invoices_sync import _service_from_line
+
+    lines = [SimpleNamespace(price=SimpleNamespace(id="price_walk"))] * 50
+    lines += [SimpleNamespace(price=None)] * 50
+    get_registry()
+    with CaptureQueriesContext(connection) as ctx:
+        resolved = [_service_from_line(li, {"service_code": "walk30"}) for li in lines]
+    assert len(ctx.captured_queries) == 0
+    assert {s.code for s in resolved} == {"walk30"}
@@ -211,3 +211,67 @@ class ServiceWindowPortalValidationTestCase(TestCase):
         }
         form = PortalBookingForm(data=form_data, client=self.client)
         self.assertTrue(form.is_valid(), f"Form errors: {form.errors}")
+
+
+class CompiledServiceWindowRulesTestCase(TestCase):
+    """Portal validation reads a compiled, shared rule table."""
+
+    def setUp(self):
+        from core.service_window_rules import invalidate_rules
+        invalidate_rules()
+        self.group_walk = Service.objects.create(code="groupwalk", name="Group Walk", duration_minutes=60, is_active=True)
+        self.private_walk = Service.objects.create(code="privatewalk", name="Private Walk", duration_minutes=30, is_active=True)
+        self.window = ServiceWindow.objects.create(
+            title="Group Walk AM", weekday=0, start_time=time(8, 30), end_time=time(10, 30), block_in_portal=True,
+        )
+        self.window.allowed_services.add(self.group_walk)
+        self.monday_9 = datetime(2025, 1, 6, 9, 0)
+
+    def _blocked(self, service, start, minutes=30):
+        from core.service_window_rules import blocking_rule
+        return blocking_rule(service, start, start + timedelta(minutes=minutes))
+
+    def test_second_lookup_runs_no_queries(self):
+        self.assertIsNotNone(self._blocked(self.private_walk, self.monday_9))
+        with self.assertNumQueries(0):
+            self.assertIsNone(self._blocked(self.group_walk, self.monday_9))
+            self.assertIsNone(self._blocked(self.private_walk, self.monday_9 + timedelta(days=1)))
+            self.assertIsNone(self._blocked(self.private_walk, datetime(2025, 1, 6, 10, 30)))
+            self.assertIsNotNone(self._blocked(self.private_walk, datetime(2025, 1, 6, 8, 0), minutes=45))
+
+    def test_m2m_and_save_changes_invalidate(self):
+        self.assertIsNotNone(self._blocked(self.private_walk, self.monday_9))
+        self.window.allowed_services.add(self.private_walk)
+        self.assertIsNone(self._blocked(self.private_walk, self.monday_9))
+
+        self.window.allowed_services.remove(self.private_walk)
+        self.window.active = False
+        self.window.save()
+        self.assertIsNone(self._blocked(self.private_walk, self.monday_9))
+
+    def test_table_built_before_commit_is_dropped_on_commit(self):
+        from core import service_window_rules
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.window.allowed_services.add(self.private_walk)
+            # Stands in for another thread rebuilding from the pre-commit windows
+            empty = {day: [] for day in range(7)}
+            service_window_rules._STATE = (service_window_rules._current_version(), empty, empty)
+        self.assertTrue(callbacks)
+        for callback in callbacks:
+            callback()
+        self.assertIsNone(service_window_rules._STATE)
+
+    def test_version_bump_from_another_process_rebuilds_the_table(self):
+        from django.core.cache import cache
+        from core import service_window_rules
+        self.assertIsNone(self._blocked(self.group_walk, self.monday_9))
+        # Another worker edits the window: only the shared version token moves here
+        through = ServiceWindow.allowed_services.through
+        through.objects.filter(servicewindow=self.window).update(service=self.private_walk)
+        self.assertIsNone(self._blocked(self.group_walk, self.monday_9))
+        cache.set(service_window_rules._VERSION_KEY, "other-worker", None)
+        self.assertIsNotNone(self._blocked(self.group_walk, self.monday_9))
+
+    def test_window_without_allowed_services_blocks_nothing(self):
+        self.window.allowed_services.clear()
+        self.assertIsNone(self._blocked(self.private_walk, self.monday_9))
@@ -0,0 +1,67 @@
+"""
+Tests for the shared Stripe invoice payload cache used by the admin tools.
+"""
+import json
+from unittest.mock import patch
+
+import pytest
+import stripe
+from django.core.cache import cache
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core.stripe_invoice_cache import INVOICE_EXPAND, get_invoice, invalidate_invoice
+
+
+def _invoice(inv_id="in_cache1"):
+    return stripe.Invoice.construct_from(
+        {"id": inv_id, "object": "invoice", "lines": {"object": "list", "data": [{"id": "li_1", "metadata": {}}]}},
+        "sk_test",
+    )
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def test_get_invoice_hits_stripe_once():
+    with patch("stripe.Invoice.retrieve", return_value=_invoice()) as mock_retrieve:
+        first = get_invoice("in_cache1")
+        second = get_invoice("in_cache1")
+
+    mock_retrieve.assert_called_once_with("in_cache1", expand=INVOICE_EXPAND)
+    assert first.id == second.id == "in_cache1"
+    assert second.lines.data[0].id == "li_1"
+
+
+def test_invalidate_invoice_forces_refetch():
+    with patch("stripe.Invoice.retrieve", return_value=_invoice()) as mock_retrieve:
+        get_invoice("in_cache1")
+        invalidate_invoice("in_cache1")
+        get_invoice("in_cache1")
+
+    assert mock_retrieve.call_count == 2
+
+
+def test_stripe_errors_are_not_cached():
+    with patch("stripe.Invoice.retrieve", side_effect=[RuntimeError("boom"), _invoice()]) as mock_retrieve:
+        with pytest.raises(RuntimeError):
+            get_invoice("in_cache1")
+        assert get_invoice("in_cache1").id == "in_cache1"
+    assert mock_retrieve.call_count == 2
+
+
+@pytest.mark.django_db
+@override_settings(STRIPE_WEBHOOK_SECRET=None)
+def test_invoice_webhook_invalidates_cached_payload():
+    with patch("stripe.Invoice.retrieve", return_value=_invoice()) as mock_retrieve:
+        get_invoice("in_cache1")
+        event = {"type": "invoice.updated", "data": {"object": {"id": "in_cache1", "object": "invoice"}}}
+        resp = Client().post(reverse("stripe_webhook"), data=json.dumps(event), content_type="application/json")
+        assert resp.status_code == 200
+        get_invoice("in_cache1")
+
+    assert mock_retrieve.call_count == 2
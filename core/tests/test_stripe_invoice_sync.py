@@ -236,7 +236,7 @@ class TestSyncInvoices:
     """Test the main sync_invoices function."""
 
     @patch('core.stripe_invoices_sync._iterate_invoices_since')
-    @patch('core.stripe_invoices_sync.validate_invoice_against_bookings')
+    @patch('core.stripe_invoices_sync.validate_invoices')
     def test_sync_invoices_basic(self, mock_validate, mock_iterate):
         # Setup test data
         client = Client.objects.create(
@@ -283,7 +283,7 @@ class TestSyncInvoices:
 
         # Configure mock iterator
         mock_iterate.return_value = [mock_invoice]
-        mock_validate.return_value = True
+        mock_validate.return_value = {"newly_flagged": 0}
 
         # Run sync
         result = sync_invoices(days=30)
@@ -293,6 +293,7 @@ class TestSyncInvoices:
         assert result["line_items"] == 1
         assert result["linked"] == 1
         assert result["updated"] == 1
+        mock_validate.assert_called_once_with([mock_invoice])
         
         # Verify booking was updated
         booking.refresh_from_db()
@@ -0,0 +1,132 @@
+import json
+
+import pytest
+import stripe
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.urls import resolve
+from stripe._http_client import HTTPClient
+
+from core import request_metrics, stripe_metrics
+from core.middleware.request_metrics import RequestMetricsMiddleware
+
+
+class ScriptedClient(HTTPClient):
+    """Stripe HTTP client double answering from a list of (status, body, headers)."""
+    name = "scripted"
+
+    def __init__(self, responses):
+        super().__init__()
+        self.responses = list(responses)
+
+    def request(self, method, url, headers, post_data=None):
+        status, body, headers = self.responses.pop(0)
+        return json.dumps(body), status, headers
+
+    def _sleep_time_seconds(self, num_retries, response=None):
+        return 0
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    stripe_metrics.reset()
+    request_metrics.reset()
+    yield
+    stripe_metrics.reset()
+
+
+@pytest.fixture
+def scripted_stripe(monkeypatch):
+    def install(*responses):
+        client = stripe_metrics.instrument_client(ScriptedClient(responses))
+        monkeypatch.setattr(stripe, "default_http_client", client)
+        monkeypatch.setattr(stripe, "api_key", "sk_test_metrics")
+        monkeypatch.setattr(stripe, "max_network_retries", 2)
+        return client
+    return install
+
+
+INVOICE = {"id": "in_1Abc", "object": "invoice"}
+
+
+def test_endpoint_label_collapses_ids():
+    assert stripe_metrics.endpoint_label("get", "https://api.stripe.com/v1/invoices/in_1Nv0x?expand[]=lines") == "GET /v1/invoices/{id}"
+    assert stripe_metrics.endpoint_label("get", "https://api.stripe.com/v1/customers/cus_Nf9/balance_transactions") == \
+        "GET /v1/customers/{id}/balance_transactions"
+
+
+def test_counts_retries_and_429s_per_endpoint_and_job(scripted_stripe):
+    scripted_stripe(
+        (429, {"error": {"message": "slow down"}}, {"stripe-should-retry": "true"}),
+        (200, INVOICE, {}),
+    )
+
+    with stripe_metrics.job("sync_invoices"):
+        inv = stripe.Invoice.retrieve("in_1Abc")
+
+    assert inv.id == "in_1Abc"
+    summary = stripe_metrics.summary()
+    ep = summary["endpoints"]["GET /v1/invoices/{id}"]
+    assert ep["calls"] == 1 and ep["retries"] == 1 and ep["rate_limited"] == 1 and ep["errors"] == 0
+    src = summary["sources"]["job:sync_invoices"]
+    assert src["runs"] == 1 and src["calls"] == 1 and src["retries"] == 1 and src["budget"] is None
+
+    text = stripe_metrics.render_prometheus()
+    assert 'stripe_api_rate_limited_total{endpoint="GET /v1/invoices/{id}"} 1' in text
+    assert 'stripe_source_calls_total{source="job:sync_invoices"} 1' in text
+
+
+def test_failed_call_counted_as_error(scripted_stripe):
+    scripted_stripe((404, {"error": {"message": "No such invoice"}}, {}))
+    with pytest.raises(stripe.InvalidRequestError):
+        stripe.Invoice.retrieve("in_missing1")
+    assert stripe_metrics.summary()["endpoints"]["GET /v1/invoices/{id}"]["errors"] == 1
+
+
+def test_view_over_budget_is_attributed_to_request(scripted_stripe, settings):
+    settings.STRIPE_CALL_BUDGETS = {"view:admin_reconcile": 1}
+    scripted_stripe((200, INVOICE, {}), (200, INVOICE, {}))
+
+    def view(request):
+        request.resolver_match = resolve("/admin-tools/reconcile/")
+        request.request_id = "rid-123"
+        stripe.Invoice.retrieve("in_1Abc")
+        stripe.Invoice.retrieve("in_1Abc")
+        return HttpResponse("ok")
+
+    RequestMetricsMiddleware(view)(RequestFactory().get("/admin-tools/reconcile/"))
+
+    summary = stripe_metrics.summary()
+    assert summary["sources"]["view:admin_reconcile"]["over_budget"] == 1
+    over = summary["recent_over_budget"][0]
+    assert over["request_id"] == "rid-123" and over["calls"] == 2 and over["budget"] == 1
+
+
+@pytest.mark.django_db
+def test_diagnostics_and_metrics_endpoint_show_stripe_calls(client, scripted_stripe):
+    scripted_stripe((200, INVOICE, {}))
+    with stripe_metrics.job("materialize_all"):
+        stripe.Invoice.retrieve("in_1Abc")
+    client.force_login(User.objects.create_user("ops", password="pw", is_staff=True, is_superuser=True))
+
+    data = client.get("/ops/admin/sync/").json()
+    assert data["api_calls"]["sources"]["job:materialize_all"]["calls"] == 1
+
+    assert 'source="job:materialize_all"' in client.get("/ops/metrics/?format=prometheus").content.decode()
+    assert b"job:materialize_all" in client.get("/ops/metrics/?format=html").content
+
+
+def test_install_keeps_stripe_proxy_and_ssl_settings(monkeypatch):
+    monkeypatch.setattr(stripe, "default_http_client", None)
+    monkeypatch.setattr(stripe, "proxy", "http://proxy.internal:3128")
+    monkeypatch.setattr(stripe, "verify_ssl_certs", False)
+    monkeypatch.setattr("stripe._api_requestor._default_proxy", None)
+
+    stripe_metrics.install()
+
+    client = stripe.default_http_client
+    assert client._nfdw_instrumented
+    assert client._verify_ssl_certs is False
+    assert client._proxy == {"http": "http://proxy.internal:3128", "https": "http://proxy.internal:3128"}
+    assert client._async_fallback_client is not None
@@ -73,3 +73,96 @@ class SubscriptionSyncIntegrationTest(TestCase):
                 # Check that [Sync] prefix is in the error log
                 self.assertTrue(any("[Sync]" in msg and "Error materializing" in msg for msg in cm.output))
                 self.assertTrue(any("[Sync]" in msg and "Completed with" in msg and "errors" in msg for msg in cm.output))
+
+
+class SubOccurrenceMergeTest(TestCase):
+    """Sync merges occurrences instead of deleting and recreating them."""
+
+    def _sub(self, sub_id, interval_count=1, status='active'):
+        from django.utils import timezone
+        start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        return {
+            'id': sub_id,
+            'status': status,
+            'current_period_start': int(start.timestamp()),
+            'plan': {'interval': 'week', 'interval_count': interval_count},
+        }
+
+    def test_no_change_sync_writes_nothing(self):
+        from core.models import SubOccurrence
+        subs = [self._sub('sub_a'), self._sub('sub_b', interval_count=2)]
+        with patch('core.subscription_sync._get_active_subscriptions', return_value=subs):
+            first = subscription_sync.sync_subscriptions_to_bookings_and_calendar(28)
+            ids = set(SubOccurrence.objects.values_list('id', flat=True))
+            with self.assertNumQueries(2):  # links + existing occurrences
+                subscription_sync._merge_occurrences(
+                    {(o['subscription_id'], o['start_dt']): o
+                     for s in subs for o in subscription_sync._expand_subscription_occurrences(s, 28)},
+                    set(),
+                    {'created': 0, 'updated': 0, 'unchanged': 0, 'cleaned': 0},
+                )
+            again = subscription_sync.sync_subscriptions_to_bookings_and_calendar(28)
+
+        self.assertGreater(first['created'], 0)
+        self.assertEqual((again['created'], again['updated'], again['cleaned']), (0, 0, 0))
+        self.assertEqual(again['unchanged'], first['created'])
+        self.assertEqual(set(SubOccurrence.objects.values_list('id', flat=True)), ids)
+
+    def test_changed_and_removed_subscriptions_are_merged(self):
+        from core.models import Service, SubOccurrence
+        with patch('core.subscription_sync._get_active_subscriptions',
+                   return_value=[self._sub('sub_a'), self._sub('sub_b')]):
+            subscription_sync.sync_subscriptions_to_bookings_and_calendar(28)
+        svc = Service.objects.create(code='walk30', name='Walk 30', duration_minutes=30)
+        first_a = SubOccurrence.objects.filter(stripe_subscription_id='sub_a').order_by('start_dt').first()
+        first_a.service = svc
+        first_a.save(update_fields=['service'])
+
+        with patch('core.subscription_sync._get_active_subscriptions',
+                   return_value=[self._sub('sub_a', status='past_due')]):
+            res = subscription_sync.sync_subscriptions_to_bookings_and_calendar(28)
+
+        self.assertFalse(SubOccurrence.objects.filter(stripe_subscription_id='sub_b').exists())
+        self.assertGreater(res['cleaned'], 0)
+        self.assertEqual(res['updated'], SubOccurrence.objects.filter(stripe_subscription_id='sub_a').count())
+        first_a.refresh_from_db()
+        self.assertFalse(first_a.active)
+        self.assertEqual(first_a.service, svc)
+
+    def test_failed_subscription_keeps_existing_rows(self):
+        from core.models import SubOccurrence
+        with patch('core.subscription_sync._get_active_subscriptions', return_value=[self._sub('sub_a')]):
+            subscription_sync.sync_subscriptions_to_bookings_and_calendar(28)
+        before = SubOccurrence.objects.count()
+        with patch('core.subscription_sync._get_active_subscriptions', return_value=[self._sub('sub_a')]), \
+                patch('core.subscription_sync._expand_subscription_occurrences', side_effect=Exception("boom")):
+            res = subscription_sync.sync_subscriptions_to_bookings_and_calendar(28)
+        self.assertEqual(res['errors'], 1)
+        self.assertEqual(res['cleaned'], 0)
+        self.assertEqual(SubOccurrence.objects.count(), before)
+
+    def test_sync_denormalises_client_and_link(self):
+        from core.models import Client, StripeSubscriptionLink, SubOccurrence
+        client = Client.objects.create(name='C', email='c@example.com', phone='1', address='x', status='active')
+        with patch('core.subscription_sync._get_active_subscriptions', return_value=[self._sub('sub_a')]):
+            subscription_sync.sync_subscriptions_to_bookings_and_calendar(14)
+            self.assertFalse(SubOccurrence.objects.filter(client__isnull=False).exists())
+
+            # Link discovered later: the next sync fills the FKs in place
+            link = StripeSubscriptionLink.objects.create(stripe_subscription_id='sub_a', client=client, service_code='walk30')
+            res = subscription_sync.sync_subscriptions_to_bookings_and_calendar(14)
+
+        self.assertEqual(res['created'], 0)
+        self.assertGreater(res['updated'], 0)
+        occ = SubOccurrence.objects.filter(stripe_subscription_id='sub_a')
+        self.assertEqual(set(occ.values_list('link_id', 'client_id')), {(link.id, client.id)})
+
+    def test_today_start_is_local_midnight_across_the_utc_day_boundary(self):
+        from datetime import datetime, timezone as dt_timezone
+        from django.utils import timezone
+        # 15:30 UTC on the 1st is already 01:30 on the 2nd in Brisbane
+        utc_now = datetime(2025, 3, 1, 15, 30, tzinfo=dt_timezone.utc)
+        with timezone.override('Australia/Brisbane'), patch('django.utils.timezone.now', return_value=utc_now):
+            start = subscription_sync._today_start()
+        self.assertEqual(timezone.localtime(start, timezone.get_fixed_timezone(600)).replace(tzinfo=None),
+                         datetime(2025, 3, 2))
@@ -0,0 +1,53 @@
+import pytest
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Client, StripeSubscriptionLink, SubOccurrence
+
+
+def _seed(n_subs, occ_each=3):
+    base = timezone.now() + timedelta(days=1)
+    for i in range(n_subs):
+        c = Client.objects.create(name=f"Client {i}", email=f"c{i}@example.com", phone="1", address="x", status="active")
+        StripeSubscriptionLink.objects.create(stripe_subscription_id=f"sub_{i}", client=c, service_code="walk30")
+        for k in range(occ_each):
+            start = base + timedelta(days=7 * k, minutes=i)
+            SubOccurrence.objects.create(stripe_subscription_id=f"sub_{i}", start_dt=start, end_dt=start + timedelta(hours=1))
+
+
+@pytest.mark.django_db
+def test_subscriptions_list_aggregates_in_constant_queries(client):
+    user = User.objects.create_user(username="staff", password="x", is_staff=True)
+    client.force_login(user)
+    _seed(12)
+
+    with CaptureQueriesContext(connection) as ctx:
+        resp = client.get(reverse("subscriptions_list"))
+    assert resp.status_code == 200
+    occ_queries = [q for q in ctx.captured_queries if "core_suboccurrence" in q["sql"]]
+    assert len(occ_queries) <= 2  # page + paginator count
+
+    subs = resp.context["subs"]
+    assert len(subs) == 12
+    first = subs[0]
+    assert first["id"] == "sub_0"
+    assert first["upcoming"] == 3
+    assert first["client_name"] == "Client 0"
+    assert first["service_code"] == "walk30"
+
+
+@pytest.mark.django_db
+def test_subscriptions_list_paginates(client):
+    from core import views
+    user = User.objects.create_user(username="staff", password="x", is_staff=True)
+    client.force_login(user)
+    _seed(views.SUBSCRIPTIONS_PER_PAGE + 5, occ_each=1)
+
+    resp = client.get(reverse("subscriptions_list"), {"page": 2})
+    assert resp.status_code == 200
+    assert len(resp.context["subs"]) == 5
+    assert resp.context["page_obj"].number == 2
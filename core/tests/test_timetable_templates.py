@@ -0,0 +1,116 @@
+"""Tests for weekly timetable templates and bulk block generation."""
+from datetime import date, time, timedelta
+
+import pytest
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+
+from core.capacity_helpers import block_remaining_capacity, generate_blocks_from_template, save_week_as_template
+from core.models import (
+    BlockCapacity, Booking, Client, TimetableBlock,
+    TimetableTemplate, TimetableTemplateBlock, TimetableTemplateCapacity,
+)
+
+
+def _template():
+    template = TimetableTemplate.objects.create(name="Standard week")
+    for weekday in (0, 2):  # Mon, Wed
+        tb = TimetableTemplateBlock.objects.create(
+            template=template, weekday=weekday, start_time=time(9, 0), end_time=time(12, 0), label="Morning"
+        )
+        TimetableTemplateCapacity.objects.create(template_block=tb, service_code="walk", capacity=4)
+        TimetableTemplateCapacity.objects.create(template_block=tb, service_code="daycare", capacity=2)
+    return template
+
+
+def _next_monday():
+    d = date.today() + timedelta(days=30)
+    return d + timedelta(days=(7 - d.weekday()) % 7)
+
+
+@pytest.mark.django_db
+def test_generate_quarter_in_a_handful_of_queries(django_assert_max_num_queries):
+    template = _template()
+    start = _next_monday()
+    end = start + timedelta(weeks=13) - timedelta(days=1)
+
+    with django_assert_max_num_queries(10):
+        res = generate_blocks_from_template(template, start, end)
+
+    assert res == {"blocks_created": 26, "capacities_created": 52}
+    blocks = TimetableBlock.objects.filter(date__gte=start, date__lte=end)
+    assert blocks.count() == 26
+    assert {b.date.weekday() for b in blocks} == {0, 2}
+    assert BlockCapacity.objects.filter(block__in=blocks, service_code="walk", capacity=4).count() == 26
+
+
+@pytest.mark.django_db
+def test_generate_is_idempotent_and_keeps_existing_rows():
+    template = _template()
+    start = _next_monday()
+    existing = TimetableBlock.objects.create(date=start, start_time=time(9, 0), end_time=time(12, 0), label="Morning")
+    BlockCapacity.objects.create(block=existing, service_code="walk", capacity=9)
+
+    first = generate_blocks_from_template(template, start, start + timedelta(days=6))
+    again = generate_blocks_from_template(template, start, start + timedelta(days=6))
+
+    assert first == {"blocks_created": 1, "capacities_created": 3}
+    assert again == {"blocks_created": 0, "capacities_created": 0}
+    assert BlockCapacity.objects.get(block=existing, service_code="walk").capacity == 9
+
+
+@pytest.mark.django_db
+def test_generated_capacity_counts_existing_bookings():
+    template = _template()
+    start = _next_monday()
+    client = Client.objects.create(name="T", email="t@example.com", phone="1", address="a", status="active")
+    tz = timezone.get_current_timezone()
+    Booking.objects.create(
+        client=client, service_code="walk", service_name="Walk", service_label="Walk",
+        start_dt=timezone.make_aware(timezone.datetime.combine(start, time(10, 0)), tz),
+        end_dt=timezone.make_aware(timezone.datetime.combine(start, time(11, 0)), tz),
+        location="Park", status="confirmed",
+    )
+
+    generate_blocks_from_template(template, start, start)
+
+    cap = BlockCapacity.objects.get(block__date=start, service_code="walk")
+    assert block_remaining_capacity(cap.block, "walk") == cap.capacity - 1
+
+
+@pytest.mark.django_db
+def test_save_week_round_trips_through_template():
+    start = _next_monday()
+    blk = TimetableBlock.objects.create(date=start + timedelta(days=1), start_time=time(7, 0), end_time=time(9, 0))
+    BlockCapacity.objects.create(block=blk, service_code="walk", capacity=3)
+
+    template = save_week_as_template("Tuesday only", start)
+    generate_blocks_from_template(template, start + timedelta(weeks=1), start + timedelta(weeks=2) - timedelta(days=1))
+
+    copy = TimetableBlock.objects.get(date=start + timedelta(days=8))
+    assert (copy.start_time, copy.end_time) == (time(7, 0), time(9, 0))
+    assert copy.capacities.get().capacity == 3
+
+
+@pytest.mark.django_db
+def test_capacity_edit_generate_action(client):
+    staff = User.objects.create_user("cap-staff", password="pw", is_staff=True)
+    client.force_login(staff)
+    template = _template()
+    start = _next_monday()
+    url = reverse("admin_capacity_edit")
+
+    resp = client.post(f"{url}?date={start}", {
+        "action": "generate_from_template", "template_id": template.id,
+        "start_date": start.isoformat(), "end_date": (start + timedelta(days=13)).isoformat(),
+    })
+    assert resp.status_code == 302
+    assert TimetableBlock.objects.filter(date__gte=start).count() == 4
+
+    resp = client.post(f"{url}?date={start}", {
+        "action": "generate_from_template", "template_id": template.id,
+        "start_date": start.isoformat(), "end_date": (start - timedelta(days=1)).isoformat(),
+    })
+    assert resp.status_code == 302
+    assert TimetableBlock.objects.filter(date__gte=start).count() == 4
@@ -27,6 +27,7 @@ urlpatterns = [
     path("portal/bookings/confirm/", views.portal_booking_confirm, name="portal_booking_confirm_old"),
     path("portal/bookings/new-prepay/", views_portal.portal_booking_new, name="portal_booking_new_prepay"),
     path("portal/blocks/", views_portal.portal_blocks_for_date, name="portal_blocks_for_date"),
+    path("portal/availability/", views_portal.portal_availability, name="portal_availability"),
     path("portal/checkout/start/", views_portal.portal_checkout_start, name="portal_checkout_start"),
     path("portal/checkout/finalize/", views_portal.portal_checkout_finalize, name="portal_checkout_finalize"),
     
@@ -40,12 +41,19 @@ urlpatterns = [
     path("ops/reports/invoices/", require_superuser(views.reports_invoices_list), name="ops_reports_invoices"),
     path("ops/admin/sync/", require_superuser(admin_views.stripe_diagnostics_view), name="ops_admin_sync"),
     path("ops/admin/sync-subscriptions/", require_superuser(admin_views.admin_sync_subscriptions), name="ops_admin_sync_subscriptions"),
+    # Staff or METRICS_TOKEN (checked in the view so scrapers needn't log in)
+    path("ops/metrics/", views_misc.ops_metrics, name="ops_metrics"),
     
     # Legacy admin-tools paths (kept for backward compatibility, wrapped with guards)
     path("admin-tools/reconcile/", admin_tools_reconcile.reconcile_index, name="admin_reconcile"),
+    path("admin-tools/reconcile/refresh/", admin_tools_reconcile.reconcile_refresh, name="admin_reconcile_refresh"),
+    path("admin-tools/reconcile/status/", admin_tools_reconcile.reconcile_status, name="admin_reconcile_status"),
+    path("admin-tools/reconcile/matches/", admin_tools_reconcile.reconcile_matches, name="admin_reconcile_matches"),
+    path("admin-tools/reconcile/matches/accept/", admin_tools_reconcile.reconcile_accept_matches, name="admin_reconcile_accept_matches"),
     path("admin-tools/reconcile/link/", admin_tools_reconcile.reconcile_link, name="admin_reconcile_link"),
     path("admin-tools/reconcile/detach/", admin_tools_reconcile.reconcile_detach, name="admin_reconcile_detach"),
     path("admin-tools/reconcile/create-from-line/", admin_tools_reconcile.reconcile_create_from_line, name="admin_reconcile_create_from_line"),
+    path("admin-tools/reconcile/mark-paid/bulk/", admin_tools.reconcile_bulk_mark_paid, name="admin_reconcile_bulk_paid"),
     path("admin-tools/reconcile/mark-paid/<int:booking_id>/", admin_tools.reconcile_mark_paid, name="admin_reconcile_paid"),
     path("admin-tools/subscriptions/", subscription_admin.link_list, name="admin_sub_links"),
     path("admin-tools/subscriptions/save/<int:link_id>/", subscription_admin.link_save, name="admin_sub_link_save"),
@@ -118,6 +126,7 @@ urlpatterns = [
     # Admin review
     path("admin-tools/invoice-metadata/<int:booking_id>/", admin_tools_metadata.invoice_metadata, name="admin_invoice_metadata"),
     path("admin-tools/review/", admin_tools_review.review_list, name="admin_review_list"),
+    path("admin-tools/review/bulk/", admin_tools_review.review_bulk, name="admin_review_bulk"),
     path("admin-tools/review/apply/<int:booking_id>/", admin_tools_review.review_apply, name="admin_review_apply"),
     path("admin-tools/review/dismiss/<int:booking_id>/", admin_tools_review.review_dismiss, name="admin_review_dismiss"),
 ]
\ No newline at end of file
@@ -54,6 +54,8 @@ def _get_linked_client(user):
         return None
 from .booking_filters import filter_active_bookings
 from .ics_export import bookings_to_ics
+from .booking_intervals import overlapping
+from .portal_cache import fragment_context
 from .date_range_helpers import parse_label, TZ, list_presets
 from .subscription_sync import sync_subscriptions_to_bookings_and_calendar
 from .unified_booking_helpers import get_canonical_service_info
@@ -399,10 +401,9 @@ def calendar_view(request):
         start_dt__lt=month_end_dt,
         active=True
     )
-    # TODO: Filter sub occurrences by client if needed
-    # SubOccurrence doesn't have a direct client relationship. To filter by client,
-    # we would need to join through Stripe subscription metadata or create a link table.
-    # For now, all staff users see all subscription occurrences.
+    if client_filter:
+        # Denormalised client FK (populated at sync time) keeps this on the (client, start_dt) index
+        sub_occurrences_qs = sub_occurrences_qs.filter(client=client_filter)
     sub_occurrences = sub_occurrences_qs
     sub_occurrence_count = sub_occurrences.count()
     logger.info(f"Calendar view: found {sub_occurrence_count} active subscription occurrences for {year}-{month:02d}")
@@ -717,37 +718,47 @@ def booking_export_ics(request: HttpRequest) -> HttpResponse:
 # -----------------------------
 # Subscriptions tab
 # -----------------------------
+SUBSCRIPTIONS_PER_PAGE = 50
+
+
 @user_passes_test(lambda u: u.is_staff)
 def subscriptions_list(request: HttpRequest) -> HttpResponse:
-    """List distinct subscription IDs inferred from future active holds."""
-    from .models import SubOccurrence
+    """
+    List subscriptions inferred from future active holds.
+    One grouped query (next date + upcoming count per subscription id) with the
+    link's client/service pulled in as correlated subqueries, paginated.
+    """
+    from django.core.paginator import Paginator
+    from django.db.models import Count, Min, OuterRef, Subquery
+    from .models import StripeSubscriptionLink, SubOccurrence
     now = timezone.now().astimezone(TZ)
+    link = StripeSubscriptionLink.objects.filter(stripe_subscription_id=OuterRef("stripe_subscription_id"))
     rows = (
         SubOccurrence.objects
         .filter(active=True, start_dt__gte=now)
         .values("stripe_subscription_id")
-        .distinct()
-    )
-    subs = []
-    for r in rows:
-        sid = r["stripe_subscription_id"]
-        next_occ = (
-            SubOccurrence.objects
-            .filter(stripe_subscription_id=sid, active=True, start_dt__gte=now)
-            .order_by("start_dt")
-            .first()
-        )
-        count = (
-            SubOccurrence.objects
-            .filter(stripe_subscription_id=sid, active=True, start_dt__gte=now)
-            .count()
+        .annotate(
+            next_dt=Min("start_dt"),
+            upcoming=Count("id"),
+            client_id=Subquery(link.values("client_id")[:1]),
+            client_name=Subquery(link.values("client__name")[:1]),
+            service_code=Subquery(link.values("service_code")[:1]),
         )
-        subs.append({
-            "id": sid,
-            "next_dt": next_occ.start_dt if next_occ else None,
-            "upcoming": count,
-        })
-    return render(request, "core/subscriptions.html", {"subs": subs})
+        .order_by("next_dt", "stripe_subscription_id")
+    )
+    page_obj = Paginator(rows, SUBSCRIPTIONS_PER_PAGE).get_page(request.GET.get("page"))
+    subs = [
+        {
+            "id": r["stripe_subscription_id"],
+            "next_dt": r["next_dt"],
+            "upcoming": r["upcoming"],
+            "client_id": r["client_id"],
+            "client_name": r["client_name"],
+            "service_code": r["service_code"],
+        }
+        for r in page_obj
+    ]
+    return render(request, "core/subscriptions.html", {"subs": subs, "page_obj": page_obj})
 
 
 @user_passes_test(lambda u: u.is_staff)
@@ -1057,6 +1068,7 @@ def portal_home(request: HttpRequest) -> HttpResponse:
         "note": "",
         "client_credit_cents": getattr(client, "credit_cents", 0) if client else 0,
         "client_obj": client,
+        **fragment_context(client),
     }
     return render(request, "core/portal_home.html", ctx)
 
@@ -1125,10 +1137,8 @@ def portal_booking_create(request: HttpRequest) -> HttpResponse:
             })
 
         # Availability: no overlap with any non-cancelled booking; also block if overlapping an active hold.
-        overlap_q = Q(start_dt__lt=end_dt, end_dt__gt=start_dt)
         clashes = (
-            Booking.objects
-            .filter(overlap_q)
+            overlapping(Booking.objects.all(), start_dt, end_dt)
             .exclude(status__in=["cancelled", "canceled", "void", "voided"])
             .exclude(deleted=True)
             .exists()
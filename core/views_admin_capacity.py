@@ -1,11 +1,18 @@
 """
 Admin views for managing timetable blocks and capacity.
 """
+from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils import timezone
 from datetime import datetime, timedelta
-from .models import TimetableBlock, BlockCapacity
+from .models import TimetableBlock, BlockCapacity, TimetableTemplate
+from .capacity_helpers import (
+    TEMPLATE_MAX_DAYS,
+    bulk_create_blocks,
+    generate_blocks_from_template,
+    save_week_as_template,
+)
 
 
 @staff_member_required
@@ -27,20 +34,39 @@ def capacity_edit(request):
             # clear existing
             TimetableBlock.objects.filter(date=date).delete()
             # copy
-            for blk in TimetableBlock.objects.filter(date=y):
-                new_blk = TimetableBlock.objects.create(
-                    date=date,
-                    start_time=blk.start_time,
-                    end_time=blk.end_time,
-                    label=blk.label
-                )
-                for bc in blk.capacities.all():
-                    BlockCapacity.objects.create(
-                        block=new_blk,
-                        service_code=bc.service_code,
-                        capacity=bc.capacity,
-                        allow_overlap=bc.allow_overlap
-                    )
+            bulk_create_blocks(
+                (date, blk.start_time, blk.end_time, blk.label,
+                 [(bc.service_code, bc.capacity, bc.allow_overlap) for bc in blk.capacities.all()])
+                for blk in TimetableBlock.objects.filter(date=y).prefetch_related("capacities")
+            )
+            return redirect(f"{request.path}?date={date.isoformat()}")
+
+        if action == "generate_from_template":
+            template = get_object_or_404(TimetableTemplate, id=request.POST.get("template_id"))
+            try:
+                start = datetime.fromisoformat(request.POST.get("start_date") or "").date()
+                end = datetime.fromisoformat(request.POST.get("end_date") or "").date()
+            except ValueError:
+                messages.error(request, "Pick a start and end date.")
+                return redirect(f"{request.path}?date={date.isoformat()}")
+            if end < start or (end - start).days >= TEMPLATE_MAX_DAYS:
+                messages.error(request, f"Date range must run forwards and cover at most {TEMPLATE_MAX_DAYS} days.")
+                return redirect(f"{request.path}?date={date.isoformat()}")
+            res = generate_blocks_from_template(template, start, end)
+            messages.success(
+                request,
+                f"{template.name}: {res['blocks_created']} block(s) and "
+                f"{res['capacities_created']} capacity row(s) created for {start}–{end}.",
+            )
+            return redirect(f"{request.path}?date={start.isoformat()}")
+
+        if action == "save_template":
+            name = (request.POST.get("name") or "").strip()
+            if not name:
+                messages.error(request, "Template name is required.")
+            else:
+                save_week_as_template(name, date)
+                messages.success(request, f"Saved the week from {date} as template “{name}”.")
             return redirect(f"{request.path}?date={date.isoformat()}")
 
         if action == "add_block":
@@ -63,4 +89,9 @@ def capacity_edit(request):
             return redirect(f"{request.path}?date={date.isoformat()}")
 
     blocks = TimetableBlock.objects.filter(date=date).order_by("start_time").prefetch_related("capacities")
-    return render(request, "core/admin_capacity_edit.html", {"date": date, "blocks": blocks})
+    return render(request, "core/admin_capacity_edit.html", {
+        "date": date,
+        "blocks": blocks,
+        "templates": TimetableTemplate.objects.all(),
+        "range_end": date + timedelta(days=90),
+    })
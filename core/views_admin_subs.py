@@ -1,22 +1,88 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils import timezone
 from django.db import transaction
+from django.db.models import DateTimeField, Exists, ExpressionWrapper, OuterRef, Q
+from django.db.models.functions import TruncDate
+from django.utils.dateparse import parse_datetime
+from django.utils.http import urlencode
 from .models import StripeSubscriptionLink, StripeSubscriptionSchedule, SubOccurrence, Booking, Client
+from .booking_filters import filter_active_bookings
 from .capacity_helpers import get_default_duration_minutes
+from .service_registry import get_service
+
+# Keyset page size for actionable occurrences
+DASHBOARD_PAGE_SIZE = 50
+# Longest local day (DST fall-back), so a same-day booking is always within this of an occurrence
+_SAME_DAY_REACH = timedelta(hours=25)
+
+
+def _unbooked_queryset():
+    """
+    Upcoming active occurrences whose client has no active booking on the same
+    local day, as a NOT EXISTS anti-join. The occurrence side walks the partial
+    (start_dt, id) index in keyset order. The booking side range-scans
+    (client, start_dt) within a day either way of the occurrence (25 hours
+    covers a DST day), then compares local dates exactly with TruncDate in the
+    project time zone.
+    """
+    tz = timezone.get_current_timezone()
+    booked = filter_active_bookings(
+        Booking.objects.annotate(local_day=TruncDate("start_dt", tzinfo=tz)).filter(
+            client_id=OuterRef("client_id"),
+            start_dt__gt=ExpressionWrapper(OuterRef("start_dt") - _SAME_DAY_REACH, output_field=DateTimeField()),
+            start_dt__lt=ExpressionWrapper(OuterRef("start_dt") + _SAME_DAY_REACH, output_field=DateTimeField()),
+            local_day=OuterRef("local_day"),
+        )
+    )
+    return (
+        SubOccurrence.objects.filter(active=True, start_dt__gte=timezone.now())
+        .annotate(local_day=TruncDate("start_dt", tzinfo=tz))
+        .filter(~Exists(booked))
+        .select_related("client")
+        .order_by("start_dt", "id")
+    )
+
+
+def _unbooked_occurrences(after_dt=None, after_id=None, limit=None):
+    """One keyset page of _unbooked_queryset() after (start_dt, id); returns (rows, has_more)."""
+    limit = limit or DASHBOARD_PAGE_SIZE
+    qs = _unbooked_queryset()
+    if after_dt is not None and after_id is not None:
+        qs = qs.filter(Q(start_dt__gt=after_dt) | Q(start_dt=after_dt, id__gt=after_id))
+    rows = list(qs[:limit + 1])
+    return rows[:limit], len(rows) > limit
+
 
 @staff_member_required
 def subs_dashboard(request):
     """
     Shows: (1) Stripe subs without a schedule, to configure weekdays/time once.
-           (2) Upcoming occurrences within N days that don't yet have a Booking -> assign a time/block to create booking.
+           (2) Upcoming occurrences that don't yet have a Booking -> assign a time/block to create booking.
+    Page through (2) with ?after=<iso start_dt>&after_id=<id>.
     """
     no_sched = StripeSubscriptionLink.objects.filter(schedule__isnull=True).select_related("client")
-    upcoming = SubOccurrence.objects.filter(active=True, start_dt__gte=timezone.now()).order_by("start_dt")[:200]
-    # Filter to those without a booking
-    # (You may also maintain a fk from Booking to SubOccurrence; if you have it, adjust here)
-    return render(request, "core/admin_subs_dashboard.html", {"no_sched": no_sched, "upcoming": upcoming})
+    try:
+        after_dt = parse_datetime(request.GET.get("after") or "")
+    except ValueError:
+        # Well-formed but invalid (e.g. month 13): treat as the first page
+        after_dt = None
+    try:
+        after_id = int(request.GET.get("after_id") or "")
+    except ValueError:
+        after_id = None
+    upcoming, has_more = _unbooked_occurrences(after_dt, after_id)
+    next_cursor = None
+    if has_more:
+        last = upcoming[-1]
+        next_cursor = urlencode({"after": last.start_dt.isoformat(), "after_id": last.id})
+    return render(request, "core/admin_subs_dashboard.html", {
+        "no_sched": no_sched,
+        "upcoming": upcoming,
+        "next_cursor": next_cursor,
+        "paged": after_dt is not None,
+    })
 
 @staff_member_required
 def subs_set_schedule(request, sub_id):
@@ -49,11 +115,14 @@ def subs_finalize_occurrence(request, occ_id):
         start = timezone.make_aware(datetime(occ.start_dt.year, occ.start_dt.month, occ.start_dt.day, hh, mm), timezone.get_current_timezone())
         dur = get_default_duration_minutes(link.service_code)
         end = start + timezone.timedelta(minutes=dur)
+        service = get_service(link.service_code)
+        name = service.name if service else link.service_code.title()
         Booking.objects.create(
             client=client,
+            service=service,
             service_code=link.service_code,
-            service_name=link.service_code.title(),
-            service_label=link.service_code.title(),
+            service_name=name,
+            service_label=name,
             block_label=None,
             start_dt=start,
             end_dt=end,
@@ -1,7 +1,12 @@
+from django.conf import settings
 from django.http import HttpResponse
 from django.views.decorators.http import require_safe
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.shortcuts import redirect
+from django.shortcuts import redirect, render
+from django.utils.crypto import constant_time_compare
+
+from . import request_metrics, stripe_metrics
 
 
 @require_safe
@@ -23,3 +28,32 @@ def calendar_smart_redirect(request):
     if getattr(user, "is_superuser", False) or getattr(user, "is_staff", False):
         return redirect("/ops/calendar/")
     return redirect("/portal/calendar/")
+
+
+def _render_metrics(request):
+    fmt = request.GET.get("format") or ("html" if "text/html" in request.META.get("HTTP_ACCEPT", "") else "prometheus")
+    stats = request_metrics.snapshot()
+    if fmt == "html":
+        return render(request, "admin_tools/metrics.html", {
+            "rows": request_metrics.summary_rows(stats),
+            "shared": getattr(settings, "REQUEST_METRICS_SHARED", False),
+            "stripe": stripe_metrics.summary(),
+        })
+    body = request_metrics.render_prometheus(stats) + stripe_metrics.render_prometheus()
+    return HttpResponse(body, content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+_staff_metrics = staff_member_required(_render_metrics)
+
+
+@require_safe
+def ops_metrics(request):
+    """
+    Request metrics: Prometheus text for scrapers, an HTML summary for browsers
+    (or ?format=html|prometheus). Staff only, or a scraper sending
+    "Authorization: Bearer <METRICS_TOKEN>" when that setting is configured.
+    """
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if token and constant_time_compare(request.META.get("HTTP_AUTHORIZATION", ""), f"Bearer {token}"):
+        return _render_metrics(request)
+    return _staff_metrics(request)
@@ -5,16 +5,20 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import JsonResponse, HttpResponseBadRequest, HttpResponseRedirect
+from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.utils import timezone
 from django.views.decorators.http import require_http_methods
 from django.conf import settings
 from datetime import datetime, timedelta
-from .models import Client, Booking, TimetableBlock, Service
+from .models import Client, Booking, TimetableBlock, Service, CapacityHold
 from .capacity_helpers import (
-    list_blocks_for_date,
-    block_remaining_capacity,
+    AVAILABILITY_MAX_DAYS,
+    availability_for_range,
+    blocks_capacity_for_date,
     create_hold,
-    get_default_duration_minutes
+    get_default_duration_minutes,
+    reserve_capacity_reclaiming,
 )
 from .stripe_integration import create_payment_intent, retrieve_payment_intent, cancel_payment_intent
 from .tasks import send_booking_confirmation_email
@@ -22,6 +26,7 @@ from .forms import PortalBookingForm
 from .portal_billing import try_create_invoice_for_booking
 from .utils_auth import get_user_client_or_403, require_client
 from .audit import emit as audit_emit
+from .portal_cache import fragment_context
 
 
 def root_router(request):
@@ -71,20 +76,37 @@ def portal_blocks_for_date(request):
     except ValueError:
         return JsonResponse({"error": "invalid date"}, status=400)
     
-    items = []
-    for blk in list_blocks_for_date(date):
-        remaining = block_remaining_capacity(blk, service_code)
-        items.append({
-            "id": blk.id,
-            "label": blk.label or f"{blk.start_time}–{blk.end_time}",
-            "start": str(blk.start_time),
-            "end": str(blk.end_time),
-            "remaining": remaining,
-        })
+    items = blocks_capacity_for_date(date, service_code)
     
     return JsonResponse({"blocks": items})
 
 
+@login_required
+def portal_availability(request):
+    """
+    AJAX endpoint: blocks with free capacity for service_code over a date range.
+    Params: service_code, start (ISO date, default today), days (default 14).
+    """
+    service_code = request.GET.get("service_code")
+    if not service_code:
+        return JsonResponse({"error": "missing params"}, status=400)
+    
+    try:
+        start = datetime.fromisoformat(request.GET["start"]).date() if request.GET.get("start") else timezone.localdate()
+        days = int(request.GET.get("days") or 14)
+    except ValueError:
+        return JsonResponse({"error": "invalid date or days"}, status=400)
+    if not 1 <= days <= AVAILABILITY_MAX_DAYS:
+        return JsonResponse({"error": f"days must be between 1 and {AVAILABILITY_MAX_DAYS}"}, status=400)
+    
+    return JsonResponse({
+        "service_code": service_code,
+        "start": start.isoformat(),
+        "end": (start + timedelta(days=days - 1)).isoformat(),
+        "days": availability_for_range(start, days, service_code),
+    })
+
+
 @login_required
 def portal_checkout_start(request):
     """
@@ -105,10 +127,11 @@ def portal_checkout_start(request):
     
     blk = get_object_or_404(TimetableBlock, id=block_id)
     
-    if block_remaining_capacity(blk, service_code) <= 0:
+    # Atomic reservation: the hold only exists if a unit was free
+    hold = create_hold(blk, service_code, client)
+    if hold is None:
         return JsonResponse({"error": "That time is fully booked."}, status=409)
     
-    hold = create_hold(blk, service_code, client)
     intent = create_payment_intent(
         amount_cents=price_cents,
         customer_id=client.stripe_customer_id,
@@ -131,7 +154,7 @@ def portal_checkout_start(request):
 def portal_checkout_finalize(request):
     """
     Called after Stripe.js confirms the PaymentIntent on the client side.
-    We re-check capacity (hold covers races), then create the booking and return a confirmation URL.
+    The hold's reserved unit passes to the booking; if the hold lapsed we try to reserve afresh.
     """
     if request.method != "POST":
         return HttpResponseBadRequest("POST required")
@@ -149,18 +172,26 @@ def portal_checkout_finalize(request):
     
     blk = get_object_or_404(TimetableBlock, id=block_id)
     
-    # Re-check remaining capacity (holds + bookings counted)
-    if block_remaining_capacity(blk, service_code) <= 0:
-        cancel_payment_intent(pi_id)
-        return JsonResponse({"error": "Capacity just ran out. Your payment was not captured."}, status=409)
-    
-    # Fetch PaymentIntent to get the Charge id (for admin linking / refunds)
+    # Fetch PaymentIntent to get the Charge id (for admin linking / refunds).
+    # Done before any reservation so a Stripe failure can't strand a unit.
     pi = retrieve_payment_intent(pi_id)
     charge_id = None
     if getattr(pi, "latest_charge", None):
         charge_id = pi.latest_charge
     
-    # Create booking now (no Stripe invoice for portal path)
+    # Claim the unit reserved by our hold; if it lapsed, reserve a fresh one atomically
+    hold = None
+    if hold_token:
+        try:
+            hold = CapacityHold.objects.filter(
+                token=hold_token, block=blk, service_code=service_code, client=client
+            ).first()
+        except (ValueError, ValidationError):
+            hold = None
+    if hold is not None and hold.expires_at <= timezone.now():
+        hold.delete()
+        hold = None
+    
     # Compute start/end from block + default duration
     tz = timezone.get_current_timezone()
     start_dt = timezone.make_aware(datetime.combine(blk.date, blk.start_time), tz)
@@ -168,23 +199,35 @@ def portal_checkout_finalize(request):
     end_candidate = timezone.make_aware(datetime.combine(blk.date, blk.end_time), tz)
     end_dt = min(start_dt + timedelta(minutes=dur), end_candidate)
     
-    b = Booking.objects.create(
-        client=client,
-        service_code=service_code,
-        service_name=service_code.title(),
-        service_label=service_code.title(),
-        block_label=blk.label,
-        start_dt=start_dt,
-        end_dt=end_dt,
-        price_cents=price_cents,
-        status="active",
-        deleted=False,
-        stripe_invoice_id=None,  # portal flow does NOT create invoices
-        payment_intent_id=pi_id,
-        charge_id=charge_id,
-        location="",
-        notes="",
-    )
+    # A fresh reservation commits together with its booking (or rolls back with it)
+    with transaction.atomic():
+        if hold is None and not reserve_capacity_reclaiming(blk, service_code):
+            b = None
+        else:
+            # Create booking now (no Stripe invoice for portal path)
+            b = Booking.objects.create(
+                client=client,
+                service_code=service_code,
+                service_name=service_code.title(),
+                service_label=service_code.title(),
+                block_label=blk.label,
+                start_dt=start_dt,
+                end_dt=end_dt,
+                price_cents=price_cents,
+                status="active",
+                deleted=False,
+                stripe_invoice_id=None,  # portal flow does NOT create invoices
+                payment_intent_id=pi_id,
+                charge_id=charge_id,
+                location="",
+                notes="",
+            )
+            # The booking now counts itself in place of the hold
+            if hold is not None:
+                hold.delete()
+    if b is None:
+        cancel_payment_intent(pi_id)
+        return JsonResponse({"error": "Capacity just ran out. Your payment was not captured."}, status=409)
     
     audit_emit(
         "booking.created.portal",
@@ -219,7 +262,8 @@ def portal_home(request):
     past = (Booking.objects
             .filter(client=client, start_dt__lt=now, start_dt__gte=now - timedelta(days=30))
             .select_related("service").order_by("-start_dt"))
-    return render(request, "portal/dashboard.html", {"upcoming": upcoming, "past": past})
+    # Querysets are lazy: a cached fragment means no booking queries at all
+    return render(request, "portal/dashboard.html", {"upcoming": upcoming, "past": past, **fragment_context(client)})
 
 
 @login_required
@@ -234,7 +278,7 @@ def portal_calendar(request):
     upcoming = (Booking.objects
                 .filter(client=client, start_dt__gte=now, start_dt__lte=now + timedelta(days=90))
                 .select_related("service").order_by("start_dt"))
-    return render(request, "portal/calendar.html", {"upcoming": upcoming})
+    return render(request, "portal/calendar.html", {"upcoming": upcoming, **fragment_context(client)})
 
 
 @login_required
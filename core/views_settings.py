@@ -4,6 +4,7 @@ from django.contrib import messages
 from django.forms import modelformset_factory
 from .models import Service
 from .forms import ServiceDurationForm
+from .service_registry import invalidate_registry
 
 
 @staff_member_required
@@ -18,6 +19,8 @@ def service_settings(request):
             Service(code="walk60", name="Extended Walk (60m)"),
             Service(code="puppy30", name="Puppy Visit (30m)"),
         ])
+        # bulk_create skips post_save
+        invalidate_registry()
 
     FormSet = modelformset_factory(Service, form=ServiceDurationForm, can_delete=False, extra=0)
 
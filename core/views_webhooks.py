@@ -7,6 +7,7 @@ from django.views.decorators.http import require_POST
 from django.conf import settings
 from django.utils.timezone import localtime
 from .stripe_invoices_sync import process_invoice
+from .stripe_invoice_cache import invalidate_invoice
 from .subscription_materializer import materialize_for_schedule
 from .models import StripeSubscriptionLink, StripeSubscriptionSchedule
 from .audit import emit as audit_emit
@@ -37,6 +38,9 @@ def stripe_webhook(request):
     obj = event["data"]["object"] if isinstance(event, dict) else getattr(getattr(event, "data", None), "object", None)
 
     # ---- Invoice events ----
+    if etype and etype.startswith("invoice."):
+        # Any invoice change makes the admin tools' cached copy stale
+        invalidate_invoice(getattr(obj, "id", None) or (obj.get("id") if isinstance(obj, dict) else None))
     if etype in ("invoice.finalized", "invoice.paid", "invoice.payment_failed"):
         try:
             res = process_invoice(obj)
@@ -83,9 +83,12 @@ LOGIN_URL = '/accounts/login/'
 LOGIN_EXEMPT_URLS = [
     # add project-specific regexes here if needed
     r"^stripe/webhooks/$",  # Stripe webhook endpoint
+    r"^ops/metrics/$",  # staff session or METRICS_TOKEN, enforced by the view
 ]
 
 MIDDLEWARE = [
+    # First, so its timing covers everything below (see core.request_metrics)
+    'core.middleware.request_metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     # Serve static files in production directly from Django (behind Cloudflare)
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -157,6 +160,39 @@ STRIPE_METADATA_LOGGING = env.bool("STRIPE_METADATA_LOGGING", default=False)
 STARTUP_SYNC = os.getenv("STARTUP_SYNC", "0") == "1"
 # Optional kill switch if needed in ops
 DISABLE_SCHEDULER = env.bool("DISABLE_SCHEDULER", default=False)
+# Subscription sync file logs (JSON lines, rotated by size; see core.log_utils)
+SYNC_LOG_DIR = Path(os.getenv("SYNC_LOG_DIR") or BASE_DIR)
+SYNC_LOG_MAX_BYTES = int(os.getenv("SYNC_LOG_MAX_BYTES", str(5 * 1024 * 1024)))
+SYNC_LOG_BACKUP_COUNT = int(os.getenv("SYNC_LOG_BACKUP_COUNT", "3"))
+# Write AdminEvents from a background batch writer (see core.audit): emit() returns an
+# unsaved AdminEvent and rows land up to AUDIT_FLUSH_SECONDS after commit. Set to 0 to
+# INSERT inline instead (one write per action on the request/webhook path)
+AUDIT_ASYNC = env.bool("AUDIT_ASYNC", default=True)
+
+# --- Request metrics (see core.request_metrics; served at /ops/metrics/) ---
+REQUEST_METRICS_ENABLED = env.bool("REQUEST_METRICS_ENABLED", default=True)
+# Merge metrics of all worker processes through the cache (needs a shared cache backend)
+REQUEST_METRICS_SHARED = env.bool("REQUEST_METRICS_SHARED", default=False)
+# Bearer token a Prometheus scraper can use instead of a staff session
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+# Stripe calls allowed per request/job run before it's flagged, by source ("view:<url name>" or
+# "job:<name>"); views default to core.stripe_metrics.DEFAULT_VIEW_BUDGET, jobs are unbudgeted
+STRIPE_CALL_BUDGETS = {
+    "view:admin_reconcile": 0,
+    "view:admin_invoice_metadata": 1,
+}
+
+# --- Retention (see core.retention) ---
+# Rows older than N days are moved to gzip JSONL archives here; 0 keeps a table forever.
+# Bookings are financial history and stay live unless RETENTION_BOOKING_DAYS is set
+# (e.g. 730 archives settled bookings that ended over two years ago).
+ARCHIVE_DIR = Path(os.getenv("ARCHIVE_DIR", str(BASE_DIR / "archive")))
+RETENTION_DAYS = {
+    "adminevent": int(os.getenv("RETENTION_ADMINEVENT_DAYS", "365")),
+    "suboccurrence": int(os.getenv("RETENTION_SUBOCCURRENCE_DAYS", "180")),
+    "capacityhold": int(os.getenv("RETENTION_CAPACITYHOLD_DAYS", "7")),
+    "booking": int(os.getenv("RETENTION_BOOKING_DAYS", "0")),
+}
 
 # ---------------------------
 # Celery (background jobs)
@@ -222,7 +258,7 @@ def SECURE_PROXY_SSL_HEADER_FALLBACK(get_response):
     return middleware
 
 # insert fallback right after SecurityMiddleware if active
-MIDDLEWARE.insert(1, 'newfarm.settings.SECURE_PROXY_SSL_HEADER_FALLBACK')
+MIDDLEWARE.insert(MIDDLEWARE.index('django.middleware.security.SecurityMiddleware') + 1, 'newfarm.settings.SECURE_PROXY_SSL_HEADER_FALLBACK')
 
 # Cookies/HSTS only when PRODUCTION
 SESSION_COOKIE_SECURE = PRODUCTION